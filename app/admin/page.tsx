@@ -17,6 +17,11 @@ interface Student {
   } | null;
 }
 
+function authHeaders(): Record<string, string> {
+  const token = sessionStorage.getItem("auth_token");
+  return token ? { Authorization: `Bearer ${token}` } : {};
+}
+
 export default function AdminPage() {
   const [teachers, setTeachers] = useState<Teacher[]>([]);
   const [students, setStudents] = useState<Student[]>([]);
@@ -37,8 +42,8 @@ export default function AdminPage() {
     setLoading(true);
     try {
       const [tRes, sRes] = await Promise.all([
-        fetch("http://localhost:5000/api/admin/teachers"),
-        fetch("http://localhost:5000/api/admin/students"),
+        fetch("http://localhost:5000/api/admin/teachers", { headers: authHeaders() }),
+        fetch("http://localhost:5000/api/admin/students", { headers: authHeaders() }),
       ]);
 
       const tJson = await tRes.json();
@@ -58,7 +63,7 @@ export default function AdminPage() {
     try {
       const res = await fetch("http://localhost:5000/api/admin/teachers", {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: { "Content-Type": "application/json", ...authHeaders() },
         body: JSON.stringify({
           email: newTeacherEmail,
           password: newTeacherPassword,
@@ -78,7 +83,7 @@ export default function AdminPage() {
     try {
       const res = await fetch("http://localhost:5000/api/admin/students", {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: { "Content-Type": "application/json", ...authHeaders() },
         body: JSON.stringify({
           email: newStudentEmail,
           password: newStudentPassword,
@@ -102,7 +107,7 @@ export default function AdminPage() {
         "http://localhost:5000/api/admin/assign-student",
         {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
+          headers: { "Content-Type": "application/json", ...authHeaders() },
           body: JSON.stringify({
             student_id: studentId,
             teacher_id: Number(teacherId),
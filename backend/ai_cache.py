@@ -0,0 +1,351 @@
+import ast
+import hashlib
+import json
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import has_request_context, request
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import AICacheEntry, AIInflight
+from singleflight import Cancelled, SingleFlight
+
+
+# Как часто (в записях) запускать вытеснение по TTL/LRU
+EVICT_EVERY = 100
+
+
+# ------------------------------------
+# Нормализация входа
+# ------------------------------------
+def normalize_code(code):
+    """AST-нормализация: пробелы, пустые строки и комментарии не влияют на ключ."""
+    try:
+        return ast.unparse(ast.parse(code))
+    except (SyntaxError, ValueError):
+        # Невалидный код — хотя бы убираем комментарии и лишние пробелы
+        lines = []
+        for line in code.splitlines():
+            line = re.sub(r"\s+#.*$|^\s*#.*$", "", line).rstrip()
+            if line.strip():
+                lines.append(line)
+        return "\n".join(lines)
+
+
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+def make_key(model, system_prompt, temperature, content):
+    payload = json.dumps(
+        {
+            "model": model,
+            "system": system_prompt,
+            "temperature": temperature,
+            "content": content,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# ------------------------------------
+# Кэш ответов LLM (персистентный, в БД)
+# ------------------------------------
+class AICache:
+    """Content-addressed кэш ответов LLM с TTL и LRU-вытеснением.
+
+    Ключ — sha256(model, system prompt, temperature, нормализованный вход).
+    Хранится сырой текст ответа модели; парсинг остаётся в роутах.
+    Тот же ключ служит для склейки одновременных одинаковых запросов.
+    """
+
+    def __init__(self, ttl_seconds=7 * 24 * 3600, max_entries=10000, bypass=(),
+                 coalesce="local", lease_seconds=120, poll_interval=0.2):
+        self.ttl = timedelta(seconds=ttl_seconds) if ttl_seconds else None
+        self.max_entries = max_entries
+        self.bypass = set(bypass)
+
+        # "off" | "local" (потоки процесса) | "shared" (ещё и между процессами через БД)
+        self.coalesce = coalesce
+        self.lease = timedelta(seconds=lease_seconds)
+        self.poll_interval = poll_interval
+        self.flights = SingleFlight()
+
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._puts = 0
+
+    def is_bypassed(self, endpoint):
+        if endpoint in self.bypass:
+            return True
+        if has_request_context():
+            if request.headers.get("X-AI-Cache", "").lower() == "bypass":
+                return True
+            if "no-cache" in request.headers.get("Cache-Control", "").lower():
+                return True
+        return False
+
+    def completion(self, endpoint, create, *, model, system_prompt, content,
+                   temperature=None, code=False):
+        """Вернуть ответ из кэша или вызвать create() и сохранить результат.
+
+        create() должен вернуть текст ответа модели.
+        code=True — content считается Python-кодом и нормализуется через AST.
+        Одновременные одинаковые промахи склеиваются: модель вызывается один раз.
+        """
+        key = self._key(model, system_prompt, content, temperature, code)
+
+        if self.is_bypassed(endpoint):
+            self._count(endpoint, "bypass")
+            # Мимо кэша, но одинаковые одновременные запросы всё равно склеиваются
+            return self._single_flight(endpoint, "bypass:" + key, create)
+
+        cached = self.get(key)
+        if cached is not None:
+            self._count(endpoint, "hits")
+            return cached
+
+        return self._single_flight(endpoint, key, lambda: self._fill(endpoint, key, create))
+
+    def stream(self, endpoint, create_stream, *, model, system_prompt, content,
+               temperature=None, code=False):
+        """Потоковый вариант completion(): генератор кусков текста ответа.
+
+        create_stream() должен вернуть итератор текстовых дельт. Ответ из кэша
+        отдаётся одним куском; при промахе полный текст сохраняется под тем же
+        ключом, что и у completion(), после окончания потока. Ведомые запросы
+        (тот же ключ уже транслируется) получают итоговый текст одним куском.
+        """
+        if self.is_bypassed(endpoint):
+            self._count(endpoint, "bypass")
+            yield from create_stream()
+            return
+
+        key = self._key(model, system_prompt, content, temperature, code)
+        cached = self.get(key)
+        if cached is not None:
+            self._count(endpoint, "hits")
+            yield cached
+            return
+
+        if self.coalesce == "off":
+            yield from self._stream_fill(endpoint, key, create_stream)
+            return
+
+        call, leader = self.flights.begin(key)
+        if not leader:
+            try:
+                response = self.flights.wait(call, timeout=self.lease.total_seconds())
+            except Cancelled:
+                # Ведущий клиент отключился (или завис) — транслируем сами
+                yield from self._stream_fill(endpoint, key, create_stream)
+                return
+            self._count(endpoint, "coalesced")
+            yield response
+            return
+
+        parts = []
+        try:
+            for delta in self._stream_fill(endpoint, key, create_stream):
+                parts.append(delta)
+                yield delta
+        except Exception as e:
+            self.flights.finish(key, call, error=e)
+            raise
+        except BaseException:
+            self.flights.finish(key, call, error=Cancelled())
+            raise
+        self.flights.finish(key, call, result="".join(parts))
+
+    @staticmethod
+    def _key(model, system_prompt, content, temperature, code):
+        normalized = normalize_code(content) if code else normalize_text(content)
+        return make_key(model, system_prompt, temperature, normalized)
+
+    # ---------- склейка одинаковых запросов ----------
+    def _single_flight(self, endpoint, key, fn):
+        if self.coalesce == "off":
+            return fn()
+        result, shared = self.flights.do(key, fn)
+        if shared:
+            self._count(endpoint, "coalesced")
+        return result
+
+    def _fill(self, endpoint, key, create):
+        """Промах: вызвать модель и сохранить ответ (в режиме shared — под арендой ключа)."""
+        leased = self.coalesce == "shared" and self._acquire(key)
+        if self.coalesce == "shared" and not leased:
+            response = self._await(key)
+            if response is not None:
+                self._count(endpoint, "coalesced")
+                return response
+            # Другой процесс не получил ответ — вызываем модель сами
+
+        self._count(endpoint, "misses")
+        try:
+            response = create()
+            self.put(key, endpoint, response)
+            return response
+        finally:
+            if leased:
+                self._release(key)
+
+    def _stream_fill(self, endpoint, key, create_stream):
+        leased = self.coalesce == "shared" and self._acquire(key)
+        if self.coalesce == "shared" and not leased:
+            response = self._await(key)
+            if response is not None:
+                self._count(endpoint, "coalesced")
+                yield response
+                return
+
+        self._count(endpoint, "misses")
+        try:
+            parts = []
+            for delta in create_stream():
+                parts.append(delta)
+                yield delta
+            self.put(key, endpoint, "".join(parts))
+        finally:
+            if leased:
+                self._release(key)
+
+    # Между процессами: строка ai_inflight — аренда ключа. Ведомый процесс
+    # ждёт, пока ответ появится в ai_cache или аренда исчезнет/истечёт.
+    def _acquire(self, key):
+        now = datetime.utcnow()
+        db.session.execute(
+            delete(AIInflight).where(AIInflight.key == key, AIInflight.expires_at < now)
+        )
+        db.session.add(AIInflight(key=key, expires_at=now + self.lease))
+        try:
+            db.session.commit()
+            return True
+        except IntegrityError:
+            db.session.rollback()
+            return False
+
+    def _release(self, key):
+        db.session.execute(delete(AIInflight).where(AIInflight.key == key))
+        db.session.commit()
+
+    def _await(self, key):
+        deadline = time.monotonic() + self.lease.total_seconds()
+        while time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            response = db.session.execute(
+                select(AICacheEntry.response).where(AICacheEntry.key == key)
+            ).scalar()
+            leased = db.session.execute(
+                select(AIInflight.key).where(AIInflight.key == key)
+            ).scalar()
+            # Новая транзакция на каждой итерации — видим свежие записи
+            db.session.rollback()
+            if response is not None:
+                return response
+            if leased is None:
+                return None
+        return None
+
+    def get(self, key):
+        entry = db.session.get(AICacheEntry, key)
+        if entry is None:
+            return None
+
+        now = datetime.utcnow()
+        if self.ttl and entry.created_at < now - self.ttl:
+            db.session.delete(entry)
+            db.session.commit()
+            return None
+
+        db.session.execute(
+            update(AICacheEntry)
+            .where(AICacheEntry.key == key)
+            .values(last_used_at=now, hits=AICacheEntry.hits + 1)
+        )
+        db.session.commit()
+        return entry.response
+
+    def put(self, key, endpoint, response):
+        now = datetime.utcnow()
+        entry = db.session.get(AICacheEntry, key)
+        if entry is None:
+            entry = AICacheEntry(key=key, endpoint=endpoint)
+            db.session.add(entry)
+        entry.response = response
+        entry.created_at = now
+        entry.last_used_at = now
+        try:
+            db.session.commit()
+        except Exception:
+            # Гонка: тот же ключ уже записал другой воркер
+            db.session.rollback()
+            return
+
+        # Вытеснение — раз в EVICT_EVERY записей, а не на каждую
+        with self._lock:
+            self._puts += 1
+            due = self._puts % EVICT_EVERY == 0
+        if due:
+            self.evict()
+
+    def evict(self):
+        if self.ttl:
+            db.session.execute(
+                delete(AICacheEntry)
+                .where(AICacheEntry.created_at < datetime.utcnow() - self.ttl)
+            )
+
+        if self.max_entries:
+            # LRU: оставляем max_entries последних использованных
+            keep = (
+                select(AICacheEntry.key)
+                .order_by(AICacheEntry.last_used_at.desc())
+                .limit(self.max_entries)
+            )
+            db.session.execute(
+                delete(AICacheEntry).where(AICacheEntry.key.not_in(keep))
+            )
+        db.session.commit()
+
+    def clear(self, endpoint=None):
+        stmt = delete(AICacheEntry)
+        if endpoint:
+            stmt = stmt.where(AICacheEntry.endpoint == endpoint)
+        db.session.execute(stmt)
+        db.session.commit()
+
+    def _count(self, endpoint, kind):
+        with self._lock:
+            stats = self._stats.setdefault(
+                endpoint, {"hits": 0, "misses": 0, "bypass": 0, "coalesced": 0}
+            )
+            stats[kind] += 1
+
+    def stats(self):
+        with self._lock:
+            endpoints = {name: dict(s) for name, s in self._stats.items()}
+        return {
+            "entries": db.session.query(AICacheEntry).count(),
+            "in_flight": self.flights.in_flight(),
+            "endpoints": endpoints,
+        }
+
+
+def init_ai_cache(app):
+    bypass = [e.strip() for e in app.config.get("AI_CACHE_BYPASS", "").split(",") if e.strip()]
+    cache = AICache(
+        ttl_seconds=app.config.get("AI_CACHE_TTL", 7 * 24 * 3600),
+        max_entries=app.config.get("AI_CACHE_MAX_ENTRIES", 10000),
+        bypass=bypass,
+        coalesce=app.config.get("AI_COALESCE", "local"),
+        lease_seconds=app.config.get("AI_COALESCE_LEASE", 120),
+    )
+    app.extensions["ai_cache"] = cache
+    return cache
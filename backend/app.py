@@ -22,6 +22,86 @@ def create_app():
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY", None)
 
+    # Клиент LLM: провайдер "openai" или "fake" (детерминированный, без сети),
+    # таймаут вызова, повторы с джиттером, предохранитель, пул HTTP-соединений
+    app.config["LLM_PROVIDER"] = os.getenv("LLM_PROVIDER", "openai")
+    app.config["OPENAI_BASE_URL"] = os.getenv("OPENAI_BASE_URL") or None
+    app.config["LLM_TIMEOUT"] = float(os.getenv("LLM_TIMEOUT", 30))
+    app.config["LLM_MAX_RETRIES"] = int(os.getenv("LLM_MAX_RETRIES", 2))
+    app.config["LLM_BACKOFF_BASE"] = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+    app.config["LLM_BACKOFF_MAX"] = float(os.getenv("LLM_BACKOFF_MAX", 8))
+    app.config["LLM_BREAKER_THRESHOLD"] = int(os.getenv("LLM_BREAKER_THRESHOLD", 5))
+    app.config["LLM_BREAKER_COOLDOWN"] = float(os.getenv("LLM_BREAKER_COOLDOWN", 30))
+    app.config["LLM_MAX_CONNECTIONS"] = int(os.getenv("LLM_MAX_CONNECTIONS", 20))
+    app.config["LLM_FAKE_LATENCY_MS"] = int(os.getenv("LLM_FAKE_LATENCY_MS", 0))
+
+    # Проверка решений: "openai" (через LLM-клиент) или "fake" (локальный грейдер без сети)
+    app.config["GRADER"] = os.getenv("GRADER", "openai")
+    app.config["GRADING_WORKERS"] = int(os.getenv("GRADING_WORKERS", 4))
+    app.config["GRADING_MAX_ATTEMPTS"] = int(os.getenv("GRADING_MAX_ATTEMPTS", 3))
+    # Аренда задания (сек): после неё `running` считается брошенным упавшим процессом
+    app.config["GRADING_LEASE_SECONDS"] = int(os.getenv("GRADING_LEASE_SECONDS", 600))
+    # Как часто воркеры ищут истёкшие аренды (сек)
+    app.config["GRADING_REQUEUE_SECONDS"] = int(os.getenv("GRADING_REQUEUE_SECONDS", 60))
+    # Пауза перед повтором упавшего задания (сек), удваивается с каждой попыткой
+    app.config["GRADING_RETRY_SECONDS"] = float(os.getenv("GRADING_RETRY_SECONDS", 5))
+    app.config["GRADING_LLM_FEEDBACK"] = os.getenv("GRADING_LLM_FEEDBACK", "1") == "1"
+
+    # Песочница для тест-кейсов (лимиты на один запуск решения)
+    app.config["SANDBOX_WORKERS"] = int(os.getenv("SANDBOX_WORKERS", 0)) or None
+    app.config["SANDBOX_CPU_SECONDS"] = int(os.getenv("SANDBOX_CPU_SECONDS", 2))
+    app.config["SANDBOX_MEMORY_MB"] = int(os.getenv("SANDBOX_MEMORY_MB", 256))
+    app.config["SANDBOX_WALL_SECONDS"] = int(os.getenv("SANDBOX_WALL_SECONDS", 5))
+
+    # Массовая перепроверка задачи
+    app.config["REGRADE_WORKERS"] = int(os.getenv("REGRADE_WORKERS", 4))
+    app.config["REGRADE_BATCH_SIZE"] = int(os.getenv("REGRADE_BATCH_SIZE", 200))
+
+    # Кэш ответов LLM; AI_CACHE_BYPASS — список эндпоинтов через запятую
+    # (analyze-task, generate-tasks, teacher-generate, grading)
+    app.config["AI_CACHE_TTL"] = int(os.getenv("AI_CACHE_TTL", 7 * 24 * 3600))
+    app.config["AI_CACHE_MAX_ENTRIES"] = int(os.getenv("AI_CACHE_MAX_ENTRIES", 10000))
+    app.config["AI_CACHE_BYPASS"] = os.getenv("AI_CACHE_BYPASS", "")
+
+    # Склейка одинаковых одновременных запросов к LLM: "off", "local" (потоки
+    # процесса) или "shared" (ещё и между процессами — аренда ключа в БД, сек)
+    app.config["AI_COALESCE"] = os.getenv("AI_COALESCE", "local")
+    app.config["AI_COALESCE_LEASE"] = int(os.getenv("AI_COALESCE_LEASE", 120))
+
+    # Банк заранее сгенерированных AI-задач: целевой запас на тему/сложность
+    # (0 — выключен), порог фонового пополнения и задач за один вызов модели
+    app.config["TASK_BANK_TARGET"] = int(os.getenv("TASK_BANK_TARGET", 10))
+    app.config["TASK_BANK_LOW_WATER"] = int(os.getenv("TASK_BANK_LOW_WATER", 3))
+    app.config["TASK_BANK_BATCH"] = int(os.getenv("TASK_BANK_BATCH", 5))
+
+    # Хэширование паролей: метод werkzeug ("scrypt", "pbkdf2:sha256:600000", ...),
+    # отдельный пул, лимит очереди и дедлайн ожидания в очереди (сек)
+    app.config["PASSWORD_HASH_METHOD"] = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+    app.config["PASSWORD_HASH_WORKERS"] = int(os.getenv("PASSWORD_HASH_WORKERS", 0)) or None
+    app.config["PASSWORD_HASH_MAX_PENDING"] = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 256))
+    app.config["PASSWORD_HASH_QUEUE_DEADLINE"] = float(os.getenv("PASSWORD_HASH_QUEUE_DEADLINE", 5))
+
+    # Кэш готовых ответов для GET с ETag (записей; 0 — выключен, остаются ETag и 304)
+    app.config["RESPONSE_CACHE_SIZE"] = int(os.getenv("RESPONSE_CACHE_SIZE", 0))
+
+    # Метрики (/api/metrics, Prometheus): METRICS_TOKEN — Bearer-токен для
+    # сборщика (пусто — доступ только с JWT супер-админа); предупреждение N+1,
+    # если один SQL повторился за запрос N_PLUS_ONE_THRESHOLD раз (0 — выключено)
+    app.config["METRICS_ENABLED"] = os.getenv("METRICS_ENABLED", "1") == "1"
+    app.config["METRICS_TOKEN"] = os.getenv("METRICS_TOKEN") or None
+    app.config["N_PLUS_ONE_THRESHOLD"] = int(os.getenv("N_PLUS_ONE_THRESHOLD", 10))
+
+    # Сэмплирующий профайлер: при PROFILING_ENABLED=1 запрос с заголовком
+    # X-Profile профилируется, свёрнутые стеки пишутся в PROFILE_DIR
+    app.config["PROFILING_ENABLED"] = os.getenv("PROFILING_ENABLED", "0") == "1"
+    app.config["PROFILE_INTERVAL_MS"] = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+    app.config["PROFILE_DIR"] = os.getenv(
+        "PROFILE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "profiles")
+    )
+
+    # Кэш проверенных JWT (по хэшу токена, до его exp)
+    app.config["AUTH_TOKEN_CACHE_SIZE"] = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", 10000))
+
     # -------------------------------
     # 🧩 Подключаем базу данных
     # -------------------------------
@@ -37,11 +117,80 @@ def create_app():
             Task,
             TaskAssignment,
             StudentSubmission,
+            CodeBlob,
+            CodeFingerprint,
+            SimilarityBucket,
+            StudentStats,
+            TeacherStats,
+            GradingJob,
+            RegradeJob,
+            AICacheEntry,
+            AIInflight,
+            BankTask,
+            XPEvent,
+            AttendanceMonth,
+            ResourceVersion,
             SuperAdmin,
         )
     except Exception as e:
         print("⚠️ Ошибка при импорте моделей:", e)
 
+    # -------------------------------
+    # 🔐 Авторизация (JWT, роли, текущий пользователь)
+    # -------------------------------
+    from security import init_auth
+    from passwords import init_passwords
+    init_auth(app)
+    init_passwords(app)
+
+    # -------------------------------
+    # 🏷️ ETag / условные GET (версии ресурсов растут при записи)
+    # -------------------------------
+    from http_cache import init_http_cache
+    init_http_cache(app)
+
+    # -------------------------------
+    # 🤖 Клиент LLM и кэш ответов AI
+    # -------------------------------
+    from llm import init_llm
+    from ai_cache import init_ai_cache
+    init_llm(app)
+    init_ai_cache(app)
+
+    # -------------------------------
+    # 📈 Метрики запросов, SQL и LLM (/api/metrics), профайлер по запросу
+    # -------------------------------
+    from metrics import init_metrics
+    init_metrics(app)
+
+    # -------------------------------
+    # 📝 Песочница и очередь проверки решений
+    # -------------------------------
+    from sandbox import init_sandbox
+    from grading import init_grading
+    from regrade import init_regrade
+    init_sandbox(app)
+    init_grading(app)
+    init_regrade(app)
+
+    # -------------------------------
+    # 🏦 Банк AI-задач (нужны LLM-клиент и песочница для проверки эталона)
+    # -------------------------------
+    from task_bank import init_task_bank
+    init_task_bank(app)
+
+    # -------------------------------
+    # 🔎 Полнотекстовый поиск задач (FTS5, создаётся вместе с таблицей tasks)
+    # -------------------------------
+    from task_search import init_task_search
+    init_task_search(app)
+
+    # -------------------------------
+    # 🏆 Рейтинг по XP (в памяти, догружается после изменений XP)
+    # -------------------------------
+    from leaderboard import init_leaderboard
+    init_leaderboard(app)
+
     # -------------------------------
     # 🔌 Импорт и регистрация роутов
     # -------------------------------
@@ -62,7 +211,11 @@ def create_app():
     # 🌐 CORS — разрешаем запросы от фронтенда
     # -------------------------------
     # Разрешаем запросы с localhost:3000 (Next.js)
-    CORS(app, resources={r"/api/*": {"origins": ["http://localhost:3000", "http://127.0.0.1:3000"]}})
+    CORS(
+        app,
+        resources={r"/api/*": {"origins": ["http://localhost:3000", "http://127.0.0.1:3000"]}},
+        expose_headers=["X-Next-Cursor", "Link", "ETag", "X-Profile"],
+    )
 
     # -------------------------------
     # 🧠 Тестовый маршрут (для проверки связи)
@@ -85,8 +238,9 @@ if __name__ == "__main__":
     os.makedirs(instance_dir, exist_ok=True)
 
     with app.app_context():
-        # Создаём таблицы, если их нет
-        db.create_all()
+        # Создаём / обновляем схему через версионные миграции
+        from migrations import upgrade
+        upgrade()
 
         # Создаём дефолтного супер-админа (если отсутствует)
         try:
@@ -94,6 +248,23 @@ if __name__ == "__main__":
         except Exception as e:
             print("⚠️ Не удалось создать супер-админа:", e)
 
+        # Первый запуск со статистикой — заполняем её из существующих данных
+        from models import Student, StudentStats
+        from stats import rebuild_all
+        if Student.query.first() and not StudentStats.query.first():
+            rebuild_all()
+
+        # Рейтинг строится из БД один раз при старте
+        app.extensions["leaderboard"].rebuild()
+
+    # Запускаем воркеры проверки (подхватят задания, оставшиеся с прошлого запуска).
+    # debug-перезагрузчик выполняет этот блок дважды: родитель только следит за
+    # файлами и перезапускает дочерний процесс (WERKZEUG_RUN_MAIN=true) — воркеры там
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        app.extensions["grading_queue"].start()
+        app.extensions["regrade_queue"].start()
+        app.extensions["task_bank"].start()
+
     # Запускаем сервер
     print("🚀 Flask сервер запущен на http://127.0.0.1:5000")
     app.run(debug=True, port=5000)
@@ -0,0 +1,168 @@
+import calendar
+from datetime import date, datetime
+
+from sqlalchemy import func, insert, select, update
+
+from extensions import db
+from models import AttendanceMonth
+import stats
+import xp_ledger
+
+
+# ------------------------------------
+# Битовые карты месяца
+# ------------------------------------
+def month_start(day):
+    return day.replace(day=1)
+
+
+def bit(day):
+    return 1 << (day.day - 1)
+
+
+def days_in(month):
+    return calendar.monthrange(month.year, month.month)[1]
+
+
+def parse_day(value):
+    """'YYYY-MM-DD' → date; пусто — сегодня. ValueError — неверный формат."""
+    return date.fromisoformat(value) if value else date.today()
+
+
+def parse_month(value):
+    """'YYYY-MM' → первое число месяца; пусто — текущий месяц."""
+    if not value:
+        return month_start(date.today())
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+def month_days(month, bits):
+    """Дни месяца, чьи биты выставлены."""
+    return [month.replace(day=d + 1) for d in range(days_in(month)) if bits >> d & 1]
+
+
+# ------------------------------------
+# Отметка класса за день (в транзакции вызывающего, commit — снаружи)
+# ------------------------------------
+def mark_day(day, marks):
+    """marks: {student_id: present}. Один SELECT и два пакетных оператора на весь класс.
+
+    Возвращает {student_id: was_present} — прежнее состояние (None — день не был отмечен).
+    """
+    if not marks:
+        return {}
+
+    month = month_start(day)
+    mask = bit(day)
+    rows = {
+        row.student_id: row
+        for row in db.session.execute(
+            select(
+                AttendanceMonth.id, AttendanceMonth.student_id,
+                AttendanceMonth.marked, AttendanceMonth.present,
+            )
+            .where(AttendanceMonth.student_id.in_(marks), AttendanceMonth.month == month)
+        )
+    }
+
+    previous, created, changed = {}, [], []
+    for sid, present in marks.items():
+        row = rows.get(sid)
+        marked_bits, present_bits = (row.marked, row.present) if row else (0, 0)
+        previous[sid] = bool(present_bits & mask) if marked_bits & mask else None
+
+        marked_bits |= mask
+        present_bits = present_bits | mask if present else present_bits & ~mask
+        values = {
+            "marked": marked_bits,
+            "present": present_bits,
+            "marked_days": marked_bits.bit_count(),
+            "present_days": present_bits.bit_count(),
+        }
+        if row is None:
+            created.append({"student_id": sid, "month": month, **values})
+        elif (marked_bits, present_bits) != (row.marked, row.present):
+            changed.append({"id": row.id, **values})
+
+    if created:
+        db.session.execute(insert(AttendanceMonth), created)
+    if changed:
+        db.session.execute(update(AttendanceMonth), changed)
+
+    stats.class_attendance_marked(
+        (sid, present, previous[sid]) for sid, present in marks.items()
+    )
+    xp_ledger.class_attendance_marked(
+        day, ((sid, present, previous[sid]) for sid, present in marks.items())
+    )
+    return previous
+
+
+# ------------------------------------
+# Чтение
+# ------------------------------------
+def months(student_ids, first_month, last_month):
+    """{student_id: {month: (marked, present)}} за диапазон месяцев."""
+    result = {}
+    for sid, month, marked, present in db.session.execute(
+        select(
+            AttendanceMonth.student_id, AttendanceMonth.month,
+            AttendanceMonth.marked, AttendanceMonth.present,
+        )
+        .where(
+            AttendanceMonth.student_id.in_(student_ids),
+            AttendanceMonth.month >= first_month,
+            AttendanceMonth.month <= last_month,
+        )
+    ):
+        result.setdefault(sid, {})[month] = (marked, present)
+    return result
+
+
+def month_summary(month, marked, present):
+    """Тепловая карта месяца: по дню — True/False (отмечен) или None (урока не было)."""
+    return {
+        "month": month.strftime("%Y-%m"),
+        "days": [
+            bool(present >> d & 1) if marked >> d & 1 else None
+            for d in range(days_in(month))
+        ],
+        "marked_days": marked.bit_count(),
+        "present_days": present.bit_count(),
+        "percent": round(present.bit_count() * 100 / marked.bit_count(), 2) if marked else 0,
+    }
+
+
+def totals(student_id):
+    """(отмеченных дней, присутствий) за всё время — суммы счётчиков по месяцам."""
+    marked, present = db.session.execute(
+        select(
+            func.coalesce(func.sum(AttendanceMonth.marked_days), 0),
+            func.coalesce(func.sum(AttendanceMonth.present_days), 0),
+        )
+        .where(AttendanceMonth.student_id == student_id)
+    ).one()
+    return marked, present
+
+
+def streak(student_id):
+    """Подряд посещённые уроки, считая с последнего отмеченного дня назад.
+
+    Дни без урока (бит marked не выставлен) серию не прерывают; пропуск —
+    прерывает. Идём по месяцам от последнего: в каждом — битовые операции.
+    """
+    rows = db.session.execute(
+        select(AttendanceMonth.month, AttendanceMonth.marked, AttendanceMonth.present)
+        .where(AttendanceMonth.student_id == student_id)
+        .order_by(AttendanceMonth.month.desc())
+    )
+
+    count = 0
+    for month, marked, present in rows:
+        absent = marked & ~present
+        if absent:
+            # Присутствия после последнего пропуска в этом месяце
+            last_absent = absent.bit_length() - 1
+            return count + (present >> (last_absent + 1)).bit_count()
+        count += present.bit_count()
+    return count
@@ -0,0 +1,3 @@
+# Нагрузочный стенд: генератор синтетической школы (dataset), сценарии
+# нагрузки с замером задержек и SQL на запрос (load), история прогонов по
+# коммитам (history). Запуск: python -m bench --help
@@ -0,0 +1,170 @@
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Нагрузочный стенд: синтетическая школа + сценарии фронтенда.
+#
+#   cd backend
+#   python -m bench generate --db /tmp/school.db --students 5000 --submissions 150
+#   python -m bench run --db /tmp/school.db --iterations 2000 --concurrency 16
+#   python -m bench run --students 500 --submissions 40        # временная база
+#   python -m bench history --endpoint student.tasks
+#
+#   # Пик входов в начале урока: только логины, пул хэширования паролей
+#   python -m bench run --students 200 --submissions 0 --scenarios login --concurrency 64 --hash-method scrypt
+#
+# LLM — локальная детерминированная модель (LLM_PROVIDER=fake), поэтому
+# стенд работает без сети и ключа. Результаты дописываются в историю
+# (bench/results.jsonl) с хэшем коммита и сравниваются с прошлым прогоном
+# той же конфигурации.
+
+HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results.jsonl")
+
+parser = argparse.ArgumentParser(prog="python -m bench", description="EduAI load and benchmark suite")
+commands = parser.add_subparsers(dest="command", required=True)
+
+
+def dataset_args(p):
+    p.add_argument("--db", help="файл SQLite (по умолчанию — временный)")
+    p.add_argument("--teachers", type=int, default=20)
+    p.add_argument("--students", type=int, default=1000)
+    p.add_argument("--tasks", type=int, default=30, help="задач на учителя")
+    p.add_argument("--submissions", type=int, default=100, help="отправок на студента")
+    p.add_argument("--days", type=int, default=60, help="учебных дней посещаемости")
+    p.add_argument("--seed", type=int, default=42)
+
+
+dataset_args(commands.add_parser("generate", help="создать синтетическую школу"))
+
+run_parser = commands.add_parser("run", help="прогнать нагрузку и записать результат")
+dataset_args(run_parser)
+run_parser.add_argument("--iterations", type=int, default=1000, help="сценариев всего")
+run_parser.add_argument("--concurrency", type=int, default=8)
+run_parser.add_argument("--scenarios", help="через запятую (по умолчанию — вся смесь)")
+run_parser.add_argument("--llm-latency-ms", type=int, default=None, help="LLM_FAKE_LATENCY_MS")
+run_parser.add_argument("--hash-method", help="PASSWORD_HASH_METHOD (scrypt, pbkdf2:sha256:600000, ...)")
+run_parser.add_argument("--hash-workers", type=int, help="PASSWORD_HASH_WORKERS")
+run_parser.add_argument("--hash-max-pending", type=int, help="PASSWORD_HASH_MAX_PENDING")
+run_parser.add_argument("--history", default=HISTORY)
+run_parser.add_argument("--no-history", action="store_true", help="не записывать результат")
+
+history_parser = commands.add_parser("history", help="результаты по коммитам")
+history_parser.add_argument("--history", default=HISTORY)
+history_parser.add_argument("--endpoint", help="динамика одного запроса (например student.tasks)")
+
+args = parser.parse_args()
+
+if args.command == "history":
+    from bench import history
+
+    entries = history.load(args.history)
+    if not entries:
+        sys.exit(f"No benchmark runs in {args.history}")
+    if args.endpoint:
+        history.trend(args.history, args.endpoint)
+    else:
+        history.report(entries[-1], history.previous(entries[:-1], entries[-1]["config"]))
+    sys.exit(0)
+
+db_path = args.db or os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(db_path)}"
+os.environ.setdefault("OPENAI_API_KEY", "bench")
+os.environ["LLM_PROVIDER"] = "fake"
+if getattr(args, "llm_latency_ms", None) is not None:
+    os.environ["LLM_FAKE_LATENCY_MS"] = str(args.llm_latency_ms)
+for option, variable in (
+    ("hash_method", "PASSWORD_HASH_METHOD"),
+    ("hash_workers", "PASSWORD_HASH_WORKERS"),
+    ("hash_max_pending", "PASSWORD_HASH_MAX_PENDING"),
+):
+    if getattr(args, option, None) is not None:
+        os.environ[variable] = str(getattr(args, option))
+
+from app import app  # noqa: E402  (конфиг читается из окружения при импорте)
+from bench import dataset, history, load  # noqa: E402
+from extensions import db  # noqa: E402
+from migrations import upgrade  # noqa: E402
+from models import Student, StudentSubmission, Task, Teacher  # noqa: E402
+
+
+def sizes():
+    return {
+        "teachers": db.session.query(Teacher).count(),
+        "students": db.session.query(Student).count(),
+        "tasks": db.session.query(Task).count(),
+        "submissions": db.session.query(StudentSubmission).count(),
+    }
+
+
+with app.app_context():
+    upgrade()
+    if not db.session.query(Teacher).first():
+        print(f"🏫 Generating synthetic school in {db_path}")
+        started = time.perf_counter()
+        with db.engine.begin() as conn:
+            # Только для заполнения: база одноразовая, журнал и fsync не нужны
+            conn.exec_driver_sql("PRAGMA synchronous=OFF")
+            counts = dataset.generate(
+                conn,
+                teachers=args.teachers,
+                students=args.students,
+                tasks=args.tasks,
+                submissions=args.submissions,
+                days=args.days,
+                seed=args.seed,
+                password_hash=app.extensions["password_hasher"].hash(dataset.PASSWORD),
+            )
+        dataset.rebuild_derived()
+        print(f"✅ {sum(counts.values())} rows in {time.perf_counter() - started:.1f}s")
+    elif args.command == "generate":
+        sys.exit(f"{db_path} already has data; benchmark datasets are generated into an empty database")
+    school = sizes()
+
+if args.command == "generate":
+    sys.exit(0)
+
+scenarios = [s.strip() for s in args.scenarios.split(",")] if args.scenarios else None
+unknown = set(scenarios or []) - set(load.SCENARIOS)
+if unknown:
+    sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))} (known: {', '.join(load.SCENARIOS)})")
+
+config = {
+    **school,
+    "iterations": args.iterations,
+    "concurrency": args.concurrency,
+    "scenarios": scenarios or sorted(load.SCENARIOS),
+    "grader": app.config["GRADER"],
+    "llm_latency_ms": app.config["LLM_FAKE_LATENCY_MS"],
+    "response_cache": app.config["RESPONSE_CACHE_SIZE"],
+    "password_hash": app.extensions["password_hasher"].params,
+    "password_hash_workers": app.extensions["password_hasher"].workers,
+}
+print(f"🚦 {args.iterations} scenarios, concurrency {args.concurrency}: {school}")
+
+queue = app.extensions["grading_queue"]
+try:
+    result = load.run(
+        app,
+        teachers=school["teachers"],
+        students=school["students"],
+        iterations=args.iterations,
+        concurrency=args.concurrency,
+        seed=args.seed,
+        scenarios=scenarios,
+    )
+finally:
+    queue.stop()
+    app.extensions["regrade_queue"].stop()
+
+# Входы упираются в пул хэширования: его очередь и отказы (503) — рядом с перцентилями
+if "login" in config["scenarios"]:
+    print(f"🔐 hasher: {app.extensions['password_hasher'].stats()}")
+
+if args.no_history:
+    entry = {"commit": history.commit(), **result}
+    history.report(entry)
+else:
+    baseline = history.previous(history.load(args.history), config)
+    history.report(history.append(args.history, config, result), baseline)
@@ -0,0 +1,225 @@
+import json
+import random
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select
+
+from llm import FakeProvider
+from models import (
+    AttendanceMonth, CodeBlob, CodeFingerprint, CohortAssignment, SimilarityBucket, Student,
+    StudentSubmission, Task, TaskAssignment, Teacher, XPEvent,
+)
+import attendance
+import code_store
+import similarity
+import stats
+import xp_ledger
+
+
+# ------------------------------------
+# Синтетическая школа
+# ------------------------------------
+# Всё пишется пакетными INSERT (executemany) с заранее известными id, без
+# ORM-объектов: миллион строк собирается за десятки секунд. Производные
+# данные (XP, уровни, серии, счётчики stats) пересчитываются set-based
+# функциями приложения — так же, как после миграций.
+
+PASSWORD = "bench"
+CHUNK = 20000
+
+# Неверные решения: ошибка вывода, синтаксическая ошибка, «заглушка»
+WRONG = ("print(0)", "print(input(", "pass")
+
+# Доли: отправок — верных, дней — присутствий
+CORRECT_RATE = 0.6
+PRESENT_RATE = 0.85
+
+
+def teacher_email(i):
+    return f"t{i}@bench.kz"
+
+
+def student_email(i):
+    return f"s{i}@bench.kz"
+
+
+def _insert(conn, model, rows):
+    table = model.__table__
+    for i in range(0, len(rows), CHUNK):
+        conn.execute(table.insert(), rows[i:i + CHUNK])
+    return len(rows)
+
+
+def _school_days(days):
+    """Последние `days` будних дней (по возрастанию)."""
+    result, day = [], date.today()
+    while len(result) < days:
+        if day.weekday() < 5:
+            result.append(day)
+        day -= timedelta(days=1)
+    return result[::-1]
+
+
+def _tasks(teacher_ids, per_teacher):
+    tasks, solutions = [], {}
+    templates = FakeProvider.TEMPLATES
+    for tid in teacher_ids:
+        for k in range(per_teacher):
+            task_id = len(tasks) + 1
+            title, description, code, make_input, make_output = templates[task_id % len(templates)]
+            n = task_id % 50
+            tasks.append({
+                "id": task_id,
+                "teacher_id": tid,
+                "title": f"{title} #{task_id}",
+                "description": description,
+                "difficulty": ["Beginner", "Intermediate", "Advanced"][k % 3],
+                "complexity": ["low", "medium", "high"][task_id % 3],
+                "xp_reward": 100,
+                "example_code": code,
+                "hints": "Read the input with input()\nPrint only the answer",
+                "test_cases": json.dumps([{"input": make_input(n), "expected_output": make_output(n)}]),
+                "date_created": datetime.utcnow(),
+            })
+            # Варианты решений задачи: верное (с разными именами) и неверные
+            renamed = code.replace("a, b", "x, y").replace("a + b", "x + y")
+            solutions[task_id] = (list(dict.fromkeys([code, renamed])), list(WRONG))
+    return tasks, solutions
+
+
+def generate(conn, teachers=20, students=1000, tasks=30, submissions=100, days=60, seed=42,
+             password_hash=None, log=print):
+    """Заполнить ПУСТУЮ базу. tasks — на учителя, submissions — на студента.
+
+    Возвращает {таблица: число строк}.
+    """
+    if conn.execute(select(func.count()).select_from(Teacher.__table__)).scalar():
+        raise RuntimeError("Benchmark dataset needs an empty database")
+
+    rng = random.Random(seed)
+    counts = {}
+    started = time.perf_counter()
+
+    def step(name, rows):
+        counts[name] = counts.get(name, 0) + rows
+        log(f"   {name}: {counts[name]} rows ({time.perf_counter() - started:.1f}s)")
+
+    # ---------- учителя, студенты ----------
+    teacher_ids = list(range(1, teachers + 1))
+    step("teachers", _insert(conn, Teacher, [
+        {"id": tid, "email": teacher_email(tid), "password_hash": password_hash} for tid in teacher_ids
+    ]))
+
+    teacher_of = {sid: teacher_ids[(sid - 1) % teachers] for sid in range(1, students + 1)}
+    step("students", _insert(conn, Student, [
+        {
+            "id": sid,
+            "teacher_id": tid,
+            "first_name": "Bench",
+            "last_name": f"Student {sid}",
+            "email": student_email(sid),
+            "password_hash": password_hash,
+            "total_xp": 0,
+            "current_level": 1,
+            "streak": 0,
+        }
+        for sid, tid in teacher_of.items()
+    ]))
+
+    # ---------- задачи и назначения классам ----------
+    task_rows, solutions = _tasks(teacher_ids, tasks)
+    step("tasks", _insert(conn, Task, task_rows))
+    step("cohort_assignments", _insert(conn, CohortAssignment, [
+        {"task_id": t["id"], "teacher_id": t["teacher_id"], "assigned_at": t["date_created"]}
+        for t in task_rows
+    ]))
+    tasks_of = {}
+    for t in task_rows:
+        tasks_of.setdefault(t["teacher_id"], []).append(t["id"])
+
+    # ---------- код: блобы, подписи, корзины LSH ----------
+    code_hash, signatures, blobs, fingerprints, buckets = {}, {}, [], [], []
+    for task_id, (right, wrong) in solutions.items():
+        for code in right + wrong:
+            key = code_store.digest(code)
+            code_hash[(task_id, code)] = key
+            if key not in signatures:
+                codec, data = code_store.compress(code)
+                signatures[key] = similarity.signature(code)
+                blobs.append({"hash": key, "codec": codec, "data": data, "size": len(code.encode("utf-8"))})
+                fingerprints.append({"code_hash": key, "signature": similarity.pack(signatures[key])})
+            buckets.extend(similarity.bucket_rows(task_id, key, signatures[key]))
+    step("code_blobs", _insert(conn, CodeBlob, blobs))
+    step("code_fingerprints", _insert(conn, CodeFingerprint, fingerprints))
+    step("similarity_buckets", _insert(conn, SimilarityBucket, buckets))
+
+    # ---------- отправки, назначения, события XP ----------
+    school_days = _school_days(days)
+    submission_rows, assignment_keys, events = [], set(), []
+    for sid, tid in teacher_of.items():
+        for _ in range(submissions):
+            task_id = rng.choice(tasks_of[tid])
+            right, wrong = solutions[task_id]
+            correct = rng.random() < CORRECT_RATE
+            code = rng.choice(right if correct else wrong)
+            day = rng.choice(school_days)
+            xp = 100 if correct else 0
+            submission_rows.append({
+                "id": len(submission_rows) + 1,
+                "task_id": task_id,
+                "student_id": sid,
+                "code_hash": code_hash[(task_id, code)],
+                "is_correct": correct,
+                "xp_earned": xp,
+                "feedback": "correct" if correct else "incorrect",
+                "submitted_at": datetime.combine(day, datetime.min.time()) + timedelta(
+                    seconds=rng.randrange(8 * 3600, 17 * 3600)
+                ),
+            })
+            assignment_keys.add((sid, task_id))
+            events.append(xp_ledger.event(
+                sid, "submission", xp, day=day, active=1, ref_id=len(submission_rows)
+            ))
+    step("student_submissions", _insert(conn, StudentSubmission, submission_rows))
+    step("task_assignments", _insert(conn, TaskAssignment, [
+        {"student_id": sid, "task_id": task_id, "assigned_at": datetime.utcnow(), "is_completed": False}
+        for sid, task_id in sorted(assignment_keys)
+    ]))
+    del submission_rows, assignment_keys
+
+    # ---------- посещаемость (битовые карты месяцев) ----------
+    months = {}
+    for sid in teacher_of:
+        for day in school_days:
+            present = rng.random() < PRESENT_RATE
+            row = months.setdefault((sid, attendance.month_start(day)), [0, 0])
+            row[0] |= attendance.bit(day)
+            if present:
+                row[1] |= attendance.bit(day)
+                events.append(xp_ledger.event(sid, "attendance", day=day, active=1))
+            else:
+                events.append(xp_ledger.event(sid, "attendance", day=day))
+    step("attendance_months", _insert(conn, AttendanceMonth, [
+        {
+            "student_id": sid,
+            "month": month,
+            "marked": marked,
+            "present": present,
+            "marked_days": marked.bit_count(),
+            "present_days": present.bit_count(),
+        }
+        for (sid, month), (marked, present) in months.items()
+    ]))
+    step("xp_events", _insert(conn, XPEvent, events))
+    del events
+
+    # ---------- производные данные ----------
+    xp_ledger.recompute(conn)
+    log(f"   derived XP / levels / streaks ({time.perf_counter() - started:.1f}s)")
+    return counts
+
+
+def rebuild_derived():
+    """Счётчики stats — через сессию приложения (после generate)."""
+    stats.rebuild_all()
@@ -0,0 +1,89 @@
+import json
+import os
+import subprocess
+from datetime import datetime
+
+
+# ------------------------------------
+# История прогонов (JSON Lines, одна строка на прогон)
+# ------------------------------------
+# Прогоны сравнимы, только если совпадают размер данных и параметры
+# нагрузки — они сохраняются в "config" и служат ключом сравнения.
+
+def commit():
+    """Короткий хэш HEAD (+ "-dirty" при незакоммиченных изменениях) или None вне git."""
+    try:
+        head = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{head}-dirty" if dirty else head
+
+
+def load(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append(path, config, result):
+    entry = {
+        "commit": commit(),
+        "at": datetime.now().isoformat(timespec="seconds"),
+        "config": config,
+        **result,
+    }
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    return entry
+
+
+def previous(entries, config):
+    """Последний из entries прогон с тем же config — база для сравнения."""
+    for entry in reversed(entries):
+        if entry.get("config") == config:
+            return entry
+    return None
+
+
+def _change(new, old):
+    if not old:
+        return ""
+    return f"{(new - old) * 100 / old:+.0f}%"
+
+
+def report(entry, baseline=None, log=print):
+    """Таблица перцентилей; с baseline — изменение p95 и SQL на запрос."""
+    log(f"⏱️ {entry['requests']} requests in {entry['duration_s']}s — {entry['throughput_rps']} req/s"
+        f" (commit {entry.get('commit') or '?'})")
+    if baseline:
+        log(f"   compared with {baseline.get('commit') or '?'} from {baseline.get('at')}")
+    log(f"   {'endpoint':<22}{'n':>7}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'sql':>7}{'max':>5}{'Δp95':>8}{'Δsql':>7}")
+
+    old = (baseline or {}).get("endpoints", {})
+    for name, e in entry["endpoints"].items():
+        was = old.get(name, {})
+        log(
+            f"   {name:<22}{e['count']:>7}{e['errors']:>5}"
+            f"{e['p50_ms']:>8.1f}m{e['p95_ms']:>8.1f}m{e['p99_ms']:>8.1f}m"
+            f"{e['queries_mean']:>7.1f}{e['queries_max']:>5}"
+            f"{_change(e['p95_ms'], was.get('p95_ms')):>8}{_change(e['queries_mean'], was.get('queries_mean')):>7}"
+        )
+
+
+def trend(path, endpoint, log=print):
+    """p95 и SQL/запрос одного эндпоинта по всем прогонам (по коммитам)."""
+    log(f"   {'commit':<16}{'at':<21}{'config':<36}{'p95':>9}{'sql':>7}")
+    for entry in load(path):
+        e = entry.get("endpoints", {}).get(endpoint)
+        if e is None:
+            continue
+        config = entry.get("config", {})
+        shape = f"{config.get('students')}st/{config.get('submissions')}sub/c{config.get('concurrency')}"
+        log(f"   {entry.get('commit') or '?':<16}{entry.get('at', ''):<21}{shape:<36}"
+            f"{e['p95_ms']:>8.1f}m{e['queries_mean']:>7.1f}")
@@ -0,0 +1,215 @@
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+
+from bench.dataset import PASSWORD, student_email, teacher_email
+from extensions import db
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+# ------------------------------------
+# Замеры: задержка и число SQL-запросов на запрос
+# ------------------------------------
+class Recorder:
+    """Задержки, статусы и число SQL-запросов по именам запросов.
+
+    SQL считаются в потоке, выполняющем запрос (test_client вызывает
+    обработчик синхронно), поэтому запросы воркеров проверки не
+    подмешиваются к замерам.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.latencies = {}
+        self.queries = {}
+        self.statuses = {}
+
+    def count_query(self, *args, **kwargs):
+        if getattr(self._local, "active", False):
+            self._local.queries += 1
+
+    def request(self, name, send):
+        self._local.active, self._local.queries = True, 0
+        started = time.perf_counter()
+        try:
+            response = send()
+        finally:
+            elapsed = time.perf_counter() - started
+            self._local.active = False
+        with self._lock:
+            self.latencies.setdefault(name, []).append(elapsed)
+            self.queries.setdefault(name, []).append(self._local.queries)
+            statuses = self.statuses.setdefault(name, {})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        return response
+
+    def summary(self):
+        result = {}
+        for name in sorted(self.latencies):
+            latencies, queries = self.latencies[name], self.queries[name]
+            errors = sum(n for status, n in self.statuses[name].items() if status >= 400)
+            result[name] = {
+                "count": len(latencies),
+                "errors": errors,
+                "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                "p90_ms": round(percentile(latencies, 90) * 1000, 2),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+                "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+                "queries_mean": round(statistics.mean(queries), 2),
+                "queries_max": max(queries),
+                "statuses": {str(k): v for k, v in sorted(self.statuses[name].items())},
+            }
+        return result
+
+
+# ------------------------------------
+# Сценарии (виртуальный пользователь)
+# ------------------------------------
+class Session:
+    """Клиент одного потока: токены пользователей запоминаются после входа."""
+
+    def __init__(self, app, recorder, teachers, students, rng):
+        self.client = app.test_client()
+        self.recorder = recorder
+        self.teachers = teachers
+        self.students = students
+        self.rng = rng
+        self.tokens = {}
+
+    def call(self, name, method, url, token=None, **kwargs):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        return self.recorder.request(
+            name, lambda: self.client.open(url, method=method, headers=headers, **kwargs)
+        )
+
+    def login(self, role, user_id):
+        email = student_email(user_id) if role == "student" else teacher_email(user_id)
+        response = self.call(f"{role}.login", "POST", "/api/auth/login", json={
+            "email": email, "password": PASSWORD, "role": role,
+        })
+        if response.status_code == 200:
+            self.tokens[(role, user_id)] = response.get_json()["token"]
+        return self.tokens.get((role, user_id))
+
+    def token(self, role, user_id):
+        return self.tokens.get((role, user_id)) or self.login(role, user_id)
+
+    def student(self):
+        sid = self.rng.randint(1, self.students)
+        return sid, self.token("student", sid)
+
+    def teacher(self):
+        tid = self.rng.randint(1, self.teachers)
+        return tid, self.token("teacher", tid)
+
+
+def login(s):
+    s.login("student", s.rng.randint(1, s.students))
+
+
+def student_dashboard(s):
+    _, token = s.student()
+    s.call("student.profile", "GET", "/api/student/profile", token)
+    s.call("student.tasks", "GET", "/api/student/tasks", token)
+    s.call("student.leaderboard", "GET", "/api/student/leaderboard", token)
+    s.call("student.attendance", "GET", "/api/student/attendance", token)
+
+
+def task_list(s):
+    _, token = s.student()
+    s.call("student.tasks", "GET", "/api/student/tasks", token)
+    tid, token = s.teacher()
+    s.call("teacher.tasks", "GET", f"/api/teacher/{tid}/tasks", token)
+
+
+def submit(s):
+    _, token = s.student()
+    tasks = s.call("student.tasks", "GET", "/api/student/tasks", token).get_json() or []
+    if not tasks:
+        return
+    task = s.rng.choice(tasks)
+    code = s.rng.choice(["a, b = map(int, input().split())\nprint(a + b)", "print(input()[::-1])", "print(0)"])
+    response = s.call("student.submit", "POST", "/api/student/submit", token,
+                      json={"task_id": task["task_id"], "code": code})
+    if response.status_code == 202:
+        job_id = response.get_json()["job_id"]
+        s.call("student.grading", "GET", f"/api/student/grading/{job_id}?wait=10", token)
+
+
+def teacher_dashboard(s):
+    tid, token = s.teacher()
+    s.call("teacher.stats", "GET", f"/api/teacher/{tid}/stats", token)
+    s.call("teacher.students", "GET", f"/api/teacher/{tid}/students", token)
+    s.call("teacher.tasks", "GET", f"/api/teacher/{tid}/tasks", token)
+    s.call("teacher.leaderboard", "GET", f"/api/teacher/{tid}/leaderboard", token)
+
+
+def generate_task(s):
+    # Ответ даёт локальная модель (LLM_PROVIDER=fake), задержка — LLM_FAKE_LATENCY_MS
+    tid, token = s.teacher()
+    s.call("teacher.generate", "POST", f"/api/teacher/{tid}/tasks/generate", token,
+           json={"prompt": f"loops practice {s.rng.randint(1, 20)}", "difficulty": "Beginner"})
+
+
+# Сценарий → вес в смеси нагрузки
+SCENARIOS = {
+    "login": (login, 1),
+    "student_dashboard": (student_dashboard, 6),
+    "task_list": (task_list, 4),
+    "submit": (submit, 3),
+    "teacher_dashboard": (teacher_dashboard, 2),
+    "generate_task": (generate_task, 0.5),
+}
+
+
+def run(app, teachers, students, iterations=1000, concurrency=8, seed=1, scenarios=None, log=print):
+    """Выполнить `iterations` сценариев в `concurrency` потоков. Возвращает сводку."""
+    chosen = {name: SCENARIOS[name] for name in (scenarios or SCENARIOS)}
+    names = list(chosen)
+    weights = [chosen[name][1] for name in names]
+
+    recorder = Recorder()
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", recorder.count_query)
+
+    local = threading.local()
+    counter = iter(range(iterations))
+    counter_lock = threading.Lock()
+
+    def worker(n):
+        if not hasattr(local, "session"):
+            local.session = Session(app, recorder, teachers, students, random.Random(seed * 1000 + n))
+        s = local.session
+        name = s.rng.choices(names, weights)[0]
+        chosen[name][0](s)
+        with counter_lock:
+            done = next(counter) + 1
+        if done % max(iterations // 10, 1) == 0:
+            log(f"   {done}/{iterations} scenarios")
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(worker, range(iterations)))
+    finally:
+        event.remove(engine, "before_cursor_execute", recorder.count_query)
+    elapsed = time.perf_counter() - started
+
+    requests = sum(len(v) for v in recorder.latencies.values())
+    return {
+        "duration_s": round(elapsed, 2),
+        "requests": requests,
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else 0,
+        "endpoints": recorder.summary(),
+    }
@@ -0,0 +1,132 @@
+import hashlib
+import zlib
+
+from sqlalchemy import delete, exists, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from extensions import db
+from models import CodeBlob, CodeFingerprint, SimilarityBucket, StudentSubmission
+
+
+# ------------------------------------
+# Кодеки
+# ------------------------------------
+# Отправки — короткие тексты, на которых zlib без словаря почти ничего не
+# выигрывает. Предустановленный словарь (частые конструкции Python из
+# решений) сжимает их в разы. Словарь — часть формата: менять только
+# вместе с новым именем кодека, старые блобы читаются по старому.
+ZDICT_V1 = (
+    b"    return \n        return \nelif else:\nexcept ValueError:\ntry:\n"
+    b"while True:\nbreak\ncontinue\nimport math\nfrom math import \n"
+    b"len(range(enumerate(sorted(reversed(sum(max(min(abs(round(\n"
+    b".append(.split().strip().join(.lower().upper().replace(.count(.items()\n"
+    b"str(int(float(list(dict(set(tuple(\nfor i in range(len(\nfor x in \n"
+    b"if __name__ == \"__main__\":\ndef main():\ndef solve(\nprint(f\"\n"
+    b"a, b = map(int, input().split())\nn = int(input())\ns = input()\n"
+    b"print(\nprint(input()\nprint(sum(\nprint(max(\nprint(min(\n"
+    b"result = \ncount = 0\ntotal = 0\n    if \n    for \n    print(\n"
+)
+
+CODECS = ("raw", "zlib", "zd1")
+
+
+def compress(text):
+    """(codec, data): самый короткий из вариантов."""
+    raw = text.encode("utf-8")
+    packer = zlib.compressobj(level=9, zdict=ZDICT_V1)
+    with_dict = packer.compress(raw) + packer.flush()
+    plain = zlib.compress(raw, 9)
+    return min(("raw", raw), ("zlib", plain), ("zd1", with_dict), key=lambda c: len(c[1]))
+
+
+def decompress(codec, data):
+    if codec == "raw":
+        raw = data
+    elif codec == "zlib":
+        raw = zlib.decompress(data)
+    elif codec == "zd1":
+        unpacker = zlib.decompressobj(zdict=ZDICT_V1)
+        raw = unpacker.decompress(data) + unpacker.flush()
+    else:
+        raise ValueError(f"Unknown code codec: {codec}")
+    return raw.decode("utf-8")
+
+
+def digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# ------------------------------------
+# Хранилище (content-addressed)
+# ------------------------------------
+def put(text):
+    """Сохранить код (если такого ещё нет) и вернуть его хэш для code_hash."""
+    key = digest(text)
+    if db.session.get(CodeBlob, key) is not None:
+        return key
+
+    codec, data = compress(text)
+    # Одинаковый код могут одновременно отправить несколько студентов
+    db.session.execute(
+        sqlite_insert(CodeBlob)
+        .values(hash=key, codec=codec, data=data, size=len(text.encode("utf-8")))
+        .on_conflict_do_nothing(index_elements=["hash"])
+    )
+    return key
+
+
+def preload(hashes):
+    """Загрузить блобы одним запросом: submission.code для них не пойдёт в БД."""
+    hashes = set(hashes)
+    if hashes:
+        db.session.execute(select(CodeBlob).where(CodeBlob.hash.in_(hashes))).scalars().all()
+
+
+def release(hashes):
+    """Удалить блобы, на которые больше не ссылается ни одна отправка."""
+    hashes = set(hashes)
+    if not hashes:
+        return
+    db.session.flush()
+    orphans = set(db.session.execute(
+        select(CodeBlob.hash).where(
+            CodeBlob.hash.in_(hashes),
+            ~exists().where(StudentSubmission.code_hash == CodeBlob.hash),
+        )
+    ).scalars())
+    if not orphans:
+        return
+
+    # Вместе с блобом — его подпись и корзины индекса похожести
+    for model, column in (
+        (SimilarityBucket, SimilarityBucket.code_hash),
+        (CodeFingerprint, CodeFingerprint.code_hash),
+        (CodeBlob, CodeBlob.hash),
+    ):
+        db.session.execute(
+            delete(model).where(column.in_(orphans)).execution_options(synchronize_session=False)
+        )
+
+
+def hashes_of(*criteria):
+    """Хэши кода отправок по условию — собрать ДО удаления, освободить release() после."""
+    return set(db.session.execute(
+        select(StudentSubmission.code_hash).where(*criteria).distinct()
+    ).scalars())
+
+
+def stats():
+    row = db.session.execute(
+        select(
+            db.func.count(CodeBlob.hash),
+            db.func.coalesce(db.func.sum(CodeBlob.size), 0),
+            db.func.coalesce(db.func.sum(db.func.length(CodeBlob.data)), 0),
+        )
+    ).one()
+    submissions = db.session.execute(select(db.func.count(StudentSubmission.id))).scalar()
+    return {
+        "blobs": row[0],
+        "submissions": submissions,
+        "raw_bytes": row[1],
+        "stored_bytes": row[2],
+    }
@@ -0,0 +1,65 @@
+from sqlalchemy import and_, or_, union
+
+from extensions import db
+from models import CohortAssignment, Task, TaskAssignment
+
+
+# ------------------------------------
+# Назначение задач когорте (классу учителя)
+# ------------------------------------
+# Задача назначается одной строкой cohort_assignments, независимо от
+# размера класса. Задачи студента = задачи когорты его учителя + задачи
+# с явной строкой task_assignments (назначения, сделанные до когорт).
+# Отправка решения строк task_assignments не создаёт: иначе отправка в
+# чужую задачу навсегда добавила бы её в список студента.
+
+def assign_to_cohort(task):
+    """O(1): одна строка на задачу (commit делает вызывающий)."""
+    assignment = CohortAssignment(task_id=task.id, teacher_id=task.teacher_id)
+    db.session.add(assignment)
+    return assignment
+
+
+def student_tasks(student):
+    """[(task, task_assignment | None, assigned_at)] в порядке назначения."""
+    task_ids = union(
+        db.select(CohortAssignment.task_id)
+        .where(CohortAssignment.teacher_id == student.teacher_id),
+        db.select(TaskAssignment.task_id)
+        .where(TaskAssignment.student_id == student.id),
+    )
+
+    rows = (
+        db.session.query(Task, TaskAssignment, CohortAssignment.assigned_at)
+        .outerjoin(
+            TaskAssignment,
+            and_(TaskAssignment.task_id == Task.id, TaskAssignment.student_id == student.id),
+        )
+        .outerjoin(
+            CohortAssignment,
+            and_(CohortAssignment.task_id == Task.id, CohortAssignment.teacher_id == student.teacher_id),
+        )
+        .filter(Task.id.in_(task_ids))
+        .order_by(Task.id)
+        .all()
+    )
+
+    return [
+        (task, assignment, cohort_assigned_at or assignment.assigned_at)
+        for task, assignment, cohort_assigned_at in rows
+    ]
+
+
+def is_assigned(student, task_id):
+    """Задача в когорте учителя студента или назначена ему явно (один запрос)."""
+    in_cohort = (
+        db.select(CohortAssignment.id)
+        .where(CohortAssignment.task_id == task_id, CohortAssignment.teacher_id == student.teacher_id)
+        .exists()
+    )
+    explicit = (
+        db.select(TaskAssignment.id)
+        .where(TaskAssignment.task_id == task_id, TaskAssignment.student_id == student.id)
+        .exists()
+    )
+    return db.session.query(or_(in_cohort, explicit)).scalar()
@@ -0,0 +1,178 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+
+from flask import Response, stream_with_context
+from sqlalchemy import select
+
+from attendance import bit, month_days
+from code_store import decompress
+from extensions import db
+from models import AttendanceMonth, CodeBlob, Student, StudentStats, StudentSubmission, Task
+
+
+# Сколько строк читаем из БД за один запрос
+CHUNK_SIZE = 1000
+
+
+# ------------------------------------
+# Наборы данных журнала
+# ------------------------------------
+# Каждый набор: (ключ keyset-пагинации, функция, строящая select по учителю).
+# Колонки select'а = колонки файла; include_code влияет только на submissions.
+def _students(teacher_id, include_code=False):
+    stmt = (
+        select(
+            Student.id,
+            Student.first_name,
+            Student.last_name,
+            Student.email,
+            Student.teacher_id,
+            Student.total_xp,
+            Student.current_level,
+            Student.streak,
+            StudentStats.attendance_days,
+            StudentStats.present_days,
+            StudentStats.total_submissions,
+            StudentStats.correct_submissions,
+        )
+        .outerjoin(StudentStats, StudentStats.student_id == Student.id)
+    )
+    if teacher_id is not None:
+        stmt = stmt.where(Student.teacher_id == teacher_id)
+    return stmt
+
+
+def _attendance(teacher_id, include_code=False):
+    stmt = select(
+        AttendanceMonth.id,
+        AttendanceMonth.student_id,
+        AttendanceMonth.month,
+        AttendanceMonth.marked,
+        AttendanceMonth.present,
+    )
+    if teacher_id is not None:
+        stmt = stmt.join(Student, Student.id == AttendanceMonth.student_id).where(Student.teacher_id == teacher_id)
+    return stmt
+
+
+def _attendance_days(rows):
+    # Месячная битовая карта → строка на каждый отмеченный день
+    return [
+        (student_id, day, bool(present & bit(day)))
+        for _, student_id, month, marked, present in rows
+        for day in month_days(month, marked)
+    ]
+
+
+def _submissions(teacher_id, include_code=False):
+    columns = [
+        StudentSubmission.id,
+        StudentSubmission.student_id,
+        StudentSubmission.task_id,
+        Task.title.label("task_title"),
+        StudentSubmission.is_correct,
+        StudentSubmission.xp_earned,
+        StudentSubmission.submitted_at,
+    ]
+    stmt = select(*columns).join(Task, Task.id == StudentSubmission.task_id)
+    if include_code:
+        # Сжатый блоб + кодек; распаковывает _submission_code
+        stmt = stmt.add_columns(CodeBlob.codec, CodeBlob.data.label("code")).join(
+            CodeBlob, CodeBlob.hash == StudentSubmission.code_hash
+        )
+    if teacher_id is not None:
+        stmt = stmt.join(Student, Student.id == StudentSubmission.student_id).where(Student.teacher_id == teacher_id)
+    return stmt
+
+
+DATASETS = {
+    "students": (Student.id, _students),
+    "attendance": (AttendanceMonth.id, _attendance),
+    "submissions": (StudentSubmission.id, _submissions),
+}
+
+def _submission_code(rows):
+    if not rows or "code" not in rows[0]._fields:
+        return rows
+    return [(*row[:-2], decompress(row[-2], row[-1])) for row in rows]
+
+
+# Наборы, где строки файла ≠ строкам таблицы: (колонки файла или None — колонки
+# select'а, преобразование порции)
+EXPANDED = {
+    "attendance": (["student_id", "date", "is_present"], _attendance_days),
+    "submissions": (None, _submission_code),
+}
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+
+# ------------------------------------
+# Потоковое чтение и запись
+# ------------------------------------
+def iter_chunks(key, stmt, chunk_size=None):
+    """Строки порциями по chunk_size (keyset по key) — память не растёт с объёмом."""
+    chunk_size = chunk_size or CHUNK_SIZE
+    last = None
+    while True:
+        page = stmt.order_by(key)
+        if last is not None:
+            page = page.where(key > last)
+        rows = db.session.execute(page.limit(chunk_size)).all()
+        if not rows:
+            return
+        yield rows
+        last = rows[-1][0]
+        if len(rows) < chunk_size:
+            return
+
+
+def _value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _csv_lines(columns, chunks):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(columns)
+    yield buffer.getvalue()
+
+    for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([[_value(v) for v in row] for row in rows])
+        yield buffer.getvalue()
+
+
+def _ndjson_lines(columns, chunks):
+    for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(columns, map(_value, row))), ensure_ascii=False) + "\n"
+            for row in rows
+        )
+
+
+def export_response(dataset, fmt, teacher_id=None, include_code=False):
+    key, build = DATASETS[dataset]
+    stmt = build(teacher_id, include_code)
+    columns = [c.name for c in stmt.selected_columns]
+
+    chunks = iter_chunks(key, stmt)
+    if dataset in EXPANDED:
+        expanded_columns, expand = EXPANDED[dataset]
+        columns = expanded_columns or [c for c in columns if c != "codec"]
+        chunks = map(expand, chunks)
+    lines = _csv_lines(columns, chunks) if fmt == "csv" else _ndjson_lines(columns, chunks)
+
+    scope = f"teacher{teacher_id}" if teacher_id is not None else "school"
+    response = Response(stream_with_context(lines), mimetype=FORMATS[fmt])
+    response.headers["Content-Disposition"] = f'attachment; filename="{scope}-{dataset}.{fmt}"'
+    return response
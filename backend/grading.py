@@ -0,0 +1,420 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_, update
+
+from extensions import db
+from models import GradingJob, Task
+from sandbox import parse_test_cases, summarize
+import stats
+import xp_ledger
+
+
+# ------------------------------------
+# Грейдеры
+# ------------------------------------
+class LLMGrader:
+    """Проверка кода через LLM (gpt-4o-mini), ответы кэшируются."""
+
+    model = "gpt-4o-mini"
+
+    def __init__(self, llm, cache=None):
+        self.llm = llm
+        self.cache = cache
+
+    def grade(self, task, code):
+        system_prompt = (
+            "Проверь код Python и оцени правильно ли решена задача.\n"
+            f"Задача: {task.title}\n"
+            f"{task.description}\n"
+            "Ответь одним словом: correct или incorrect."
+        )
+
+        def create():
+            return self.llm.complete(
+                "grading",
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": code},
+                ],
+            )
+
+        if self.cache is not None:
+            raw = self.cache.completion(
+                "grading", create,
+                model=self.model,
+                system_prompt=system_prompt,
+                content=code,
+                code=True,
+            )
+        else:
+            raw = create()
+
+        feedback = raw.strip().lower()
+        return parse_verdict(feedback), feedback
+
+    def review(self, task, code, test_summary):
+        """Качественный отзыв по коду (вердикт уже вынесен тестами)."""
+        system_prompt = (
+            "Ты опытный учитель Python. Дай короткий отзыв (2-3 предложения) "
+            "о стиле и логике решения. Не решай задачу за студента.\n"
+            f"Задача: {task.title}\n"
+            f"{task.description}\n"
+            f"Результат тестов: {test_summary}"
+        )
+
+        def create():
+            return self.llm.complete(
+                "grading-review",
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": code},
+                ],
+                temperature=0.3,
+                max_tokens=200,
+            )
+
+        if self.cache is not None:
+            return self.cache.completion(
+                "grading", create,
+                model=self.model,
+                system_prompt=system_prompt,
+                content=code,
+                temperature=0.3,
+                code=True,
+            ).strip()
+        return create().strip()
+
+
+class FakeGrader:
+    """Локальный детерминированный грейдер (для тестов и офлайн-разработки).
+
+    Код считается правильным, если он компилируется.
+    """
+
+    def grade(self, task, code):
+        try:
+            compile(code, "<submission>", "exec")
+        except SyntaxError as e:
+            return False, f"incorrect: {e.msg} (line {e.lineno})"
+        return True, "correct"
+
+    def review(self, task, code, test_summary):
+        return ""
+
+
+class TestCaseGrader:
+    """Детерминированный вердикт по тест-кейсам задачи, LLM — только для отзыва.
+
+    Задачи без тест-кейсов проверяются прежним грейдером (fallback).
+    """
+
+    def __init__(self, engine, fallback, llm_feedback=True):
+        self.engine = engine
+        self.fallback = fallback
+        self.llm_feedback = llm_feedback
+
+    def grade(self, task, code):
+        cases = parse_test_cases(task.test_cases)
+        if not cases:
+            return self.fallback.grade(task, code)
+
+        report = self.engine.submit(code, cases).result()
+        is_correct = report["passed"] == report["total"]
+        feedback = summarize(report)
+
+        if self.llm_feedback:
+            try:
+                review = self.fallback.review(task, code, feedback)
+            except Exception as e:
+                # Без отзыва вердикт всё равно валиден
+                print("AI REVIEW ERROR:", e)
+                review = ""
+            if review:
+                feedback = f"{feedback}\n\n{review}"
+
+        return is_correct, feedback
+
+
+def parse_verdict(feedback):
+    """`correct` / `incorrect` → bool ("incorrect" содержит "correct")."""
+    words = feedback.replace(".", " ").replace("!", " ").split()
+    return bool(words) and words[0] == "correct"
+
+
+def make_grader(app):
+    kind = app.config.get("GRADER", "openai")
+    if kind == "fake":
+        grader = FakeGrader()
+    else:
+        grader = LLMGrader(app.extensions["llm"], cache=app.extensions.get("ai_cache"))
+
+    engine = app.extensions.get("sandbox")
+    if engine is None:
+        return grader
+    return TestCaseGrader(engine, grader, llm_feedback=app.config.get("GRADING_LLM_FEEDBACK", True))
+
+
+# ------------------------------------
+# Очередь проверки (durable, в той же БД)
+# ------------------------------------
+class GradingQueue:
+    """Пул воркеров, разбирающий таблицу grading_jobs.
+
+    Задания переживают падения: `running`, взятые дольше lease секунд назад
+    (процесс-владелец упал, поток воркера погиб), возвращаются в `queued` —
+    при старте и затем не чаще раза в requeue_interval перед захватом.
+    Воркеры захватывают задание атомарным UPDATE ... WHERE status='queued',
+    поэтому несколько процессов могут работать с одной очередью.
+    """
+
+    def __init__(self, app, grader, workers=4, max_attempts=3, poll_interval=2.0, lease=600,
+                 requeue_interval=60, retry_delay=5):
+        self.app = app
+        self.grader = grader
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.requeue_interval = requeue_interval
+        self._next_requeue = 0.0
+
+        self._wakeup = threading.Event()
+        self._finished = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._requeue_lock = threading.Lock()
+
+    # ---------- жизненный цикл ----------
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            with self.app.app_context():
+                self._requeue_due()
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker, name=f"grader-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wakeup.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+        self._stop.clear()
+
+    # ---------- API для роутов ----------
+    def enqueue(self, submission):
+        """Создаёт задание в текущей сессии (commit делает вызывающий)."""
+        job = GradingJob(submission=submission, status="queued")
+        db.session.add(job)
+        return job
+
+    def notify(self):
+        self.start()
+        self._wakeup.set()
+
+    def wait_for(self, job_id, timeout):
+        """Long-poll: ждём завершения задания не дольше timeout секунд."""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = db.session.get(GradingJob, job_id, populate_existing=True)
+            remaining = deadline - time.monotonic()
+            if job is None or job.status in ("done", "failed") or remaining <= 0:
+                return job
+            # Другие процессы нас не разбудят — поэтому ждём с шагом poll_interval
+            with self._finished:
+                self._finished.wait(min(remaining, self.poll_interval))
+
+    def drain(self):
+        """Синхронно обработать все задания в текущем потоке (для тестов/CLI)."""
+        processed = 0
+        while True:
+            job_id = self._claim()
+            if job_id is None:
+                return processed
+            self._run(job_id)
+            processed += 1
+
+    # ---------- воркер ----------
+    def _worker(self):
+        failures = 0
+        with self.app.app_context():
+            while not self._stop.is_set():
+                try:
+                    job_id = self._claim()
+                except Exception as e:
+                    print("GRADING CLAIM ERROR:", e)
+                    db.session.rollback()
+                    job_id = None
+
+                if job_id is None:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    continue
+
+                try:
+                    self._run(job_id)
+                    failures = 0
+                except Exception as e:
+                    # БД заблокирована, сбой журнала / stats / commit — задание не должно остаться `running`
+                    print("GRADING ERROR:", e)
+                    db.session.rollback()
+                    self._release(job_id, e)
+                    failures += 1
+                    # Пауза растёт с числом сбоев подряд: сразу повторять «database is locked» бессмысленно
+                    self._stop.wait(min(self.poll_interval * 2 ** (failures - 1), 60))
+                finally:
+                    db.session.remove()
+
+    def _requeue_stale(self):
+        # Свежие `running` может проверять другой процесс — их не трогаем
+        expired = datetime.utcnow() - timedelta(seconds=self.lease)
+        db.session.execute(
+            update(GradingJob)
+            .where(GradingJob.status == "running", GradingJob.started_at < expired)
+            .values(status="queued", started_at=None)
+        )
+        db.session.commit()
+
+    def _requeue_due(self):
+        """Истёкшие аренды проверяет один воркер раз в requeue_interval, а не каждый захват."""
+        with self._requeue_lock:
+            now = time.monotonic()
+            if now < self._next_requeue:
+                return
+            self._next_requeue = now + self.requeue_interval
+        self._requeue_stale()
+
+    def _claim(self):
+        self._requeue_due()
+
+        while True:
+            candidate = (
+                db.session.query(GradingJob.id)
+                .filter(
+                    GradingJob.status == "queued",
+                    or_(GradingJob.available_at.is_(None), GradingJob.available_at <= datetime.utcnow()),
+                )
+                .order_by(GradingJob.id)
+                .first()
+            )
+            if candidate is None:
+                return None
+
+            result = db.session.execute(
+                update(GradingJob)
+                .where(GradingJob.id == candidate.id, GradingJob.status == "queued")
+                .values(
+                    status="running",
+                    started_at=datetime.utcnow(),
+                    attempts=GradingJob.attempts + 1,
+                )
+            )
+            db.session.commit()
+
+            # rowcount == 0 → задание перехватил другой воркер, берём следующее
+            if result.rowcount == 1:
+                return candidate.id
+
+    def _run(self, job_id):
+        job = db.session.get(GradingJob, job_id)
+        if job is None:
+            return
+        submission = job.submission
+
+        # Отправку уже проверили (задание вернули в очередь после истёкшей аренды)
+        if xp_ledger.submission_recorded(submission.id):
+            self._finish(job)
+            return
+
+        task = db.session.get(Task, submission.task_id)
+
+        try:
+            is_correct, feedback = self.grader.grade(task, submission.code)
+        except Exception as e:
+            db.session.rollback()
+            self._release(job_id, e)
+            return
+
+        xp = task.xp_reward if is_correct else 0
+
+        submission.is_correct = is_correct
+        submission.xp_earned = xp
+        submission.feedback = feedback
+
+        # XP, уровень и серия — через журнал XP (атомарный инкремент внутри);
+        # повторная проверка той же отправки XP и счётчики не меняет
+        if xp_ledger.submission_graded(submission, xp):
+            stats.submission_graded(submission.student_id, correct=int(is_correct))
+
+        self._finish(job)
+
+    def _release(self, job_id, error):
+        """Вернуть задание в очередь (с паузой) или, если попытки кончились, — failed.
+
+        Пауза удваивается с каждой попыткой: retry_delay, 2 * retry_delay, ...
+        До её конца _claim задание не берёт.
+        """
+        try:
+            job = db.session.get(GradingJob, job_id)
+            job.error = str(error)
+            if job.attempts < self.max_attempts:
+                job.status = "queued"
+                job.available_at = datetime.utcnow() + timedelta(
+                    seconds=self.retry_delay * 2 ** max(job.attempts - 1, 0)
+                )
+            else:
+                job.status = "failed"
+                job.finished_at = datetime.utcnow()
+            db.session.commit()
+        except Exception as e:
+            # Не удалось даже записать статус: задание вернёт _requeue_stale, когда истечёт аренда
+            print("GRADING RELEASE ERROR:", e)
+            db.session.rollback()
+        self._signal()
+
+    def _finish(self, job):
+        job.status = "done"
+        job.error = None
+        job.finished_at = datetime.utcnow()
+        db.session.commit()
+        self._signal()
+
+    def _signal(self):
+        with self._finished:
+            self._finished.notify_all()
+
+
+def init_grading(app):
+    queue = GradingQueue(
+        app,
+        make_grader(app),
+        workers=app.config.get("GRADING_WORKERS", 4),
+        max_attempts=app.config.get("GRADING_MAX_ATTEMPTS", 3),
+        lease=app.config.get("GRADING_LEASE_SECONDS", 600),
+        requeue_interval=app.config.get("GRADING_REQUEUE_SECONDS", 60),
+        retry_delay=app.config.get("GRADING_RETRY_SECONDS", 5),
+    )
+    app.extensions["grading_queue"] = queue
+    return queue
+
+
+def job_to_dict(job):
+    submission = job.submission
+    return {
+        "job_id": job.id,
+        "submission_id": submission.id,
+        "status": job.status,
+        "is_correct": submission.is_correct if job.status == "done" else None,
+        "xp_earned": submission.xp_earned if job.status == "done" else None,
+        "feedback": submission.feedback if job.status == "done" else None,
+        "error": job.error if job.status == "failed" else None,
+    }
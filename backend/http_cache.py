@@ -0,0 +1,200 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, has_app_context, make_response, request
+from sqlalchemy import event, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from extensions import db
+from models import ResourceVersion
+
+
+# ------------------------------------
+# Версии ресурсов
+# ------------------------------------
+# Каждая запись, влияющая на ответ, увеличивает счётчик его ресурса.
+# ETag ответа — хэш версий его ресурсов, поэтому If-None-Match проверяется
+# одним запросом по первичному ключу, без запросов тела ответа. Ключ "all"
+# входит в каждый ETag: его увеличивают полные пересчёты (rebuild_all).
+GLOBAL = "all"
+
+
+def student_key(student_id):
+    return f"student:{student_id}"
+
+
+def teacher_key(teacher_id):
+    return f"teacher:{teacher_id}"
+
+
+def tasks_key(teacher_id):
+    return f"tasks:{teacher_id}"
+
+
+def bump(keys):
+    """Ресурсы изменились в текущей транзакции; версии растут при её commit."""
+    if not has_app_context() or "http_cache" not in current_app.extensions:
+        return
+    db.session.info.setdefault(current_app.extensions["http_cache"].session_key, set()).update(keys)
+
+
+def versions(keys):
+    """{key: version}; у ресурса без записей версия 0."""
+    found = dict(db.session.execute(
+        select(ResourceVersion.key, ResourceVersion.version).where(ResourceVersion.key.in_(keys))
+    ).all())
+    return {key: found.get(key, 0) for key in keys}
+
+
+def _increment(session, keys):
+    stmt = sqlite_insert(ResourceVersion)
+    session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["key"],
+            set_={"version": ResourceVersion.version + 1},
+        ),
+        [{"key": key, "version": 1} for key in sorted(keys)],
+    )
+
+
+# ------------------------------------
+# Кэш ответов в памяти процесса
+# ------------------------------------
+class ResponseCache:
+    """LRU: ETag → готовый ответ (тело и заголовки пагинации).
+
+    ETag уже содержит версии ресурсов, поэтому устаревшая запись не может
+    быть отдана. Записи, чьи ресурсы изменились в этом процессе, удаляются
+    сразу после commit (evict), а изменённые другими процессами — вытесняются LRU.
+    """
+
+    HEADERS = ("X-Next-Cursor", "Link")
+
+    def __init__(self, max_entries=0):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, etag):
+        if not self.max_entries:
+            return None
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(etag)
+            self.hits += 1
+            return entry[1:]
+
+    def put(self, etag, keys, response):
+        if not self.max_entries:
+            return
+        headers = [(name, response.headers[name]) for name in self.HEADERS if name in response.headers]
+        with self._lock:
+            self._entries[etag] = (frozenset(keys), response.get_data(), response.mimetype, headers)
+            self._entries.move_to_end(etag)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def evict(self, keys):
+        if not self.max_entries:
+            return
+        with self._lock:
+            if GLOBAL in keys:
+                self._entries.clear()
+                return
+            stale = [etag for etag, entry in self._entries.items() if not entry[0].isdisjoint(keys)]
+            for etag in stale:
+                del self._entries[etag]
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class HTTPCache:
+    def __init__(self, max_entries=0):
+        self.responses = ResponseCache(max_entries)
+        self.session_key = f"http_cache:{id(self)}"
+
+
+# ------------------------------------
+# Условный GET
+# ------------------------------------
+def _etag(keys, current):
+    raw = "|".join([request.endpoint, request.query_string.decode()] + [f"{k}={current[k]}" for k in keys])
+    return hashlib.blake2b(raw.encode(), digest_size=16).hexdigest()
+
+
+def conditional(resources):
+    """ETag, 304 на If-None-Match и (если включён) кэш ответов.
+
+    resources(*args, **kwargs) — ключи ресурсов, от которых зависит ответ
+    (аргументы те же, что у обработчика), или None — отдать без ETag
+    (например, чужой teacher_id: обработчик сам ответит 403). Версии
+    читаются ДО тела ответа: запись между ними даст лишь лишний 200.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            keys = resources(*args, **kwargs)
+            if keys is None:
+                return f(*args, **kwargs)
+
+            keys = sorted(set(keys) | {GLOBAL})
+            etag = _etag(keys, versions(keys))
+
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+                response.set_etag(etag)
+                return response
+
+            cache = current_app.extensions["http_cache"].responses
+            cached = cache.get(etag)
+            if cached is not None:
+                body, mimetype, headers = cached
+                response = current_app.response_class(body, mimetype=mimetype, headers=headers)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                cache.put(etag, keys, response)
+
+            response.set_etag(etag)
+            # Браузер хранит ответ, но перед использованием сверяет ETag
+            response.headers["Cache-Control"] = "private, no-cache"
+            return response
+
+        return decorated
+    return decorator
+
+
+def init_http_cache(app):
+    cache = HTTPCache(app.config["RESPONSE_CACHE_SIZE"])
+    app.extensions["http_cache"] = cache
+    committed_key = f"{cache.session_key}:committed"
+
+    @event.listens_for(db.session, "before_commit")
+    def _before_commit(session):
+        keys = session.info.pop(cache.session_key, None)
+        if keys:
+            _increment(session, keys)
+            session.info[committed_key] = keys
+
+    @event.listens_for(db.session, "after_commit")
+    def _after_commit(session):
+        keys = session.info.pop(committed_key, None)
+        if keys:
+            cache.responses.evict(keys)
+
+    @event.listens_for(db.session, "after_soft_rollback")
+    def _after_rollback(session, previous_transaction):
+        session.info.pop(cache.session_key, None)
+        session.info.pop(committed_key, None)
+
+    return cache
@@ -0,0 +1,258 @@
+import threading
+
+from flask import current_app, has_app_context
+from sortedcontainers import SortedList
+from sqlalchemy import event, select
+
+from extensions import db
+from models import Student
+import http_cache
+
+
+# Версия рейтинга в resource_versions: растёт при каждом commit, менявшем XP
+# или класс студентов (в любом процессе), и при полных пересчётах (GLOBAL)
+VERSION_KEY = "leaderboard"
+
+
+# ------------------------------------
+# Рейтинг по XP (order-statistic дерево)
+# ------------------------------------
+class Ranking:
+    """Отсортированный по убыванию XP список студентов.
+
+    Ключ — (-xp, student_id): при равном XP выше тот, у кого id меньше.
+    Ранг «спортивный»: 1 + число студентов со строго большим XP, поэтому
+    у равных по XP студентов ранг одинаковый. Вставка, удаление, top-K и
+    ранг — O(log n) (+K для top-K).
+    """
+
+    def __init__(self):
+        self._keys = SortedList()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, student_id, xp):
+        self._keys.add((-xp, student_id))
+
+    def discard(self, student_id, xp):
+        self._keys.discard((-xp, student_id))
+
+    def top(self, k):
+        return [(sid, -neg_xp) for neg_xp, sid in self._keys.islice(0, k)]
+
+    def rank(self, xp):
+        return self._keys.bisect_left((-xp,)) + 1
+
+
+class Leaderboard:
+    """Глобальный рейтинг и рейтинги классов (по учителю) в памяти процесса.
+
+    Изменения XP не пересчитываются на месте: stats помечает студентов
+    «грязными» в сессии (mark_dirty), после commit пометки переходят сюда,
+    а при следующем чтении одним запросом перечитываются только эти
+    студенты. Откат транзакции пометки сбрасывает. Полная загрузка из БД —
+    при первом обращении и при rebuild() (старт сервера, rebuild_all).
+
+    XP пишут и другие процессы (воркеры проверки, перепроверка), их пометки
+    сюда не попадают. Поэтому каждое чтение сверяет версию рейтинга в БД
+    (один запрос по первичному ключу): если она ушла дальше, чем объясняют
+    commit'ы этого процесса, рейтинг загружается заново.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._global = Ranking()
+        self._classes = {}
+        self._students = {}  # student_id -> (xp, teacher_id)
+        self._dirty = set()
+        self._loaded = False
+        self._version = 0  # версия БД, которой соответствует рейтинг
+        self._own = 0  # свои commit'ы после неё (каждый +1 к версии)
+        self.session_key = f"leaderboard:{id(self)}"
+
+    # ---------- загрузка и обновление ----------
+    def rebuild(self):
+        # Пометки, пришедшие во время загрузки, не теряются — их перечитает _refresh
+        with self._lock:
+            self._dirty.clear()
+            self._own = 0
+        version = _db_version()
+        rows = db.session.execute(select(Student.id, Student.teacher_id, Student.total_xp)).all()
+        with self._lock:
+            self._global = Ranking()
+            self._classes = {}
+            self._students = {}
+            for sid, tid, xp in rows:
+                self._put(sid, xp or 0, tid)
+            self._version = version
+            self._loaded = True
+        return len(rows)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+
+    def committed(self, student_ids):
+        with self._lock:
+            self._dirty.update(student_ids)
+            self._own += 1
+
+    def _refresh(self):
+        if not self._loaded:
+            self.rebuild()
+            return
+
+        version = _db_version()
+        with self._lock:
+            expected = self._version + self._own
+            # Версию увеличил другой процесс: какие студенты изменились, неизвестно
+            stale = version > expected
+            if not stale:
+                # Свои commit'ы, ещё не видные в прочитанной версии, остаются в _own
+                self._version, self._own = version, expected - version
+                dirty, self._dirty = self._dirty, set()
+        if stale:
+            self.rebuild()
+            return
+        if not dirty:
+            return
+
+        rows = {
+            sid: (xp or 0, tid)
+            for sid, tid, xp in db.session.execute(
+                select(Student.id, Student.teacher_id, Student.total_xp)
+                .where(Student.id.in_(dirty))
+            )
+        }
+        with self._lock:
+            for sid in dirty:
+                self._drop(sid)
+                if sid in rows:
+                    self._put(sid, *rows[sid])
+
+    def _put(self, student_id, xp, teacher_id):
+        self._students[student_id] = (xp, teacher_id)
+        self._global.add(student_id, xp)
+        if teacher_id is not None:
+            self._classes.setdefault(teacher_id, Ranking()).add(student_id, xp)
+
+    def _drop(self, student_id):
+        old = self._students.pop(student_id, None)
+        if old is None:
+            return
+        xp, teacher_id = old
+        self._global.discard(student_id, xp)
+        ranking = self._classes.get(teacher_id)
+        if ranking is not None:
+            ranking.discard(student_id, xp)
+            if not len(ranking):
+                del self._classes[teacher_id]
+
+    # ---------- запросы ----------
+    def top(self, k, teacher_id=None):
+        """[(student_id, xp, rank)] — первые k мест."""
+        self._refresh()
+        with self._lock:
+            ranking = self._ranking(teacher_id)
+            if ranking is None:
+                return []
+            return [(sid, xp, ranking.rank(xp)) for sid, xp in ranking.top(k)]
+
+    def position(self, student_id, teacher_id=None):
+        """{"rank", "xp", "of"} студента в рейтинге или None, если его там нет."""
+        self._refresh()
+        with self._lock:
+            entry = self._students.get(student_id)
+            ranking = self._ranking(teacher_id)
+            if entry is None or ranking is None:
+                return None
+            xp, tid = entry
+            if teacher_id is not None and tid != teacher_id:
+                return None
+            return {"rank": ranking.rank(xp), "xp": xp, "of": len(ranking)}
+
+    def _ranking(self, teacher_id):
+        return self._global if teacher_id is None else self._classes.get(teacher_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "loaded": self._loaded,
+                "students": len(self._students),
+                "classes": len(self._classes),
+                "dirty": len(self._dirty),
+                "version": self._version,
+            }
+
+
+def _db_version():
+    current = http_cache.versions([VERSION_KEY, http_cache.GLOBAL])
+    return current[VERSION_KEY] + current[http_cache.GLOBAL]
+
+
+# ------------------------------------
+# Ответ API
+# ------------------------------------
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+
+
+def top_entries(board, limit, teacher_id=None):
+    """Первые места с именами (один запрос за именами только для top-K)."""
+    rows = board.top(min(max(limit, 1), MAX_LIMIT), teacher_id)
+    names = {
+        sid: (first, last)
+        for sid, first, last in db.session.execute(
+            select(Student.id, Student.first_name, Student.last_name)
+            .where(Student.id.in_([sid for sid, _, _ in rows]))
+        )
+    }
+    return [
+        {
+            "rank": rank,
+            "student_id": sid,
+            "first_name": names.get(sid, ("", ""))[0],
+            "last_name": names.get(sid, ("", ""))[1],
+            "xp": xp,
+        }
+        for sid, xp, rank in rows
+    ]
+
+
+# ------------------------------------
+# Пометки в транзакции (вызываются из stats)
+# ------------------------------------
+def mark_dirty(student_ids):
+    """XP / класс студентов изменились в текущей транзакции."""
+    if not has_app_context():
+        return
+    board = current_app.extensions.get("leaderboard")
+    student_ids = set(student_ids)
+    if board is None or not student_ids:
+        return
+    db.session.info.setdefault(board.session_key, set()).update(student_ids)
+    # Версия растёт на 1 за commit — по ней остальные процессы узнают об изменении
+    http_cache.bump([VERSION_KEY])
+
+
+def invalidate():
+    if has_app_context() and "leaderboard" in current_app.extensions:
+        current_app.extensions["leaderboard"].invalidate()
+
+
+def init_leaderboard(app):
+    board = Leaderboard()
+    app.extensions["leaderboard"] = board
+
+    @event.listens_for(db.session, "after_commit")
+    def _after_commit(session):
+        ids = session.info.pop(board.session_key, None)
+        if ids:
+            board.committed(ids)
+
+    @event.listens_for(db.session, "after_soft_rollback")
+    def _after_rollback(session, previous_transaction):
+        session.info.pop(board.session_key, None)
+
+    return board
@@ -0,0 +1,413 @@
+import ast
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import deque
+
+import httpx
+import openai
+from openai import OpenAI
+
+
+# Сколько последних задержек хранить на эндпоинт (для перцентилей)
+LATENCY_WINDOW = 1000
+
+
+class LLMError(Exception):
+    """Вызов модели не удался (после всех повторов)."""
+
+
+class CircuitOpen(LLMError):
+    """Провайдер недавно отказывал подряд — вызовы временно не выполняются."""
+
+
+# ------------------------------------
+# Провайдеры
+# ------------------------------------
+# Провайдер выполняет один запрос без повторов; таймауты, повторы,
+# предохранитель и метрики — в LLMClient.
+# complete(...) → (текст, usage), stream(...) → итератор (дельта | None, usage | None).
+
+class OpenAIProvider:
+    # Ошибки, после которых есть смысл повторить запрос
+    RETRYABLE = (
+        openai.APITimeoutError,
+        openai.APIConnectionError,
+        openai.RateLimitError,
+        openai.InternalServerError,
+    )
+
+    def __init__(self, api_key=None, base_url=None, max_connections=20):
+        # Один пул HTTP-соединений (keep-alive) на весь процесс
+        self.http = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+        )
+        self.client = OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            http_client=self.http,
+            max_retries=0,
+        )
+
+    @staticmethod
+    def _usage(usage):
+        if usage is None:
+            return {}
+        return {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens}
+
+    def complete(self, endpoint, timeout, **request):
+        response = self.client.chat.completions.create(**request, timeout=timeout)
+        return response.choices[0].message.content, self._usage(response.usage)
+
+    def stream(self, endpoint, timeout, **request):
+        chunks = self.client.chat.completions.create(
+            **request,
+            stream=True,
+            stream_options={"include_usage": True},
+            timeout=timeout,
+        )
+        for chunk in chunks:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content, None
+            if chunk.usage is not None:
+                yield None, self._usage(chunk.usage)
+
+
+class FakeProvider:
+    """Детерминированная локальная модель: ответ зависит только от запроса.
+
+    Форма ответа выбирается по эндпоинту и совпадает с тем, что ждут
+    парсеры роутов, поэтому всё приложение работает офлайн (нагрузочные
+    тесты, разработка без ключа). latency_ms имитирует задержку сети.
+    """
+
+    RETRYABLE = ()
+
+    def __init__(self, latency_ms=0, chunk_size=16):
+        self.latency = latency_ms / 1000
+        self.chunk_size = chunk_size
+
+    @staticmethod
+    def _seed(request):
+        payload = json.dumps(request["messages"], ensure_ascii=False, sort_keys=True)
+        return int(hashlib.sha256(payload.encode("utf-8")).hexdigest()[:8], 16)
+
+    # (название, условие, решение, вход по числу n, ответ по числу n)
+    TEMPLATES = [
+        ("Sum of two numbers", "Read two integers on one line and print their sum.",
+         "a, b = map(int, input().split())\nprint(a + b)",
+         lambda n: f"{n} {n + 3}", lambda n: str(2 * n + 3)),
+        ("Largest element", "Read a line of integers and print the largest of them.",
+         "print(max(map(int, input().split())))",
+         lambda n: f"{n} {n * 2} {n - 1}", lambda n: str(max(n, n * 2, n - 1))),
+        ("Reverse a word", "Read a word and print it written backwards.",
+         "print(input()[::-1])",
+         lambda n: f"word{n}", lambda n: f"word{n}"[::-1]),
+        ("Count the vowels", "Read a lowercase word and print how many vowels it contains.",
+         "print(sum(c in 'aeiou' for c in input()))",
+         lambda n: "education" * (n % 3 + 1), lambda n: str(5 * (n % 3 + 1))),
+        ("Factorial", "Read a non-negative integer n and print n factorial.",
+         "import math\nprint(math.factorial(int(input())))",
+         lambda n: str(n % 10), lambda n: str(__import__("math").factorial(n % 10))),
+        ("Even numbers", "Read a line of integers and print how many of them are even.",
+         "print(sum(int(x) % 2 == 0 for x in input().split()))",
+         lambda n: f"{n} {n + 1} {n + 2} {n + 4}", lambda n: str(3 if n % 2 == 0 else 1)),
+    ]
+
+    @classmethod
+    def _task(cls, seed, i):
+        title, description, code, make_input, make_output = cls.TEMPLATES[(seed + i) % len(cls.TEMPLATES)]
+        n = seed % 50 + i
+        return {
+            "title": f"{title} #{seed % 1000}-{i}",
+            "description": description,
+            "difficulty": ["Beginner", "Intermediate", "Advanced"][(seed + i) % 3],
+            "complexity": "low",
+            "example_code": code,
+            "hints": ["Read the input with input()", "Print only the answer"],
+            "ai_analysis": "Generated by the local fake provider",
+            "test_cases": [{"input": make_input(n), "expected_output": make_output(n)}],
+        }
+
+    def respond(self, endpoint, request):
+        seed = self._seed(request)
+        content = request["messages"][-1]["content"]
+
+        if endpoint == "grading":
+            try:
+                ast.parse(content)
+            except SyntaxError:
+                return "incorrect"
+            return "correct"
+        if endpoint == "analyze-task":
+            lines = len(content.splitlines())
+            return json.dumps({
+                "complexity": "low" if lines < 10 else "medium" if lines < 40 else "high",
+                "estimated_time": 5 + lines,
+                "recommendations": ["Add comments", "Use descriptive names"],
+            })
+        if endpoint == "generate-tasks":
+            return json.dumps([self._task(seed, i) for i in range(3)], ensure_ascii=False)
+        if endpoint == "task-bank":
+            return json.dumps([self._task(seed, i) for i in range(5)], ensure_ascii=False)
+        if endpoint == "teacher-generate":
+            return json.dumps(self._task(seed, 0), ensure_ascii=False)
+        return f"Solution reviewed (#{seed % 1000}). Keep the code simple and readable."
+
+    def _usage(self, request, text):
+        prompt = sum(len(m["content"].split()) for m in request["messages"])
+        return {"prompt_tokens": prompt, "completion_tokens": len(text.split())}
+
+    def complete(self, endpoint, timeout, **request):
+        if self.latency:
+            time.sleep(self.latency)
+        text = self.respond(endpoint, request)
+        return text, self._usage(request, text)
+
+    def stream(self, endpoint, timeout, **request):
+        text = self.respond(endpoint, request)
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+        for chunk in chunks:
+            if self.latency:
+                time.sleep(self.latency / len(chunks))
+            yield chunk, None
+        yield None, self._usage(request, text)
+
+
+# ------------------------------------
+# Предохранитель
+# ------------------------------------
+class CircuitBreaker:
+    """closed → (threshold отказов подряд) → open → (cooldown) → half-open.
+
+    В half-open пропускается один пробный вызов: успех закрывает
+    предохранитель, отказ снова открывает его на cooldown.
+    """
+
+    def __init__(self, threshold=5, cooldown=30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._probe = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self._probe:
+                self._probe = True
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probe = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probe or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self._probe = False
+
+
+# ------------------------------------
+# Клиент: таймауты, повторы, метрики
+# ------------------------------------
+class LLMClient:
+    def __init__(self, provider, timeout=30.0, max_retries=2, backoff_base=0.5,
+                 backoff_max=8.0, breaker=None):
+        self.provider = provider
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+
+        self._lock = threading.Lock()
+        self._metrics = {}
+        # Внешние наблюдатели вызовов: fn(endpoint, seconds, usage, outcome)
+        self.observers = []
+
+    # ---------- вызовы ----------
+    def complete(self, endpoint, *, model, messages, timeout=None, **params):
+        """Текст ответа модели. endpoint — имя для метрик (и ответа fake-провайдера)."""
+        request = dict(model=model, messages=messages, **params)
+
+        def call():
+            return self.provider.complete(endpoint, timeout or self.timeout, **request)
+
+        return self._with_retries(endpoint, call)
+
+    def stream(self, endpoint, *, model, messages, timeout=None, **params):
+        """Генератор текстовых дельт. Повтор возможен, пока не отдан первый кусок."""
+        request = dict(model=model, messages=messages, **params)
+        attempt = 0
+        while True:
+            started = self._before(endpoint)
+            usage = {}
+            sent = False
+            try:
+                for delta, chunk_usage in self.provider.stream(endpoint, timeout or self.timeout, **request):
+                    if chunk_usage:
+                        usage = chunk_usage
+                    if delta:
+                        sent = True
+                        yield delta
+            except GeneratorExit:
+                # Клиент отключился посреди потока — провайдер при этом отвечал
+                self._succeeded(endpoint, started, usage)
+                raise
+            except Exception as e:
+                if not sent and self._should_retry(endpoint, e, attempt):
+                    attempt += 1
+                    continue
+                self._failed(endpoint, started)
+                raise LLMError(str(e)) from e
+
+            self._succeeded(endpoint, started, usage)
+            return
+
+    def _with_retries(self, endpoint, call):
+        attempt = 0
+        while True:
+            started = self._before(endpoint)
+            try:
+                text, usage = call()
+            except Exception as e:
+                if self._should_retry(endpoint, e, attempt):
+                    attempt += 1
+                    continue
+                self._failed(endpoint, started)
+                raise LLMError(str(e)) from e
+
+            self._succeeded(endpoint, started, usage)
+            return text
+
+    def _before(self, endpoint):
+        if not self.breaker.allow():
+            self._count(endpoint, "short_circuited")
+            raise CircuitOpen("LLM provider is unavailable, try again later")
+        self._count(endpoint, "calls")
+        return time.perf_counter()
+
+    def _should_retry(self, endpoint, error, attempt):
+        if not isinstance(error, self.provider.RETRYABLE):
+            # Ошибка запроса (400, 401, ...): провайдер доступен, предохранитель не трогаем
+            self.breaker.success()
+            return False
+
+        self.breaker.failure()
+        if attempt >= self.max_retries:
+            return False
+
+        # Экспоненциальная задержка с полным джиттером
+        self._count(endpoint, "retries")
+        time.sleep(random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt)))
+        return True
+
+    # ---------- метрики ----------
+    def _endpoint(self, endpoint):
+        return self._metrics.setdefault(endpoint, {
+            "calls": 0,
+            "errors": 0,
+            "retries": 0,
+            "short_circuited": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "latency": deque(maxlen=LATENCY_WINDOW),
+        })
+
+    def _count(self, endpoint, name):
+        with self._lock:
+            self._endpoint(endpoint)[name] += 1
+
+    def _failed(self, endpoint, started):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            m = self._endpoint(endpoint)
+            m["errors"] += 1
+            m["latency"].append(elapsed)
+        self._observe(endpoint, elapsed, {}, "error")
+
+    def _succeeded(self, endpoint, started, usage):
+        self.breaker.success()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            m = self._endpoint(endpoint)
+            m["latency"].append(elapsed)
+            m["prompt_tokens"] += usage.get("prompt_tokens") or 0
+            m["completion_tokens"] += usage.get("completion_tokens") or 0
+        self._observe(endpoint, elapsed, usage, "ok")
+
+    def _observe(self, endpoint, elapsed, usage, outcome):
+        for observer in self.observers:
+            observer(endpoint, elapsed, usage, outcome)
+
+    def metrics(self):
+        result = {}
+        with self._lock:
+            for name, m in self._metrics.items():
+                latency = sorted(m["latency"])
+                result[name] = {
+                    **{k: v for k, v in m.items() if k != "latency"},
+                    "latency_ms": {
+                        "p50": round(_percentile(latency, 50) * 1000, 1),
+                        "p95": round(_percentile(latency, 95) * 1000, 1),
+                        "max": round(latency[-1] * 1000, 1) if latency else 0,
+                    },
+                }
+        return {
+            "provider": type(self.provider).__name__,
+            "circuit": self.breaker.state,
+            "endpoints": result,
+        }
+
+
+def _percentile(values, p):
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def init_llm(app):
+    if app.config["LLM_PROVIDER"] == "fake":
+        provider = FakeProvider(latency_ms=app.config["LLM_FAKE_LATENCY_MS"])
+    else:
+        provider = OpenAIProvider(
+            api_key=app.config.get("OPENAI_API_KEY"),
+            base_url=app.config.get("OPENAI_BASE_URL"),
+            max_connections=app.config["LLM_MAX_CONNECTIONS"],
+        )
+
+    client = LLMClient(
+        provider,
+        timeout=app.config["LLM_TIMEOUT"],
+        max_retries=app.config["LLM_MAX_RETRIES"],
+        backoff_base=app.config["LLM_BACKOFF_BASE"],
+        backoff_max=app.config["LLM_BACKOFF_MAX"],
+        breaker=CircuitBreaker(
+            threshold=app.config["LLM_BREAKER_THRESHOLD"],
+            cooldown=app.config["LLM_BREAKER_COOLDOWN"],
+        ),
+    )
+    app.extensions["llm"] = client
+    return client
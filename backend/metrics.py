@@ -0,0 +1,295 @@
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter as Tally
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from extensions import db
+from security import role_required
+
+
+# ------------------------------------
+# Метрики в формате Prometheus (без внешних зависимостей)
+# ------------------------------------
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SQL_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labels, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Кумулятивные корзины (le), сумма и число наблюдений по набору меток."""
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [counts по корзинам..., +Inf], sum
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            counts, total = self._series.get(labels) or ([0] * (len(self.buckets) + 1), 0)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-1] += 1
+            self._series[labels] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total) in sorted(self._series.items()):
+                for bound, count in zip(self.buckets + ("+Inf",), counts):
+                    le = bound if bound == "+Inf" else _number(bound)
+                    lines.append(f"{self.name}_bucket{_labels(self.labels, labels, [('le', le)])} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {_number(float(total))}")
+                lines.append(f"{self.name}_count{_labels(self.labels, labels)} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.http_requests = Counter(
+            "eduai_http_requests_total", "HTTP requests by route and status.",
+            ("method", "endpoint", "status"),
+        )
+        self.http_duration = Histogram(
+            "eduai_http_request_duration_seconds", "Time to build the response.",
+            ("method", "endpoint"),
+        )
+        self.sql_statements = Histogram(
+            "eduai_http_request_sql_statements", "SQL statements executed per request.",
+            ("endpoint",), SQL_COUNT_BUCKETS,
+        )
+        self.sql_duration = Histogram(
+            "eduai_http_request_sql_seconds", "Time spent in SQL per request.",
+            ("endpoint",),
+        )
+        self.n_plus_one = Counter(
+            "eduai_sql_n_plus_one_total", "Requests that repeated one SQL statement past the N+1 threshold.",
+            ("endpoint",),
+        )
+        self.llm_duration = Histogram(
+            "eduai_llm_call_duration_seconds", "LLM provider call duration (each attempt).",
+            ("endpoint", "outcome"), LLM_BUCKETS,
+        )
+        self.llm_tokens = Counter(
+            "eduai_llm_tokens_total", "LLM tokens by endpoint and kind.",
+            ("endpoint", "kind"),
+        )
+
+    def families(self):
+        return [
+            self.http_requests, self.http_duration, self.sql_statements, self.sql_duration,
+            self.n_plus_one, self.llm_duration, self.llm_tokens,
+        ]
+
+    def render(self):
+        return "\n".join(line for family in self.families() for line in family.render()) + "\n"
+
+    # ---------- LLM (наблюдатель LLMClient) ----------
+    def llm_call(self, endpoint, seconds, usage, outcome):
+        self.llm_duration.observe(seconds, endpoint, outcome)
+        for kind in ("prompt_tokens", "completion_tokens"):
+            if usage.get(kind):
+                self.llm_tokens.inc(endpoint, kind.split("_")[0], amount=usage[kind])
+
+
+# ------------------------------------
+# Сэмплирующий профайлер одного запроса
+# ------------------------------------
+class Sampler:
+    """Раз в interval снимает стек потока запроса (sys._current_frames).
+
+    Результат — «свёрнутые» стеки (folded: "a;b;c N"), которые читают
+    flamegraph.pl и speedscope. Накладные расходы — только у запросов,
+    где профайлер явно включён.
+    """
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Tally()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    @staticmethod
+    def folded(samples):
+        return "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+
+
+# ------------------------------------
+# Хуки запроса и SQL
+# ------------------------------------
+def _endpoint():
+    rule = request.url_rule
+    return rule.rule if rule is not None else "unmatched"
+
+
+def _before_request():
+    g.metrics_started = time.perf_counter()
+    g.sql_count, g.sql_time, g.sql_statements = 0, 0.0, Tally()
+
+    config = current_app.config
+    if config["PROFILING_ENABLED"] and request.headers.get("X-Profile"):
+        g.profiler = Sampler(threading.get_ident(), config["PROFILE_INTERVAL_MS"] / 1000).start()
+
+
+def _after_request(response):
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return response
+
+    registry = current_app.extensions["metrics"]
+    endpoint = _endpoint()
+    elapsed = time.perf_counter() - started
+    registry.http_requests.inc(request.method, endpoint, str(response.status_code))
+    registry.http_duration.observe(elapsed, request.method, endpoint)
+    registry.sql_statements.observe(g.sql_count, endpoint)
+    registry.sql_duration.observe(g.sql_time, endpoint)
+
+    # Один и тот же запрос (с разными параметрами) много раз за запрос — почти всегда N+1
+    threshold = current_app.config["N_PLUS_ONE_THRESHOLD"]
+    repeated = [(sql, n) for sql, n in g.sql_statements.most_common(3) if n >= threshold]
+    if threshold and repeated:
+        registry.n_plus_one.inc(endpoint)
+        sql, n = repeated[0]
+        current_app.logger.warning(
+            "Possible N+1 in %s %s: %d SQL statements, %d× %s",
+            request.method, endpoint, g.sql_count, n, " ".join(sql.split())[:200],
+        )
+
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        samples = profiler.stop()
+        directory = current_app.config["PROFILE_DIR"]
+        os.makedirs(directory, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{request.method}-{endpoint.strip('/').replace('/', '_')}.folded"
+        name = "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+        with open(os.path.join(directory, name), "w", encoding="utf-8") as f:
+            f.write(Sampler.folded(samples))
+        response.headers["X-Profile"] = f"{name}; samples={sum(samples.values())}; elapsed_ms={elapsed * 1000:.1f}"
+    return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _cursor_error(context):
+    # after_cursor_execute для упавшего запроса не вызывается — снимаем его отметку
+    if context.connection is not None:
+        stack = context.connection.info.get("metrics_started")
+        if stack:
+            stack.pop()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["metrics_started"].pop()
+    # Воркеры (проверка, банк задач) работают без контекста запроса — не считаем
+    if not has_request_context() or "sql_statements" not in g:
+        return
+    g.sql_count += 1
+    g.sql_time += time.perf_counter() - started
+    g.sql_statements[statement] += 1
+
+
+def _render_metrics():
+    body = current_app.extensions["metrics"].render()
+    return body, 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+@role_required("superadmin")
+def _admin_metrics(current_admin_id):
+    return _render_metrics()
+
+
+def _metrics_view():
+    # Маршруты, задержки, SQL и расход LLM — не для всех: токен сборщика
+    # (METRICS_TOKEN) или, если он не задан, JWT супер-админа
+    token = current_app.config["METRICS_TOKEN"]
+    if not token:
+        return _admin_metrics()
+    given = request.headers.get("Authorization", "").removeprefix("Bearer ").strip()
+    if not hmac.compare_digest(given.encode(), token.encode()):
+        return {"message": "Forbidden"}, 403
+    return _render_metrics()
+
+
+def init_metrics(app):
+    registry = Registry()
+    app.extensions["metrics"] = registry
+    if not app.config["METRICS_ENABLED"]:
+        return registry
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _cursor_error)
+
+    llm = app.extensions.get("llm")
+    if llm is not None:
+        llm.observers.append(registry.llm_call)
+
+    app.add_url_rule("/api/metrics", "metrics", _metrics_view)
+    return registry
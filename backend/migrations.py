@@ -0,0 +1,663 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+
+from extensions import db
+
+
+# ------------------------------------
+# Версионирование схемы
+# ------------------------------------
+# Каждая миграция — функция (connection) с номером версии. Миграции
+# идемпотентны (IF NOT EXISTS, проверка колонок), поэтому одна цепочка
+# поднимает и пустую БД, и старую базу без schema_migrations.
+# DDL миграций записан текстом и не берётся из моделей: изменение модели
+# не должно менять то, что делает уже выпущенная миграция. Новые
+# изменения схемы — новой миграцией здесь, а не через db.create_all().
+
+version_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(255), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    def register(fn):
+        MIGRATIONS.append((version, description, fn))
+        return fn
+    return register
+
+
+def _add_column(conn, table, column, ddl_type):
+    columns = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in columns:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl_type}"))
+
+
+def _execute(conn, *statements):
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+def _create_indexes(conn, *indexes):
+    """indexes: (имя, таблица, "колонки") — список фиксирован в миграции."""
+    existing = set(inspect(conn).get_table_names())
+    for name, table, columns in indexes:
+        # Таблица могла быть удалена более поздней миграцией (свежая БД)
+        if table in existing:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def _bump_all_versions(conn):
+    # Данные пересчитаны в обход сессии: ETag'и, выданные до миграции, устарели
+    conn.execute(text(
+        'INSERT INTO resource_versions ("key", version) VALUES (\'all\', 1) '
+        'ON CONFLICT ("key") DO UPDATE SET version = version + 1'
+    ))
+
+
+# ------------------------------------
+# Миграции
+# ------------------------------------
+@migration(1, "baseline schema")
+def _baseline(conn):
+    # Схема на момент введения миграций; существующие таблицы не трогаются
+    _execute(
+        conn,
+        """CREATE TABLE IF NOT EXISTS teachers (
+            id INTEGER NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            password_hash VARCHAR(255) NOT NULL,
+            PRIMARY KEY (id),
+            UNIQUE (email)
+        )""",
+        """CREATE TABLE IF NOT EXISTS superadmins (
+            id INTEGER NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            password_hash VARCHAR(200) NOT NULL,
+            PRIMARY KEY (id),
+            UNIQUE (email)
+        )""",
+        """CREATE TABLE IF NOT EXISTS students (
+            id INTEGER NOT NULL,
+            teacher_id INTEGER,
+            first_name VARCHAR(100) NOT NULL,
+            last_name VARCHAR(100) NOT NULL,
+            email VARCHAR(255) NOT NULL,
+            password VARCHAR(200) NOT NULL,
+            total_xp INTEGER,
+            current_level INTEGER,
+            streak INTEGER,
+            PRIMARY KEY (id),
+            FOREIGN KEY(teacher_id) REFERENCES teachers (id),
+            UNIQUE (email)
+        )""",
+        """CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER NOT NULL,
+            teacher_id INTEGER NOT NULL,
+            title VARCHAR(255) NOT NULL,
+            description TEXT NOT NULL,
+            difficulty VARCHAR(50),
+            complexity VARCHAR(50),
+            xp_reward INTEGER,
+            example_code TEXT,
+            hints TEXT,
+            ai_analysis TEXT,
+            test_cases TEXT,
+            date_created DATETIME,
+            PRIMARY KEY (id),
+            FOREIGN KEY(teacher_id) REFERENCES teachers (id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER NOT NULL,
+            student_id INTEGER NOT NULL,
+            date DATE NOT NULL,
+            is_present BOOLEAN,
+            PRIMARY KEY (id),
+            FOREIGN KEY(student_id) REFERENCES students (id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS task_assignments (
+            id INTEGER NOT NULL,
+            student_id INTEGER NOT NULL,
+            task_id INTEGER NOT NULL,
+            assigned_at DATETIME,
+            is_completed BOOLEAN,
+            PRIMARY KEY (id),
+            FOREIGN KEY(student_id) REFERENCES students (id),
+            FOREIGN KEY(task_id) REFERENCES tasks (id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS student_submissions (
+            id INTEGER NOT NULL,
+            task_id INTEGER NOT NULL,
+            student_id INTEGER NOT NULL,
+            code TEXT NOT NULL,
+            is_correct BOOLEAN,
+            xp_earned INTEGER,
+            feedback TEXT,
+            submitted_at DATETIME,
+            PRIMARY KEY (id),
+            FOREIGN KEY(task_id) REFERENCES tasks (id),
+            FOREIGN KEY(student_id) REFERENCES students (id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS student_stats (
+            student_id INTEGER NOT NULL,
+            assigned_tasks INTEGER NOT NULL,
+            attendance_days INTEGER NOT NULL,
+            present_days INTEGER NOT NULL,
+            total_submissions INTEGER NOT NULL,
+            correct_submissions INTEGER NOT NULL,
+            xp INTEGER NOT NULL,
+            PRIMARY KEY (student_id),
+            FOREIGN KEY(student_id) REFERENCES students (id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS teacher_stats (
+            teacher_id INTEGER NOT NULL,
+            students INTEGER NOT NULL,
+            active_students INTEGER NOT NULL,
+            tasks INTEGER NOT NULL,
+            attendance_days INTEGER NOT NULL,
+            present_days INTEGER NOT NULL,
+            total_submissions INTEGER NOT NULL,
+            correct_submissions INTEGER NOT NULL,
+            xp INTEGER NOT NULL,
+            PRIMARY KEY (teacher_id),
+            FOREIGN KEY(teacher_id) REFERENCES teachers (id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS grading_jobs (
+            id INTEGER NOT NULL,
+            submission_id INTEGER NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            attempts INTEGER NOT NULL,
+            error TEXT,
+            created_at DATETIME,
+            started_at DATETIME,
+            finished_at DATETIME,
+            PRIMARY KEY (id),
+            FOREIGN KEY(submission_id) REFERENCES student_submissions (id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS regrade_jobs (
+            id INTEGER NOT NULL,
+            task_id INTEGER NOT NULL,
+            teacher_id INTEGER NOT NULL,
+            status VARCHAR(20) NOT NULL,
+            total INTEGER NOT NULL,
+            processed INTEGER NOT NULL,
+            changed INTEGER NOT NULL,
+            last_submission_id INTEGER NOT NULL,
+            error TEXT,
+            created_at DATETIME,
+            started_at DATETIME,
+            finished_at DATETIME,
+            PRIMARY KEY (id),
+            FOREIGN KEY(task_id) REFERENCES tasks (id),
+            FOREIGN KEY(teacher_id) REFERENCES teachers (id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS ai_cache (
+            "key" VARCHAR(64) NOT NULL,
+            endpoint VARCHAR(50) NOT NULL,
+            response TEXT NOT NULL,
+            hits INTEGER NOT NULL,
+            created_at DATETIME,
+            last_used_at DATETIME,
+            PRIMARY KEY ("key")
+        )""",
+    )
+    # Индексы служебных таблиц; индексы горячих путей — миграция 3
+    _create_indexes(
+        conn,
+        ("ix_regrade_jobs_status", "regrade_jobs", "status"),
+        ("ix_ai_cache_endpoint", "ai_cache", "endpoint"),
+        ("ix_ai_cache_last_used_at", "ai_cache", "last_used_at"),
+    )
+
+
+@migration(2, "tasks.test_cases")
+def _task_test_cases(conn):
+    _add_column(conn, "tasks", "test_cases", "TEXT")
+
+
+@migration(3, "hot-path indexes")
+def _hot_path_indexes(conn):
+    _create_indexes(
+        conn,
+        ("ix_students_teacher_id", "students", "teacher_id"),
+        ("ix_tasks_teacher_date", "tasks", "teacher_id, date_created"),
+        ("ix_task_assignments_student_task", "task_assignments", "student_id, task_id"),
+        ("ix_task_assignments_task_id", "task_assignments", "task_id"),
+        ("ix_student_submissions_student_id_id", "student_submissions", "student_id, id"),
+        ("ix_student_submissions_task_id_id", "student_submissions", "task_id, id"),
+        ("ix_attendance_student_date", "attendance", "student_id, date"),
+        ("ix_grading_jobs_submission_id", "grading_jobs", "submission_id"),
+        ("ix_grading_jobs_status", "grading_jobs", "status"),
+    )
+
+
+@migration(4, "cohort task assignments")
+def _cohort_assignments(conn):
+    _execute(conn, """CREATE TABLE IF NOT EXISTS cohort_assignments (
+        id INTEGER NOT NULL,
+        task_id INTEGER NOT NULL,
+        teacher_id INTEGER NOT NULL,
+        assigned_at DATETIME,
+        PRIMARY KEY (id),
+        CONSTRAINT uq_cohort_assignments_teacher_task UNIQUE (teacher_id, task_id),
+        FOREIGN KEY(task_id) REFERENCES tasks (id),
+        FOREIGN KEY(teacher_id) REFERENCES teachers (id)
+    )""")
+    _create_indexes(conn, ("ix_cohort_assignments_task_id", "cohort_assignments", "task_id"))
+
+    # Существующие задачи назначаются классу своего учителя
+    conn.execute(text(
+        "INSERT INTO cohort_assignments (task_id, teacher_id, assigned_at) "
+        "SELECT id, teacher_id, date_created FROM tasks "
+        "WHERE id NOT IN (SELECT task_id FROM cohort_assignments)"
+    ))
+
+    # Счётчик назначений на студента больше не ведётся (назначение — на когорту)
+    columns = {c["name"] for c in inspect(conn).get_columns("student_stats")}
+    if "assigned_tasks" in columns:
+        conn.execute(text("ALTER TABLE student_stats DROP COLUMN assigned_tasks"))
+
+
+@migration(5, "students.password_hash")
+def _student_password_hash(conn):
+    from flask import current_app
+
+    columns = {c["name"] for c in inspect(conn).get_columns("students")}
+    if "password_hash" not in columns:
+        conn.execute(text("ALTER TABLE students ADD COLUMN password_hash VARCHAR(255)"))
+    if "password" not in columns:
+        return
+
+    # Открытые пароли → хэши с текущими параметрами (параллельно на пуле
+    # хэширования), затем колонка с открытым паролем удаляется
+    hasher = current_app.extensions["password_hasher"]
+    rows = conn.execute(text(
+        "SELECT id, password FROM students WHERE password_hash IS NULL"
+    )).all()
+    with ThreadPoolExecutor(max_workers=hasher.workers) as pool:
+        hashes = pool.map(lambda row: hasher.hash(row[1] or ""), rows)
+        for (student_id, _), pwhash in zip(rows, hashes):
+            conn.execute(
+                text("UPDATE students SET password_hash = :h WHERE id = :id"),
+                {"h": pwhash, "id": student_id},
+            )
+    conn.execute(text("ALTER TABLE students DROP COLUMN password"))
+
+
+@migration(6, "ai_inflight leases")
+def _ai_inflight(conn):
+    _execute(conn, """CREATE TABLE IF NOT EXISTS ai_inflight (
+        "key" VARCHAR(64) NOT NULL,
+        expires_at DATETIME NOT NULL,
+        PRIMARY KEY ("key")
+    )""")
+
+
+@migration(7, "task bank")
+def _task_bank(conn):
+    _execute(conn, """CREATE TABLE IF NOT EXISTS task_bank (
+        id INTEGER NOT NULL,
+        topic VARCHAR(255) NOT NULL,
+        difficulty VARCHAR(50) NOT NULL,
+        payload TEXT NOT NULL,
+        created_at DATETIME,
+        PRIMARY KEY (id)
+    )""")
+    _create_indexes(conn, ("ix_task_bank_topic", "task_bank", "topic, difficulty, id"))
+
+
+@migration(8, "xp ledger")
+def _xp_ledger(conn):
+    import xp_ledger
+
+    _execute(conn, """CREATE TABLE IF NOT EXISTS xp_events (
+        id INTEGER NOT NULL,
+        student_id INTEGER NOT NULL,
+        kind VARCHAR(20) NOT NULL,
+        ref_id INTEGER,
+        xp INTEGER NOT NULL,
+        day DATE NOT NULL,
+        active INTEGER NOT NULL,
+        created_at DATETIME,
+        PRIMARY KEY (id),
+        FOREIGN KEY(student_id) REFERENCES students (id)
+    )""")
+    _create_indexes(conn, ("ix_xp_events_student_day", "xp_events", "student_id, day"))
+    _add_column(conn, "students", "last_active_date", "DATE")
+    if conn.execute(text("SELECT 1 FROM xp_events LIMIT 1")).first():
+        return
+
+    # Журнал из истории: отправки и дни присутствия (за прошлое посещение XP
+    # не начислялся), остаток total_xp (сиды, ручные правки) — одной поправкой
+    now = datetime.utcnow()
+    conn.execute(text(
+        "INSERT INTO xp_events (student_id, kind, ref_id, xp, day, active, created_at) "
+        "SELECT student_id, 'submission', id, COALESCE(xp_earned, 0), DATE(submitted_at), 1, :now "
+        "FROM student_submissions WHERE submitted_at IS NOT NULL"
+    ), {"now": now})
+    if inspect(conn).has_table("attendance"):
+        conn.execute(text(
+            "INSERT INTO xp_events (student_id, kind, ref_id, xp, day, active, created_at) "
+            "SELECT student_id, 'attendance', id, 0, date, 1, :now "
+            "FROM attendance WHERE is_present = 1"
+        ), {"now": now})
+    conn.execute(text(
+        "INSERT INTO xp_events (student_id, kind, ref_id, xp, day, active, created_at) "
+        "SELECT s.id, 'adjustment', NULL, COALESCE(s.total_xp, 0) - COALESCE(e.xp, 0), DATE('now'), 0, :now "
+        "FROM students s LEFT JOIN ("
+        "  SELECT student_id, SUM(xp) AS xp FROM xp_events GROUP BY student_id"
+        ") e ON e.student_id = s.id "
+        "WHERE COALESCE(s.total_xp, 0) != COALESCE(e.xp, 0)"
+    ), {"now": now})
+
+    xp_ledger.recompute(conn)
+
+
+@migration(9, "attendance bitmaps")
+def _attendance_bitmaps(conn):
+    _execute(conn, """CREATE TABLE IF NOT EXISTS attendance_months (
+        id INTEGER NOT NULL,
+        student_id INTEGER NOT NULL,
+        month DATE NOT NULL,
+        marked INTEGER NOT NULL,
+        present INTEGER NOT NULL,
+        marked_days INTEGER NOT NULL,
+        present_days INTEGER NOT NULL,
+        PRIMARY KEY (id),
+        CONSTRAINT uq_attendance_student_month UNIQUE (student_id, month),
+        FOREIGN KEY(student_id) REFERENCES students (id)
+    )""")
+    if not inspect(conn).has_table("attendance"):
+        return
+
+    # Строка на день → битовая карта на месяц (при дублях дня побеждает последняя запись)
+    months = {}
+    for student_id, day, is_present in conn.execute(text(
+        "SELECT student_id, date, is_present FROM attendance ORDER BY id"
+    )):
+        day = date.fromisoformat(day) if isinstance(day, str) else day
+        key = (student_id, day.replace(day=1))
+        marked, present = months.get(key, (0, 0))
+        mask = 1 << (day.day - 1)
+        months[key] = (marked | mask, present | mask if is_present else present & ~mask)
+
+    rows = [
+        {
+            "student_id": student_id,
+            "month": month.isoformat(),
+            "marked": marked,
+            "present": present,
+            "marked_days": marked.bit_count(),
+            "present_days": present.bit_count(),
+        }
+        for (student_id, month), (marked, present) in months.items()
+    ]
+    if rows:
+        conn.execute(text(
+            "INSERT INTO attendance_months (student_id, month, marked, present, marked_days, present_days) "
+            "VALUES (:student_id, :month, :marked, :present, :marked_days, :present_days)"
+        ), rows)
+    conn.execute(text("DROP TABLE attendance"))
+
+
+@migration(10, "submission code blobs")
+def _code_blobs(conn):
+    from code_store import compress, digest
+
+    _execute(conn, """CREATE TABLE IF NOT EXISTS code_blobs (
+        hash VARCHAR(64) NOT NULL,
+        codec VARCHAR(10) NOT NULL,
+        data BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        PRIMARY KEY (hash)
+    )""")
+    _add_column(conn, "student_submissions", "code_hash", "VARCHAR(64)")
+    _create_indexes(conn, ("ix_student_submissions_code_hash", "student_submissions", "code_hash"))
+
+    columns = {c["name"] for c in inspect(conn).get_columns("student_submissions")}
+    if "code" not in columns:
+        return
+
+    # Порциями по id: код → блоб (один раз на уникальный текст), отправке — хэш
+    last_id = 0
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, code FROM student_submissions "
+            "WHERE id > :last AND code_hash IS NULL ORDER BY id LIMIT 1000"
+        ), {"last": last_id}).all()
+        if not rows:
+            break
+
+        blobs = {}
+        updates = []
+        for submission_id, code in rows:
+            key = digest(code or "")
+            if key not in blobs:
+                codec, data = compress(code or "")
+                blobs[key] = {"hash": key, "codec": codec, "data": data,
+                              "size": len((code or "").encode("utf-8"))}
+            updates.append({"h": key, "id": submission_id})
+
+        # Уже сохранённые блобы (из прошлых порций) не перезаписываются
+        conn.execute(text(
+            "INSERT OR IGNORE INTO code_blobs (hash, codec, data, size) "
+            "VALUES (:hash, :codec, :data, :size)"
+        ), list(blobs.values()))
+        conn.execute(text("UPDATE student_submissions SET code_hash = :h WHERE id = :id"), updates)
+        last_id = rows[-1][0]
+
+    conn.execute(text("ALTER TABLE student_submissions DROP COLUMN code"))
+
+
+@migration(11, "code similarity index")
+def _similarity_index(conn):
+    import similarity
+    from code_store import decompress
+
+    _execute(
+        conn,
+        """CREATE TABLE IF NOT EXISTS code_fingerprints (
+            code_hash VARCHAR(64) NOT NULL,
+            signature BLOB NOT NULL,
+            PRIMARY KEY (code_hash),
+            FOREIGN KEY(code_hash) REFERENCES code_blobs (hash)
+        )""",
+        """CREATE TABLE IF NOT EXISTS similarity_buckets (
+            id INTEGER NOT NULL,
+            task_id INTEGER NOT NULL,
+            code_hash VARCHAR(64) NOT NULL,
+            band INTEGER NOT NULL,
+            "key" BIGINT NOT NULL,
+            PRIMARY KEY (id),
+            CONSTRAINT uq_similarity_bucket UNIQUE (task_id, code_hash, band),
+            FOREIGN KEY(task_id) REFERENCES tasks (id)
+        )""",
+    )
+    _create_indexes(conn, ("ix_similarity_buckets_lookup", "similarity_buckets", 'task_id, band, "key"'))
+    if conn.execute(text("SELECT 1 FROM similarity_buckets LIMIT 1")).first():
+        return
+
+    # Подпись — на уникальный текст, корзины — на (задача, текст)
+    signatures = {}
+    for code_hash, codec, data in conn.execute(text("SELECT hash, codec, data FROM code_blobs")):
+        signatures[code_hash] = similarity.signature(decompress(codec, data))
+    if signatures:
+        conn.execute(text(
+            "INSERT INTO code_fingerprints (code_hash, signature) VALUES (:code_hash, :signature)"
+        ), [{"code_hash": h, "signature": similarity.pack(sig)} for h, sig in signatures.items()])
+
+    rows = [
+        row
+        for task_id, code_hash in conn.execute(text(
+            "SELECT DISTINCT task_id, code_hash FROM student_submissions"
+        ))
+        if code_hash in signatures
+        for row in similarity.bucket_rows(task_id, code_hash, signatures[code_hash])
+    ]
+    if rows:
+        conn.execute(text(
+            'INSERT INTO similarity_buckets (task_id, code_hash, band, "key") '
+            "VALUES (:task_id, :code_hash, :band, :key)"
+        ), rows)
+
+
+@migration(12, "task full-text search")
+def _task_search(conn):
+    _execute(
+        conn,
+        """CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+            title, description, hints, example_code,
+            content='tasks', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks BEGIN
+            INSERT INTO tasks_fts(rowid, title, description, hints, example_code)
+            VALUES (new.id, new.title, new.description, new.hints, new.example_code);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks BEGIN
+            INSERT INTO tasks_fts(tasks_fts, rowid, title, description, hints, example_code)
+            VALUES ('delete', old.id, old.title, old.description, old.hints, old.example_code);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS tasks_fts_au AFTER UPDATE OF title, description, hints, example_code ON tasks BEGIN
+            INSERT INTO tasks_fts(tasks_fts, rowid, title, description, hints, example_code)
+            VALUES ('delete', old.id, old.title, old.description, old.hints, old.example_code);
+            INSERT INTO tasks_fts(rowid, title, description, hints, example_code)
+            VALUES (new.id, new.title, new.description, new.hints, new.example_code);
+        END""",
+        "INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')",
+    )
+
+
+@migration(13, "resource versions")
+def _resource_versions(conn):
+    _execute(conn, """CREATE TABLE IF NOT EXISTS resource_versions (
+        "key" VARCHAR(64) NOT NULL,
+        version INTEGER NOT NULL,
+        PRIMARY KEY ("key")
+    )""")
+
+
+@migration(14, "one xp event per graded submission")
+def _unique_submission_xp(conn):
+    import stats
+    import xp_ledger
+
+    # Повторная проверка одной отправки могла начислить XP дважды: оставляем
+    # первое событие, пересчитываем производные поля из журнала и статистику
+    removed = conn.execute(text(
+        "DELETE FROM xp_events WHERE kind = 'submission' AND id NOT IN ("
+        "  SELECT MIN(id) FROM xp_events WHERE kind = 'submission' GROUP BY ref_id"
+        ")"
+    )).rowcount
+    _execute(conn, (
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_xp_events_submission "
+        "ON xp_events (ref_id) WHERE kind = 'submission'"
+    ))
+    if removed:
+        xp_ledger.recompute(conn)
+        stats.recompute(conn)
+        _bump_all_versions(conn)
+        print(f"⚠️ Removed {removed} duplicate submission XP events")
+
+
+@migration(15, "unique task assignment per student")
+def _unique_task_assignments(conn):
+    # Дубли от одновременных отправок: оставляем первую строку (выполнена,
+    # если выполнена любая из дублей), остальные удаляем
+    conn.execute(text(
+        "UPDATE task_assignments SET is_completed = 1 "
+        "WHERE id IN (SELECT MIN(id) FROM task_assignments GROUP BY student_id, task_id "
+        "             HAVING COUNT(*) > 1 AND MAX(is_completed) = 1)"
+    ))
+    conn.execute(text(
+        "DELETE FROM task_assignments WHERE id NOT IN ("
+        "  SELECT MIN(id) FROM task_assignments GROUP BY student_id, task_id"
+        ")"
+    ))
+    _execute(
+        conn,
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_task_assignments_student_task "
+        "ON task_assignments (student_id, task_id)",
+        # Уникальный индекс покрывает те же запросы
+        "DROP INDEX IF EXISTS ix_task_assignments_student_task",
+    )
+
+
+@migration(16, "grading retry delay")
+def _grading_retry_delay(conn):
+    _add_column(conn, "grading_jobs", "available_at", "DATETIME")
+
+
+@migration(17, "no xp for attendance")
+def _no_attendance_xp(conn):
+    import stats
+    import xp_ledger
+
+    # Отметки посещаемости начисляли XP, хотя исторические дни (миграция 8)
+    # шли с нулём. Журнал не переписываем: гасим начисленное поправкой
+    compensated = conn.execute(text(
+        "INSERT INTO xp_events (student_id, kind, ref_id, xp, day, active, created_at) "
+        "SELECT student_id, 'adjustment', NULL, -SUM(xp), DATE('now'), 0, :now "
+        "FROM xp_events WHERE kind = 'attendance' "
+        "GROUP BY student_id HAVING SUM(xp) != 0"
+    ), {"now": datetime.utcnow()}).rowcount
+    if compensated:
+        xp_ledger.recompute(conn)
+        stats.recompute(conn)
+        _bump_all_versions(conn)
+
+
+# ------------------------------------
+# Применение
+# ------------------------------------
+def current_version(conn):
+    if not inspect(conn).has_table("schema_migrations"):
+        return 0
+    return conn.execute(select(db.func.max(schema_migrations.c.version))).scalar() or 0
+
+
+def upgrade(engine=None):
+    """Применить все неприменённые миграции. Возвращает список версий."""
+    engine = engine or db.engine
+
+    with engine.begin() as conn:
+        version_metadata.create_all(bind=conn)
+        applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+    done = []
+    for version, description, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+        # Каждая миграция — в своей транзакции
+        with engine.begin() as conn:
+            fn(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=version,
+                description=description,
+                applied_at=datetime.utcnow(),
+            ))
+        print(f"🗂️ Migration {version}: {description}")
+        done.append(version)
+    return done
+
+
+if __name__ == "__main__":
+    from app import app
+
+    with app.app_context():
+        applied = upgrade()
+        with db.engine.connect() as conn:
+            version = current_version(conn)
+        if applied:
+            print(f"✅ Schema upgraded to version {version}")
+        else:
+            print(f"✅ Schema is up to date (version {version})")
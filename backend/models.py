@@ -25,41 +25,55 @@ class Student(db.Model):
     id = db.Column(db.Integer, primary_key=True)
 
     # ❗ Главная правка: nullable=True чтобы студент мог существовать БЕЗ учителя
-    teacher_id = db.Column(db.Integer, db.ForeignKey("teachers.id"), nullable=True)
+    teacher_id = db.Column(db.Integer, db.ForeignKey("teachers.id"), nullable=True, index=True)
 
     first_name = db.Column(db.String(100), nullable=False)
     last_name = db.Column(db.String(100), nullable=False)
 
     email = db.Column(db.String(255), unique=True, nullable=False)
 
-    # ❗ Plain password (оставляем для совместимости)
-    password = db.Column(db.String(200), nullable=False)
-
-    # ❗ Если хочешь позже — мы можем заменить на password_hash
-    # password_hash = db.Column(db.String(255), nullable=True)
+    # Хэш пароля (параметры хэширования — в префиксе, см. passwords.py)
+    password_hash = db.Column(db.String(255), nullable=False)
 
+    # Производные от журнала XP (xp_ledger.py), пересчитываются при записи события
     total_xp = db.Column(db.Integer, default=0)
     current_level = db.Column(db.Integer, default=1)
     streak = db.Column(db.Integer, default=0)
+    last_active_date = db.Column(db.Date, nullable=True)
 
     assignments = db.relationship("TaskAssignment", backref="student", lazy=True, cascade="all, delete-orphan")
     submissions = db.relationship("StudentSubmission", backref="student", lazy=True, cascade="all, delete-orphan")
-    attendance = db.relationship("Attendance", backref="student", lazy=True, cascade="all, delete-orphan")
+    attendance = db.relationship("AttendanceMonth", backref="student", lazy=True, cascade="all, delete-orphan")
+    xp_events = db.relationship("XPEvent", backref="student", lazy=True, cascade="all, delete-orphan")
 
 
 # ------------------------------------
-# Attendance
+# Attendance (битовая карта на студента и месяц)
 # ------------------------------------
-class Attendance(db.Model):
-    __tablename__ = "attendance"
+class AttendanceMonth(db.Model):
+    """Посещаемость студента за месяц: бит (day - 1) — день месяца.
+
+    marked — день отмечен (был урок), present — присутствовал (present ⊆ marked).
+    Число отмеченных / присутствий хранится рядом, чтобы суммы считались SQL.
+    """
+
+    __tablename__ = "attendance_months"
+    __table_args__ = (
+        db.UniqueConstraint("student_id", "month", name="uq_attendance_student_month"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey("students.id"), nullable=False)
-    date = db.Column(db.Date, nullable=False)
-    is_present = db.Column(db.Boolean, default=False)
+    # Первое число месяца
+    month = db.Column(db.Date, nullable=False)
+
+    marked = db.Column(db.Integer, nullable=False, default=0)
+    present = db.Column(db.Integer, nullable=False, default=0)
+    marked_days = db.Column(db.Integer, nullable=False, default=0)
+    present_days = db.Column(db.Integer, nullable=False, default=0)
 
     def __repr__(self):
-        return f"<Attendance student={self.student_id} date={self.date}>"
+        return f"<AttendanceMonth student={self.student_id} month={self.month:%Y-%m}>"
 
 
 # ------------------------------------
@@ -67,6 +81,9 @@ class Attendance(db.Model):
 # ------------------------------------
 class Task(db.Model):
     __tablename__ = "tasks"
+    __table_args__ = (
+        db.Index("ix_tasks_teacher_date", "teacher_id", "date_created"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     teacher_id = db.Column(db.Integer, db.ForeignKey("teachers.id"), nullable=False)
@@ -82,17 +99,43 @@ class Task(db.Model):
     hints = db.Column(db.Text)
     ai_analysis = db.Column(db.Text)
 
+    # JSON: [{"input": "...", "expected_output": "..."}, ...]
+    test_cases = db.Column(db.Text)
+
     date_created = db.Column(db.DateTime, default=datetime.utcnow)
 
     assignments = db.relationship("TaskAssignment", backref="task", lazy=True, cascade="all, delete-orphan")
+    cohort_assignments = db.relationship("CohortAssignment", backref="task", lazy=True, cascade="all, delete-orphan")
     submissions = db.relationship("StudentSubmission", backref="task", lazy=True, cascade="all, delete-orphan")
 
 
 # ------------------------------------
-# TaskAssignment
+# CohortAssignment (задача назначена всему классу учителя)
+# ------------------------------------
+class CohortAssignment(db.Model):
+    __tablename__ = "cohort_assignments"
+    __table_args__ = (
+        db.UniqueConstraint("teacher_id", "task_id", name="uq_cohort_assignments_teacher_task"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, db.ForeignKey("tasks.id"), nullable=False, index=True)
+    # Когорта = все студенты учителя (в т.ч. добавленные позже)
+    teacher_id = db.Column(db.Integer, db.ForeignKey("teachers.id"), nullable=False)
+
+    assigned_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ------------------------------------
+# TaskAssignment (явное назначение задачи студенту, в дополнение к когорте)
 # ------------------------------------
 class TaskAssignment(db.Model):
     __tablename__ = "task_assignments"
+    __table_args__ = (
+        # Одна строка на (студент, задача)
+        db.Index("ux_task_assignments_student_task", "student_id", "task_id", unique=True),
+        db.Index("ix_task_assignments_task_id", "task_id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey("students.id"), nullable=False)
@@ -107,19 +150,261 @@ class TaskAssignment(db.Model):
 # ------------------------------------
 class StudentSubmission(db.Model):
     __tablename__ = "student_submissions"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # (…, id) — списки по студенту/задаче сразу в порядке id, без сортировки
+        db.Index("ix_student_submissions_student_id_id", "student_id", "id"),
+        db.Index("ix_student_submissions_task_id_id", "task_id", "id"),
+        {'extend_existing': True},
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     task_id = db.Column(db.Integer, db.ForeignKey("tasks.id"), nullable=False)
     student_id = db.Column(db.Integer, db.ForeignKey("students.id"), nullable=False)
 
-    code = db.Column(db.Text, nullable=False)
+    # Код — в code_blobs по sha256 (одинаковый код хранится один раз, сжатым)
+    code_hash = db.Column(db.String(64), db.ForeignKey("code_blobs.hash"), nullable=False, index=True)
     is_correct = db.Column(db.Boolean, default=False)
     xp_earned = db.Column(db.Integer, default=0)
     feedback = db.Column(db.Text)
 
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    blob = db.relationship("CodeBlob", lazy="select")
+
+    @property
+    def code(self):
+        """Текст решения: блоб читается и распаковывается только при обращении."""
+        return self.blob.text
+
+
+class CodeBlob(db.Model):
+    """Сжатый код отправки, адресуемый sha256 исходного текста (code_store.py)."""
+
+    __tablename__ = "code_blobs"
+
+    hash = db.Column(db.String(64), primary_key=True)
+    # "raw" | "zlib" | "zd1" (zlib с предустановленным словарём)
+    codec = db.Column(db.String(10), nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    # Размер исходного текста в байтах (UTF-8)
+    size = db.Column(db.Integer, nullable=False)
+
+    @property
+    def text(self):
+        if "_text" not in self.__dict__:
+            from code_store import decompress
+            self._text = decompress(self.codec, self.data)
+        return self._text
+
+
+# ------------------------------------
+# Индекс похожести кода (MinHash + LSH, similarity.py)
+# ------------------------------------
+class CodeFingerprint(db.Model):
+    """MinHash-подпись нормализованного кода блоба (одна на уникальный текст)."""
+
+    __tablename__ = "code_fingerprints"
+
+    code_hash = db.Column(db.String(64), db.ForeignKey("code_blobs.hash"), primary_key=True)
+    signature = db.Column(db.LargeBinary, nullable=False)
+
+
+class SimilarityBucket(db.Model):
+    """LSH-корзина: код с одинаковым ключом полосы подписи в рамках задачи — кандидат в похожие."""
+
+    __tablename__ = "similarity_buckets"
+    __table_args__ = (
+        db.UniqueConstraint("task_id", "code_hash", "band", name="uq_similarity_bucket"),
+        db.Index("ix_similarity_buckets_lookup", "task_id", "band", "key"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, db.ForeignKey("tasks.id"), nullable=False)
+    code_hash = db.Column(db.String(64), nullable=False)
+    band = db.Column(db.Integer, nullable=False)
+    key = db.Column(db.BigInteger, nullable=False)
+
+
+# ------------------------------------
+# XP ledger (только добавление; total_xp / уровень / серия — производные)
+# ------------------------------------
+class XPEvent(db.Model):
+    __tablename__ = "xp_events"
+    __table_args__ = (
+        db.Index("ix_xp_events_student_day", "student_id", "day"),
+        # Одно событие "submission" на отправку: повторная проверка не начисляет XP дважды
+        db.Index("ux_xp_events_submission", "ref_id", unique=True, sqlite_where=db.text("kind = 'submission'")),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey("students.id"), nullable=False)
+
+    # "submission" | "attendance" | "regrade" | "adjustment"
+    kind = db.Column(db.String(20), nullable=False)
+    # id отправки / записи посещаемости, к которой относится событие
+    ref_id = db.Column(db.Integer, nullable=True)
+
+    xp = db.Column(db.Integer, nullable=False, default=0)
+    # День активности для серии: +1 — день засчитан, -1 — отмена (снятая отметка), 0 — не влияет
+    day = db.Column(db.Date, nullable=False)
+    active = db.Column(db.Integer, nullable=False, default=0)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ------------------------------------
+# StudentStats / TeacherStats (инкрементальные счётчики для дашбордов)
+# ------------------------------------
+class StudentStats(db.Model):
+    __tablename__ = "student_stats"
+
+    student_id = db.Column(db.Integer, db.ForeignKey("students.id"), primary_key=True)
+
+    attendance_days = db.Column(db.Integer, nullable=False, default=0)
+    present_days = db.Column(db.Integer, nullable=False, default=0)
+    total_submissions = db.Column(db.Integer, nullable=False, default=0)
+    correct_submissions = db.Column(db.Integer, nullable=False, default=0)
+    xp = db.Column(db.Integer, nullable=False, default=0)
+
+    student = db.relationship(
+        "Student",
+        backref=db.backref("stats", uselist=False, cascade="all, delete-orphan"),
+    )
+
+
+class TeacherStats(db.Model):
+    __tablename__ = "teacher_stats"
+
+    teacher_id = db.Column(db.Integer, db.ForeignKey("teachers.id"), primary_key=True)
+
+    students = db.Column(db.Integer, nullable=False, default=0)
+    # Студенты, у которых есть хотя бы один день присутствия
+    active_students = db.Column(db.Integer, nullable=False, default=0)
+    tasks = db.Column(db.Integer, nullable=False, default=0)
+    attendance_days = db.Column(db.Integer, nullable=False, default=0)
+    present_days = db.Column(db.Integer, nullable=False, default=0)
+    total_submissions = db.Column(db.Integer, nullable=False, default=0)
+    correct_submissions = db.Column(db.Integer, nullable=False, default=0)
+    xp = db.Column(db.Integer, nullable=False, default=0)
+
+    teacher = db.relationship(
+        "Teacher",
+        backref=db.backref("stats", uselist=False, cascade="all, delete-orphan"),
+    )
+
+
+# ------------------------------------
+# GradingJob (очередь проверки отправок)
+# ------------------------------------
+class GradingJob(db.Model):
+    __tablename__ = "grading_jobs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey("student_submissions.id"), nullable=False, index=True)
+
+    # queued -> running -> done | failed
+    status = db.Column(db.String(20), nullable=False, default="queued", index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # Повтор после сбоя — не раньше этого момента (NULL — сразу)
+    available_at = db.Column(db.DateTime)
+
+    submission = db.relationship(
+        "StudentSubmission",
+        backref=db.backref("grading_jobs", lazy=True, cascade="all, delete-orphan"),
+    )
+
+
+# ------------------------------------
+# RegradeJob (массовая перепроверка задачи)
+# ------------------------------------
+class RegradeJob(db.Model):
+    __tablename__ = "regrade_jobs"
+
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, db.ForeignKey("tasks.id"), nullable=False)
+    teacher_id = db.Column(db.Integer, db.ForeignKey("teachers.id"), nullable=False)
+
+    # queued -> running -> done | failed
+    status = db.Column(db.String(20), nullable=False, default="queued", index=True)
+    total = db.Column(db.Integer, nullable=False, default=0)
+    processed = db.Column(db.Integer, nullable=False, default=0)
+    changed = db.Column(db.Integer, nullable=False, default=0)
+
+    # Курсор: id последней обработанной отправки (для продолжения после рестарта)
+    last_submission_id = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.Text)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    task = db.relationship(
+        "Task",
+        backref=db.backref("regrade_jobs", lazy=True, cascade="all, delete-orphan"),
+    )
+
+
+# ------------------------------------
+# AICacheEntry (кэш ответов LLM)
+# ------------------------------------
+class AICacheEntry(db.Model):
+    __tablename__ = "ai_cache"
+
+    # sha256(model, system prompt, temperature, нормализованный вход)
+    key = db.Column(db.String(64), primary_key=True)
+    endpoint = db.Column(db.String(50), nullable=False, index=True)
+    response = db.Column(db.Text, nullable=False)
+
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+class BankTask(db.Model):
+    """Заранее сгенерированная и проверенная задача, ждущая выдачи учителю."""
+
+    __tablename__ = "task_bank"
+    __table_args__ = (
+        db.Index("ix_task_bank_topic", "topic", "difficulty", "id"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    # Нормализованный запрос учителя и сложность ("" — любая)
+    topic = db.Column(db.String(255), nullable=False)
+    difficulty = db.Column(db.String(50), nullable=False, default="")
+
+    # Разобранный ответ модели в форме parse_generated_task (JSON)
+    payload = db.Column(db.Text, nullable=False)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class AIInflight(db.Model):
+    """Аренда ключа ai_cache: этот запрос к LLM уже выполняет другой процесс."""
+
+    __tablename__ = "ai_inflight"
+
+    key = db.Column(db.String(64), primary_key=True)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+# ------------------------------------
+# Версии ресурсов (ETag / условные GET)
+# ------------------------------------
+class ResourceVersion(db.Model):
+    """Счётчик изменений ресурса ("student:1", "tasks:3", ...): растёт при каждой записи."""
+
+    __tablename__ = "resource_versions"
+
+    key = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
 
 # ------------------------------------
 # SuperAdmin
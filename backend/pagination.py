@@ -0,0 +1,149 @@
+import base64
+import json
+from datetime import date, datetime
+from urllib.parse import urlencode
+
+from flask import jsonify, request
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import load_only
+
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class PaginationError(ValueError):
+    pass
+
+
+# ------------------------------------
+# Проекция полей (?fields=id,title)
+# ------------------------------------
+class Fields:
+    """Описание полей списка: имя → (колонки модели, сериализатор).
+
+    Загружаются только колонки запрошенных полей, поэтому большие
+    текстовые колонки (code, example_code, ...) можно пропустить.
+    """
+
+    def __init__(self, **fields):
+        self.fields = fields
+
+    def parse(self):
+        raw = request.args.get("fields")
+        if not raw:
+            return list(self.fields)
+
+        names = [f.strip() for f in raw.split(",") if f.strip()]
+        unknown = [f for f in names if f not in self.fields]
+        if unknown:
+            raise PaginationError(f"Unknown fields: {', '.join(unknown)}")
+        return names
+
+    def columns(self, names):
+        return [col for name in names for col in self.fields[name][0]]
+
+    def serialize(self, obj, names):
+        return {name: self.fields[name][1](obj) for name in names}
+
+
+# ------------------------------------
+# Курсор (keyset)
+# ------------------------------------
+def _dump(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _load(value, column):
+    if value is None:
+        return None
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+
+def encode_cursor(values):
+    raw = json.dumps([_dump(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, order_by):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(values, list) or len(values) != len(order_by):
+            raise ValueError
+        return [_load(v, col) for v, (col, _) in zip(values, order_by)]
+    except (ValueError, TypeError):
+        raise PaginationError("Invalid cursor")
+
+
+def _after(order_by, values):
+    """WHERE для строк строго после курсора: (a, b) > (va, vb) с учётом направления."""
+    clauses = []
+    for i, (col, descending) in enumerate(order_by):
+        equal = [c == v for (c, _), v in zip(order_by[:i], values[:i])]
+        step = col < values[i] if descending else col > values[i]
+        clauses.append(and_(*equal, step))
+    return or_(*clauses)
+
+
+def parse_limit():
+    """None — постраничный режим не запрошен (нет ни limit, ни cursor)."""
+    if "limit" not in request.args and "cursor" not in request.args:
+        return None
+    # Не args.get(type=int): он молча подставил бы DEFAULT_LIMIT вместо "ten"
+    try:
+        limit = int(request.args.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        limit = 0
+    if limit < 1:
+        raise PaginationError("limit must be a positive integer")
+    return min(limit, MAX_LIMIT)
+
+
+def paginate(query, order_by, columns=None):
+    """Keyset-пагинация. order_by: [(column, descending)], последний — уникальный (id).
+
+    Возвращает (rows, next_cursor); next_cursor = None на последней странице.
+    Без limit и cursor возвращается весь список, как до пагинации: клиенты,
+    не читающие X-Next-Cursor, не теряют строки.
+    """
+    limit = parse_limit()
+
+    if columns is not None:
+        keys = [col for col, _ in order_by]
+        needed = {c.key: c for c in list(columns) + keys}
+        query = query.options(load_only(*needed.values()))
+
+    cursor = request.args.get("cursor")
+    if cursor:
+        query = query.filter(_after(order_by, decode_cursor(cursor, order_by)))
+
+    query = query.order_by(*[col.desc() if desc else col.asc() for col, desc in order_by])
+    if limit is None:
+        return query.all(), None
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, col.key) for col, _ in order_by])
+    return rows, next_cursor
+
+
+def paginated_response(items, next_cursor):
+    """Тело — прежний JSON-массив; курсор следующей страницы — в заголовках."""
+    response = jsonify(items)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+        args = request.args.to_dict()
+        args["cursor"] = next_cursor
+        response.headers["Link"] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+    return response
@@ -0,0 +1,116 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from flask import jsonify
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+# Сам расчёт хэша занимает доли секунды; верхняя граница с запасом на медленный CPU
+RUN_TIMEOUT = 10.0
+
+
+class HashingOverloaded(Exception):
+    """Пул хэширования переполнен или задача простояла в очереди дольше дедлайна."""
+
+
+# ------------------------------------
+# Хэширование паролей на отдельном пуле
+# ------------------------------------
+# PBKDF2 / scrypt — чистая нагрузка на CPU. Если считать их прямо в
+# обработчике, пик входов в начале урока занимает все воркеры сервера.
+# Здесь хэши считаются в ограниченном пуле (hashlib отпускает GIL):
+# - в очереди не больше max_pending задач, остальные сразу получают отказ;
+# - задача, дождавшаяся воркера позже queue_deadline, не выполняется —
+#   клиент к этому времени уже получил 503 и повторит запрос.
+#
+# Параметры хэша (метод, итерации / стоимость scrypt) хранятся в префиксе
+# каждого хэша ("scrypt:32768:8:1$соль$хэш"), поэтому после смены
+# PASSWORD_HASH_METHOD старые хэши продолжают проверяться, а при
+# успешном входе needs_rehash() подсказывает пересчитать хэш.
+
+class PasswordHasher:
+    def __init__(self, method="scrypt", workers=None, max_pending=256, queue_deadline=5.0):
+        self.method = method
+        # Полная строка параметров, как она записывается в хэш (с итерациями по умолчанию)
+        self.params = generate_password_hash("", method).split("$", 1)[0]
+        self.workers = workers or os.cpu_count() or 2
+        self.max_pending = max_pending
+        self.queue_deadline = queue_deadline
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="pwhash")
+        self._slots = threading.BoundedSemaphore(self.workers + max_pending)
+        self._lock = threading.Lock()
+        self.counters = {"hashed": 0, "verified": 0, "rejected": 0, "expired": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            raise HashingOverloaded("Too many pending password checks")
+
+        enqueued = time.monotonic()
+
+        def run():
+            try:
+                if time.monotonic() - enqueued > self.queue_deadline:
+                    self._count("expired")
+                    raise HashingOverloaded("Password check waited too long in queue")
+                return fn(*args)
+            finally:
+                self._slots.release()
+
+        future = self._executor.submit(run)
+        try:
+            return future.result(timeout=self.queue_deadline + RUN_TIMEOUT)
+        except FutureTimeout:
+            raise HashingOverloaded("Password check timed out")
+
+    def hash(self, password):
+        result = self._submit(generate_password_hash, password, self.method)
+        self._count("hashed")
+        return result
+
+    def verify(self, pwhash, password):
+        if not pwhash:
+            return False
+        result = self._submit(check_password_hash, pwhash, password)
+        self._count("verified")
+        return result
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split("$", 1)[0] != self.params
+
+    def stats(self):
+        with self._lock:
+            return {
+                "params": self.params,
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                **self.counters,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def init_passwords(app):
+    hasher = PasswordHasher(
+        method=app.config["PASSWORD_HASH_METHOD"],
+        workers=app.config["PASSWORD_HASH_WORKERS"],
+        max_pending=app.config["PASSWORD_HASH_MAX_PENDING"],
+        queue_deadline=app.config["PASSWORD_HASH_QUEUE_DEADLINE"],
+    )
+    app.extensions["password_hasher"] = hasher
+
+    @app.errorhandler(HashingOverloaded)
+    def hashing_overloaded(e):
+        response = jsonify({"message": "Server is busy, try again shortly"})
+        response.headers["Retry-After"] = "1"
+        return response, 503
+
+    return hasher
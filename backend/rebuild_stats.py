@@ -0,0 +1,9 @@
+from app import app
+from stats import rebuild_all
+
+# Полный пересчёт student_stats / teacher_stats из исходных таблиц.
+# Запускать, если счётчики разошлись с данными (ручные правки БД, сбои).
+with app.app_context():
+    print("🔄 Rebuilding statistics...")
+    students, teachers = rebuild_all()
+    print(f"📊 Rebuilt stats for {students} students and {teachers} teachers")
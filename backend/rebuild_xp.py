@@ -0,0 +1,12 @@
+import time
+
+from app import app
+from xp_ledger import rebuild_all
+
+# Пересчёт total_xp / current_level / streak всех студентов из журнала XP.
+# Запускать после изменения правил уровней или при подозрении на дрейф.
+with app.app_context():
+    print("🔄 Rebuilding XP from the ledger...")
+    started = time.perf_counter()
+    students = rebuild_all()
+    print(f"🏅 Rebuilt XP, levels and streaks for {students} students ({time.perf_counter() - started:.2f}s)")
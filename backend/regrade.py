@@ -0,0 +1,244 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from types import SimpleNamespace
+
+from extensions import db
+from models import GradingJob, RegradeJob, StudentSubmission, Task
+import stats
+import xp_ledger
+
+
+# ------------------------------------
+# Массовая перепроверка отправок задачи
+# ------------------------------------
+class RegradeQueue:
+    """Фоновая перепроверка всех отправок задачи.
+
+    Отправки обрабатываются пачками по id; курсор (last_submission_id)
+    коммитится вместе с изменениями пачки, поэтому после перезапуска
+    задание продолжается с места остановки. Одинаковый код проверяется
+    один раз, проверки идут параллельно (не больше `workers`).
+    """
+
+    def __init__(self, app, grader, workers=4, batch_size=200, poll_interval=5.0):
+        self.app = app
+        self.grader = grader
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # ---------- жизненный цикл ----------
+    def start(self):
+        with self._lock:
+            if self._thread:
+                return
+            self._thread = threading.Thread(target=self._worker, name="regrade", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+        self._stop.clear()
+
+    def notify(self):
+        self.start()
+        self._wakeup.set()
+
+    # ---------- API для роутов ----------
+    def enqueue(self, task, teacher_id):
+        """Новое задание или уже идущее для этой задачи."""
+        active = RegradeJob.query.filter(
+            RegradeJob.task_id == task.id,
+            RegradeJob.status.in_(("queued", "running")),
+        ).first()
+        if active:
+            return active, False
+
+        job = RegradeJob(
+            task_id=task.id,
+            teacher_id=teacher_id,
+            status="queued",
+            total=StudentSubmission.query.filter_by(task_id=task.id).count(),
+        )
+        db.session.add(job)
+        db.session.commit()
+        return job, True
+
+    def drain(self):
+        """Синхронно выполнить все задания (для тестов/CLI)."""
+        processed = 0
+        while True:
+            job = self._next_job()
+            if job is None:
+                return processed
+            self._run(job.id)
+            processed += 1
+
+    # ---------- воркер ----------
+    def _worker(self):
+        with self.app.app_context():
+            while not self._stop.is_set():
+                try:
+                    job = self._next_job()
+                    if job is not None:
+                        self._run(job.id)
+                        continue
+                except Exception as e:
+                    print("REGRADE ERROR:", e)
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _next_job(self):
+        # running — задание, прерванное перезапуском: продолжаем по курсору
+        return (
+            RegradeJob.query
+            .filter(RegradeJob.status.in_(("queued", "running")))
+            .order_by(RegradeJob.id)
+            .first()
+        )
+
+    def _run(self, job_id):
+        job = db.session.get(RegradeJob, job_id)
+        task = db.session.get(Task, job.task_id)
+        if task is None:
+            job.status = "failed"
+            job.error = "Task not found"
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            return
+
+        job.status = "running"
+        job.started_at = job.started_at or datetime.utcnow()
+
+        # Снимок задачи: проверки идут в других потоках, ORM-объект туда не передаём
+        snapshot = SimpleNamespace(
+            id=task.id,
+            title=task.title,
+            description=task.description,
+            test_cases=task.test_cases,
+            xp_reward=task.xp_reward or 0,
+        )
+        db.session.commit()
+
+        verdicts = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="regrade") as pool:
+            while not self._stop.is_set():
+                batch = (
+                    StudentSubmission.query
+                    .filter(
+                        StudentSubmission.task_id == task.id,
+                        StudentSubmission.id > (job.last_submission_id or 0),
+                        # Ещё не проверенные очередью — она сама проверит их по новой задаче
+                        ~StudentSubmission.grading_jobs.any(
+                            GradingJob.status.in_(("queued", "running"))
+                        ),
+                    )
+                    .order_by(StudentSubmission.id)
+                    .limit(self.batch_size)
+                    .all()
+                )
+                if not batch:
+                    break
+
+                try:
+                    self._grade_batch(pool, snapshot, batch, verdicts)
+                except Exception as e:
+                    db.session.rollback()
+                    job = db.session.get(RegradeJob, job_id)
+                    job.status = "failed"
+                    job.error = str(e)
+                    job.finished_at = datetime.utcnow()
+                    db.session.commit()
+                    return
+
+                self._apply_batch(job, snapshot, batch, verdicts)
+
+        if not self._stop.is_set():
+            job.status = "done"
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+
+    def _grade_batch(self, pool, task, batch, verdicts):
+        # Дедупликация: каждый уникальный код проверяется один раз за задание
+        # (code_hash — sha256 кода; сам код читается только для новых хэшей)
+        pending = {}
+        for s in batch:
+            digest = s.code_hash
+            if digest not in verdicts and digest not in pending:
+                pending[digest] = pool.submit(self._grade, task, s.code)
+
+        for digest, future in pending.items():
+            verdicts[digest] = future.result()
+
+    def _grade(self, task, code):
+        with self.app.app_context():
+            return self.grader.grade(task, code)
+
+    def _apply_batch(self, job, task, batch, verdicts):
+        xp_changes = []
+        stat_deltas = {}
+        changed = 0
+
+        for s in batch:
+            is_correct, feedback = verdicts[s.code_hash]
+            xp = task.xp_reward if is_correct else 0
+
+            if bool(s.is_correct) != is_correct or (s.xp_earned or 0) != xp:
+                changed += 1
+                xp_changes.append((s, xp - (s.xp_earned or 0)))
+
+                d = stat_deltas.setdefault(s.student_id, {"correct_submissions": 0})
+                d["correct_submissions"] += int(is_correct) - int(bool(s.is_correct))
+
+            s.is_correct = is_correct
+            s.xp_earned = xp
+            s.feedback = feedback
+
+        # Поправки XP — событиями журнала, одним UPDATE ... CASE на всю пачку
+        xp_ledger.submissions_regraded(xp_changes)
+        stats.apply_student_deltas(stat_deltas)
+
+        # Курсор и изменения — в одной транзакции
+        job.last_submission_id = batch[-1].id
+        job.processed = (job.processed or 0) + len(batch)
+        job.changed = (job.changed or 0) + changed
+        db.session.commit()
+
+
+def init_regrade(app):
+    queue = RegradeQueue(
+        app,
+        app.extensions["grading_queue"].grader,
+        workers=app.config.get("REGRADE_WORKERS", 4),
+        batch_size=app.config.get("REGRADE_BATCH_SIZE", 200),
+    )
+    app.extensions["regrade_queue"] = queue
+    return queue
+
+
+def regrade_job_to_dict(job):
+    return {
+        "job_id": job.id,
+        "task_id": job.task_id,
+        "status": job.status,
+        "total": job.total,
+        "processed": job.processed,
+        "changed": job.changed,
+        "progress": round(job.processed / job.total * 100, 2) if job.total else 100.0,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
@@ -1,55 +1,79 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from extensions import db
-from werkzeug.security import generate_password_hash
 from models import Teacher, Student
+from pagination import Fields, PaginationError, paginate, paginated_response
+from export import DATASETS, FORMATS, export_response
+from sqlalchemy.orm import joinedload
+from security import role_required
+import stats
 
 admin_routes = Blueprint("admin_routes", __name__)
 
+TEACHER_FIELDS = Fields(
+    id=([Teacher.id], lambda t: t.id),
+    email=([Teacher.email], lambda t: t.email),
+)
+
+STUDENT_FIELDS = Fields(
+    id=([Student.id], lambda s: s.id),
+    email=([Student.email], lambda s: s.email),
+    first_name=([Student.first_name], lambda s: s.first_name),
+    last_name=([Student.last_name], lambda s: s.last_name),
+    teacher=(
+        [Student.teacher_id],
+        lambda s: {"id": s.teacher.id, "email": s.teacher.email} if s.teacher else None,
+    ),
+)
+
 
 # -----------------------------------------
 # GET ALL TEACHERS
 # -----------------------------------------
 @admin_routes.route("/teachers", methods=["GET"])
-def get_teachers():
-    teachers = Teacher.query.all()
-    return jsonify([
-        {"id": t.id, "email": t.email}
-        for t in teachers
-    ]), 200
+@role_required("superadmin")
+def get_teachers(current_admin_id):
+    try:
+        fields = TEACHER_FIELDS.parse()
+        teachers, next_cursor = paginate(
+            Teacher.query,
+            [(Teacher.id, False)],
+            columns=TEACHER_FIELDS.columns(fields),
+        )
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return paginated_response([TEACHER_FIELDS.serialize(t, fields) for t in teachers], next_cursor), 200
 
 
 # -----------------------------------------
 # GET ALL STUDENTS
 # -----------------------------------------
 @admin_routes.route("/students", methods=["GET"])
-def get_students():
-    students = Student.query.all()
-    result = []
-
-    for s in students:
-        teacher = None
-        if s.teacher:
-            teacher = {
-                "id": s.teacher.id,
-                "email": s.teacher.email
-            }
-
-        result.append({
-            "id": s.id,
-            "email": s.email,
-            "first_name": s.first_name,
-            "last_name": s.last_name,
-            "teacher": teacher
-        })
-
-    return jsonify(result), 200
+@role_required("superadmin")
+def get_students(current_admin_id):
+    try:
+        fields = STUDENT_FIELDS.parse()
+        query = Student.query
+        if "teacher" in fields:
+            # Учитель — тем же запросом, без N+1
+            query = query.options(joinedload(Student.teacher).load_only(Teacher.id, Teacher.email))
+        students, next_cursor = paginate(
+            query,
+            [(Student.id, False)],
+            columns=STUDENT_FIELDS.columns(fields),
+        )
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return paginated_response([STUDENT_FIELDS.serialize(s, fields) for s in students], next_cursor), 200
 
 
 # -----------------------------------------
 # CREATE TEACHER
 # -----------------------------------------
 @admin_routes.route("/teachers", methods=["POST"])
-def add_teacher():
+@role_required("superadmin")
+def add_teacher(current_admin_id):
     data = request.get_json() or {}
 
     email = data.get("email")
@@ -63,7 +87,7 @@ def add_teacher():
 
     t = Teacher(
         email=email,
-        password_hash=generate_password_hash(password)
+        password_hash=current_app.extensions["password_hasher"].hash(password)
     )
 
     db.session.add(t)
@@ -76,7 +100,8 @@ def add_teacher():
 # CREATE STUDENT
 # -----------------------------------------
 @admin_routes.route("/students", methods=["POST"])
-def add_student():
+@role_required("superadmin")
+def add_student(current_admin_id):
     data = request.get_json() or {}
 
     email = data.get("email")
@@ -95,13 +120,14 @@ def add_student():
 
     student = Student(
         email=email,
-        password=password,
+        password_hash=current_app.extensions["password_hasher"].hash(password),
         first_name=data.get("first_name", "NoName"),
         last_name=data.get("last_name", "NoLast"),
         teacher_id=teacher_id
     )
 
     db.session.add(student)
+    stats.student_created(student)
     db.session.commit()
 
     return jsonify({"message": "Student created"}), 201
@@ -111,7 +137,8 @@ def add_student():
 # ASSIGN STUDENT TO TEACHER
 # -----------------------------------------
 @admin_routes.route("/assign-student", methods=["POST"])
-def assign_student():
+@role_required("superadmin")
+def assign_student(current_admin_id):
     data = request.get_json() or {}
 
     student_id = data.get("student_id")
@@ -126,7 +153,22 @@ def assign_student():
     if not student or not teacher:
         return jsonify({"error": "Student or teacher not found"}), 404
 
+    old_teacher_id = student.teacher_id
     student.teacher_id = teacher.id
+    stats.student_moved(student, old_teacher_id)
     db.session.commit()
 
     return jsonify({"message": "Assigned"}), 200
+
+
+# -----------------------------------------
+# EXPORT (вся школа, CSV / NDJSON)
+# -----------------------------------------
+@admin_routes.route("/export/<dataset>", methods=["GET"])
+@role_required("superadmin")
+def export_school(current_admin_id, dataset):
+    fmt = request.args.get("format", "csv")
+    if dataset not in DATASETS or fmt not in FORMATS:
+        return jsonify({"error": "Unknown dataset or format"}), 400
+
+    return export_response(dataset, fmt, include_code=request.args.get("include_code") == "1")
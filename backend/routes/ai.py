@@ -1,135 +1,215 @@
-from flask import Blueprint, request, jsonify
-import jwt
-from functools import wraps
-from extensions import db
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
+from flask import Blueprint, request, jsonify, current_app
+from security import role_required
+from streaming import JSONObjectStream, sse, sse_response
+import json
 
 ai_bp = Blueprint('ai', __name__)
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+MODEL = "gpt-4o-mini"
+
+ANALYZE_PROMPT = (
+    "You are an experienced Python teacher. Analyze the student's code. "
+    "Return ONLY JSON like:\n"
+    "{\n"
+    "  \"complexity\": \"low\" | \"medium\" | \"high\",\n"
+    "  \"estimated_time\": number,\n"
+    "  \"recommendations\": [\"text1\", \"text2\"]\n"
+    "}"
+)
+
+GENERATE_PROMPT = (
+    "You are an informatics teacher. Generate 3 Python tasks. "
+    "Return ONLY JSON array like:\n"
+    "[{\n"
+    "  \"title\": \"...\",\n"
+    "  \"description\": \"...\",\n"
+    "  \"difficulty\": \"Beginner\" | \"Intermediate\" | \"Advanced\",\n"
+    "  \"example_code\": \"code here...\",\n"
+    "  \"hints\": [\"h1\", \"h2\"]\n"
+    "}]"
+)
+
+
+# ---------------------------------------------------------
+# Вызовы модели (обычный и потоковый, через общий LLM-клиент)
+# ---------------------------------------------------------
+def _request(system_prompt, content, temperature, max_tokens):
+    return dict(
+        model=MODEL,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": content}
+        ],
+        temperature=temperature,
+        max_tokens=max_tokens
+    )
 
-SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 
+def completion_call(endpoint, system_prompt, content, temperature, max_tokens):
+    llm = current_app.extensions["llm"]
+    return lambda: llm.complete(endpoint, **_request(system_prompt, content, temperature, max_tokens))
 
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        token = request.headers.get('Authorization')
 
-        if not token:
-            return jsonify({'message': 'Token is missing'}), 401
+def stream_call(endpoint, system_prompt, content, temperature, max_tokens):
+    llm = current_app.extensions["llm"]
+    return lambda: llm.stream(endpoint, **_request(system_prompt, content, temperature, max_tokens))
 
-        try:
-            token = token.split(' ')[1]
-            data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            user_id = data.get("user_id")
-        except Exception:
-            return jsonify({'message': 'Invalid token'}), 401
 
-        return f(user_id, *args, **kwargs)
+# ---------------------------------------------------------
+# Разбор ответов (общий для обычных и потоковых эндпоинтов)
+# ---------------------------------------------------------
+def parse_analysis(raw):
+    try:
+        return json.loads(raw)
+    except (TypeError, ValueError):
+        return {
+            "complexity": "medium",
+            "estimated_time": 30,
+            "recommendations": ["Check syntax", "Fix formatting", raw]
+        }
+
+
+def parse_tasks(raw, prompt):
+    try:
+        return json.loads(raw)
+    except (TypeError, ValueError):
+        return [{
+            "title": f"Fallback {prompt}",
+            "description": "Parsing error",
+            "difficulty": "Intermediate",
+            "example_code": "def solution(): pass",
+            "hints": ["Review your logic", raw]
+        }]
+
+
+def _analyze_input():
+    data = request.get_json() or {}
+    return data.get("code", "").strip()
+
 
-    return decorated
+def _generate_input():
+    data = request.get_json() or {}
+    return data.get("prompt", "").strip()
 
 
 @ai_bp.route('/analyze-task', methods=['POST'])
-@token_required
+@role_required("student", "teacher", "superadmin")
 def analyze_task(current_user_id):
-    data = request.get_json()
-    student_code = data.get("code", "").strip()
+    student_code = _analyze_input()
 
     if not student_code:
         return jsonify({"message": "Code is required"}), 400
 
-    system_prompt = (
-        "You are an experienced Python teacher. Analyze the student's code. "
-        "Return ONLY JSON like:\n"
-        "{\n"
-        "  \"complexity\": \"low\" | \"medium\" | \"high\",\n"
-        "  \"estimated_time\": number,\n"
-        "  \"recommendations\": [\"text1\", \"text2\"]\n"
-        "}"
-    )
-
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": student_code}
-            ],
+        raw = current_app.extensions["ai_cache"].completion(
+            "analyze-task", completion_call("analyze-task", ANALYZE_PROMPT, student_code, 0.4, 500),
+            model=MODEL,
+            system_prompt=ANALYZE_PROMPT,
+            content=student_code,
             temperature=0.4,
-            max_tokens=500
+            code=True,
         )
+        return jsonify(parse_analysis(raw)), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        raw = response.choices[0].message.content
 
-        import json
+# SSE: token (кусок текста) ... → done (тот же JSON, что у /analyze-task) | error
+@ai_bp.route('/analyze-task/stream', methods=['POST'])
+@role_required("student", "teacher", "superadmin")
+def analyze_task_stream(current_user_id):
+    student_code = _analyze_input()
+
+    if not student_code:
+        return jsonify({"message": "Code is required"}), 400
+
+    def events():
+        parts = []
         try:
-            parsed = json.loads(raw)
-        except:
-            parsed = {
-                "complexity": "medium",
-                "estimated_time": 30,
-                "recommendations": ["Check syntax", "Fix formatting", raw]
-            }
+            for delta in current_app.extensions["ai_cache"].stream(
+                "analyze-task", stream_call("analyze-task", ANALYZE_PROMPT, student_code, 0.4, 500),
+                model=MODEL,
+                system_prompt=ANALYZE_PROMPT,
+                content=student_code,
+                temperature=0.4,
+                code=True,
+            ):
+                parts.append(delta)
+                yield sse("token", {"text": delta})
 
-        return jsonify(parsed), 200
+            yield sse("done", parse_analysis("".join(parts)))
 
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        except Exception as e:
+            yield sse("error", {"error": str(e)})
+
+    return sse_response(events())
 
 
 @ai_bp.route('/generate-tasks', methods=['POST'])
-@token_required
+@role_required("teacher", "superadmin")
 def generate_tasks(current_user_id):
-    data = request.get_json()
-    prompt = data.get("prompt", "").strip()
+    prompt = _generate_input()
 
     if not prompt:
         return jsonify({"message": "Prompt is required"}), 400
 
-    system_prompt = (
-        "You are an informatics teacher. Generate 3 Python tasks. "
-        "Return ONLY JSON array like:\n"
-        "[{\n"
-        "  \"title\": \"...\",\n"
-        "  \"description\": \"...\",\n"
-        "  \"difficulty\": \"Beginner\" | \"Intermediate\" | \"Advanced\",\n"
-        "  \"example_code\": \"code here...\",\n"
-        "  \"hints\": [\"h1\", \"h2\"]\n"
-        "}]"
-    )
-
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
+        raw = current_app.extensions["ai_cache"].completion(
+            "generate-tasks", completion_call("generate-tasks", GENERATE_PROMPT, prompt, 0.7, 800),
+            model=MODEL,
+            system_prompt=GENERATE_PROMPT,
+            content=prompt,
             temperature=0.7,
-            max_tokens=800
         )
+        return jsonify(parse_tasks(raw, prompt)), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 
-        raw = response.choices[0].message.content
+# SSE: token ... / task (каждая задача, как только её JSON-объект закрыт)
+# → done (тот же JSON-массив, что у /generate-tasks) | error
+@ai_bp.route('/generate-tasks/stream', methods=['POST'])
+@role_required("teacher", "superadmin")
+def generate_tasks_stream(current_user_id):
+    prompt = _generate_input()
 
-        import json
+    if not prompt:
+        return jsonify({"message": "Prompt is required"}), 400
+
+    def events():
+        parser = JSONObjectStream()
+        parts = []
         try:
-            tasks = json.loads(raw)
-        except:
-            tasks = [{
-                "title": f"Fallback {prompt}",
-                "description": "Parsing error",
-                "difficulty": "Intermediate",
-                "example_code": "def solution(): pass",
-                "hints": ["Review your logic", raw]
-            }]
-
-        return jsonify(tasks), 200
+            for delta in current_app.extensions["ai_cache"].stream(
+                "generate-tasks", stream_call("generate-tasks", GENERATE_PROMPT, prompt, 0.7, 800),
+                model=MODEL,
+                system_prompt=GENERATE_PROMPT,
+                content=prompt,
+                temperature=0.7,
+            ):
+                parts.append(delta)
+                yield sse("token", {"text": delta})
+                for task in parser.feed(delta):
+                    yield sse("task", task)
 
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+            yield sse("done", parse_tasks("".join(parts), prompt))
+
+        except Exception as e:
+            yield sse("error", {"error": str(e)})
+
+    return sse_response(events())
+
+
+@ai_bp.route('/cache/stats', methods=['GET'])
+@role_required("teacher", "superadmin")
+def cache_stats(current_user_id):
+    return jsonify(current_app.extensions["ai_cache"].stats()), 200
+
+
+# Задержки, токены, повторы и состояние предохранителя по эндпоинтам
+@ai_bp.route('/llm/stats', methods=['GET'])
+@role_required("teacher", "superadmin")
+def llm_stats(current_user_id):
+    return jsonify(current_app.extensions["llm"].metrics()), 200
@@ -1,16 +1,12 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from extensions import db
 from models import Teacher, Student, SuperAdmin
-from werkzeug.security import check_password_hash, generate_password_hash
+from security import SECRET_KEY, role_required
 import jwt
-import os
 from datetime import datetime, timedelta
 
 auth_bp = Blueprint("auth", __name__)
 
-# Надежный fallback если .env пуст или отсутствует
-SECRET_KEY = os.getenv("JWT_SECRET_KEY") or "SUPER_SECRET_KEY_123"
-
 
 # -----------------------------------------------------
 # JWT TOKEN CREATOR
@@ -24,6 +20,29 @@ def create_token(user_id, role):
     return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
 
 
+# -----------------------------------------------------
+# PASSWORD CHECK (пул хэширования + пересчёт устаревших хэшей;
+# при перегрузке пула — 503, см. passwords.init_passwords)
+# -----------------------------------------------------
+LOGIN_ROLES = {
+    "superadmin": (SuperAdmin, "SuperAdmin not found"),
+    "teacher": (Teacher, "Teacher not found"),
+    "student": (Student, "Student not found"),
+}
+
+
+def check_password(model, user_id, password_hash, password):
+    hasher = current_app.extensions["password_hasher"]
+    if not hasher.verify(password_hash, password):
+        return False
+
+    # Хэш с устаревшими параметрами пересчитываем, пока пароль известен
+    if hasher.needs_rehash(password_hash):
+        model.query.filter_by(id=user_id).update({"password_hash": hasher.hash(password)})
+        db.session.commit()
+    return True
+
+
 # -----------------------------------------------------
 # UNIVERSAL LOGIN (superadmin + teacher + student)
 # -----------------------------------------------------
@@ -39,56 +58,32 @@ def login():
     if not email or not password or not role:
         return jsonify({"message": "Missing required fields"}), 400
 
-    # ---------------- SUPERADMIN ----------------
-    if role == "superadmin":
-        user = SuperAdmin.query.filter_by(email=email).first()
-        if not user:
-            return jsonify({"message": "SuperAdmin not found"}), 404
-
-        if not check_password_hash(user.password_hash, password):
-            return jsonify({"message": "Invalid password"}), 401
-
-        token = create_token(user.id, "superadmin")
-        return jsonify({
-            "token": token,
-            "user_id": user.id,
-            "role": "superadmin"
-        }), 200
-
-    # ---------------- TEACHER ----------------
-    elif role == "teacher":
-        user = Teacher.query.filter_by(email=email).first()
-        if not user:
-            return jsonify({"message": "Teacher not found"}), 404
-
-        if not check_password_hash(user.password_hash, password):
-            return jsonify({"message": "Invalid password"}), 401
-
-        token = create_token(user.id, "teacher")
-        return jsonify({
-            "token": token,
-            "user_id": user.id,
-            "role": "teacher"
-        }), 200
-
-    # ---------------- STUDENT ----------------
-    elif role == "student":
-        user = Student.query.filter_by(email=email).first()
-        if not user:
-            return jsonify({"message": "Student not found"}), 404
-
-        # ЖАЙ ТЕКСТ салыстыру
-        if user.password != password:
-            return jsonify({"message": "Invalid password"}), 401
-
-        token = create_token(user.id, "student")
-        return jsonify({"token": token, "user_id": user.id, "role": "student"}), 200
+    if role not in LOGIN_ROLES:
+        return jsonify({"message": "Unknown role"}), 400
+
+    model, not_found = LOGIN_ROLES[role]
+    user = db.session.query(model.id, model.password_hash).filter_by(email=email).first()
+
+    # Соединение с БД не держим, пока хэш ждёт своей очереди в пуле
+    db.session.rollback()
+
+    if not user:
+        return jsonify({"message": not_found}), 404
+
+    if not check_password(model, user.id, user.password_hash, password):
+        return jsonify({"message": "Invalid password"}), 401
+
+    token = create_token(user.id, role)
+    return jsonify({"token": token, "user_id": user.id, "role": role}), 200
+
 
 # -----------------------------------------------------
-# SUPERADMIN REGISTRATION
+# SUPERADMIN REGISTRATION (только существующий супер-админ;
+# первый создаётся create_default_superadmin при запуске)
 # -----------------------------------------------------
 @auth_bp.route("/register_admin", methods=["POST"])
-def register_admin():
+@role_required("superadmin")
+def register_admin(current_admin_id):
     data = request.get_json() or {}
 
     email = data.get("email")
@@ -100,7 +95,7 @@ def register_admin():
     if SuperAdmin.query.filter_by(email=email).first():
         return jsonify({"message": "Admin already exists"}), 409
 
-    hashed_pw = generate_password_hash(password)
+    hashed_pw = current_app.extensions["password_hasher"].hash(password)
     admin = SuperAdmin(email=email, password_hash=hashed_pw)
 
     db.session.add(admin)
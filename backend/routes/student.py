@@ -1,48 +1,43 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from extensions import db
-from models import Student, TaskAssignment, Task, StudentSubmission
-from functools import wraps
-import jwt
-import os
+from models import Student, Task, StudentSubmission, GradingJob
+from grading import job_to_dict
+from cohorts import is_assigned, student_tasks
+from pagination import Fields, PaginationError, paginate, paginated_response
+from security import role_required, current_user
+from leaderboard import DEFAULT_LIMIT, top_entries
+import stats
+import attendance
+import code_store
+import http_cache
+import similarity
 from datetime import datetime
-import openai
+from sqlalchemy import select
 
 student_bp = Blueprint('student', __name__)
 
-SECRET_KEY = os.getenv("JWT_SECRET_KEY")
+# Максимальное время long-poll для статуса проверки (сек)
+MAX_GRADING_WAIT = 30
 
-
-# ---------------------------------------------------------
-# JWT Проверка
-# ---------------------------------------------------------
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        auth = request.headers.get("Authorization", "")
-
-        if not auth.startswith("Bearer "):
-            return jsonify({"message": "Token is missing"}), 401
-
-        token = auth.split(" ")[1]
-
-        try:
-            decoded = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-            student_id = decoded.get("user_id")
-        except Exception:
-            return jsonify({"message": "Invalid token"}), 401
-
-        return f(student_id, *args, **kwargs)
-
-    return decorated
+SUBMISSION_FIELDS = Fields(
+    id=([StudentSubmission.id], lambda s: s.id),
+    task_id=([StudentSubmission.task_id], lambda s: s.task_id),
+    code=([StudentSubmission.code_hash], lambda s: s.code),
+    is_correct=([StudentSubmission.is_correct], lambda s: s.is_correct),
+    xp_earned=([StudentSubmission.xp_earned], lambda s: s.xp_earned),
+    submitted_at=([StudentSubmission.submitted_at], lambda s: s.submitted_at.isoformat()),
+    feedback=([StudentSubmission.feedback], lambda s: s.feedback),
+)
 
 
 # ---------------------------------------------------------
 # Профиль студента
 # ---------------------------------------------------------
 @student_bp.route('/profile', methods=['GET'])
-@token_required
+@role_required("student")
+@http_cache.conditional(lambda current_student_id: [http_cache.student_key(current_student_id)])
 def profile(current_student_id):
-    student = Student.query.get(current_student_id)
+    student = current_user()
 
     if not student:
         return jsonify({"message": "Student not found"}), 404
@@ -61,33 +56,43 @@ def profile(current_student_id):
 # ---------------------------------------------------------
 # Назначенные задачи
 # ---------------------------------------------------------
+def _task_list_resources(current_student_id):
+    # Задачи когорты учителя + свои назначения (создаются при отправке)
+    teacher_id = db.session.execute(
+        select(Student.teacher_id).where(Student.id == current_student_id)
+    ).scalar()
+    return [http_cache.student_key(current_student_id), http_cache.tasks_key(teacher_id)]
+
+
 @student_bp.route('/tasks', methods=['GET'])
-@token_required
+@role_required("student")
+@http_cache.conditional(_task_list_resources)
 def assigned_tasks(current_student_id):
-    assignments = TaskAssignment.query.filter_by(student_id=current_student_id).all()
+    student = current_user()
+    if not student:
+        return jsonify({"message": "Student not found"}), 404
 
     task_list = []
-    for a in assignments:
-        task = Task.query.get(a.task_id)
+    for task, assignment, assigned_at in student_tasks(student):
         task_list.append({
-            "assignment_id": a.id,
+            "assignment_id": assignment.id if assignment else None,
             "task_id": task.id,
             "title": task.title,
             "description": task.description,
             "difficulty": task.difficulty,
             "complexity": task.complexity,
             "xp_reward": task.xp_reward,
-            "assigned_at": a.assigned_at.isoformat()
+            "assigned_at": assigned_at.isoformat() if assigned_at else None
         })
 
     return jsonify(task_list), 200
 
 
 # ---------------------------------------------------------
-# Отправка кода + AI проверка
+# Отправка кода (проверка — асинхронно, через очередь)
 # ---------------------------------------------------------
 @student_bp.route('/submit', methods=['POST'])
-@token_required
+@role_required("student")
 def submit_code(current_student_id):
     data = request.get_json() or {}
 
@@ -97,84 +102,132 @@ def submit_code(current_student_id):
     if not task_id or not code:
         return jsonify({"message": "Missing task_id or code"}), 400
 
+    student = current_user()
+    if not student:
+        return jsonify({"message": "Student not found"}), 404
+
+    # Чужая задача (не в когорте и не назначена явно) для студента не существует
     task = Task.query.get(task_id)
-    if not task:
+    if not task or not is_assigned(student, task.id):
         return jsonify({"message": "Task not found"}), 404
 
-    # Создаём запись отправки
+    # Создаём запись отправки (код — в хранилище блобов, подпись — в индекс похожести)
+    code_hash = code_store.put(code)
+    similarity.index_submission(task.id, code_hash, code)
     submission = StudentSubmission(
         student_id=current_student_id,
         task_id=task_id,
-        code=code,
+        code_hash=code_hash,
         is_correct=False,
         xp_earned=0,
         submitted_at=datetime.utcnow()
     )
     db.session.add(submission)
+    stats.submission_created(current_student_id)
+
+    queue = current_app.extensions["grading_queue"]
+    job = queue.enqueue(submission)
     db.session.commit()
+    queue.notify()
 
-    # ---------------------------
-    # AI Проверка
-    # ---------------------------
-    openai.api_key = os.getenv("OPENAI_API_KEY")
+    return jsonify({
+        "message": "Submission queued for grading",
+        "job_id": job.id,
+        "submission_id": submission.id,
+        "status": job.status
+    }), 202
 
-    prompt = f"""
-    Проверь код Python и оцени правильно ли решена задача.
-    Код:
 
-    {code}
+# ---------------------------------------------------------
+# Статус проверки (?wait=N — long-poll до N секунд)
+# ---------------------------------------------------------
+@student_bp.route('/grading/<int:job_id>', methods=['GET'])
+@role_required("student")
+def grading_status(current_student_id, job_id):
+    job = GradingJob.query.get(job_id)
+    if not job or job.submission.student_id != current_student_id:
+        return jsonify({"message": "Job not found"}), 404
 
-    Ответь одним словом: correct или incorrect.
-    """
+    wait = min(max(request.args.get("wait", 0, type=float), 0), MAX_GRADING_WAIT)
+    if wait and job.status not in ("done", "failed"):
+        job = current_app.extensions["grading_queue"].wait_for(job_id, wait)
 
-    response = openai.ChatCompletion.create(
-        model="gpt-4o-mini",
-        messages=[{"role": "user", "content": prompt}]
-    )
+    return jsonify(job_to_dict(job)), 200
 
-    feedback = response["choices"][0]["message"]["content"].lower()
-    is_correct = "correct" in feedback
 
-    # Обновляем запись
-    student = Student.query.get(current_student_id)
+# ---------------------------------------------------------
+# История отправок
+# ---------------------------------------------------------
+@student_bp.route('/submissions', methods=['GET'])
+@role_required("student")
+def get_submissions(current_student_id):
+    # ?limit=&cursor= — keyset-пагинация, ?fields=id,is_correct — проекция
+    try:
+        fields = SUBMISSION_FIELDS.parse()
+        submissions, next_cursor = paginate(
+            StudentSubmission.query.filter_by(student_id=current_student_id),
+            [(StudentSubmission.id, False)],
+            columns=SUBMISSION_FIELDS.columns(fields),
+        )
+    except PaginationError as e:
+        return jsonify({"message": str(e)}), 400
+
+    # Код — одним запросом за блобы страницы (и только если его запросили)
+    if "code" in fields:
+        code_store.preload(s.code_hash for s in submissions)
+
+    return paginated_response(
+        [SUBMISSION_FIELDS.serialize(s, fields) for s in submissions],
+        next_cursor
+    ), 200
 
-    if is_correct:
-        submission.is_correct = True
-        submission.xp_earned = task.xp_reward
-        student.total_xp = (student.total_xp or 0) + task.xp_reward
-    else:
-        submission.is_correct = False
-        submission.xp_earned = 0
 
-    submission.feedback = feedback
+# ---------------------------------------------------------
+# Рейтинг по XP: ?scope=class|global&limit=N (+ своё место)
+# ---------------------------------------------------------
+@student_bp.route('/leaderboard', methods=['GET'])
+@role_required("student")
+def leaderboard(current_student_id):
+    scope = request.args.get("scope", "class")
+    if scope not in ("class", "global"):
+        return jsonify({"message": "scope must be 'class' or 'global'"}), 400
+
+    student = current_user()
+    if not student:
+        return jsonify({"message": "Student not found"}), 404
 
-    db.session.commit()
+    teacher_id = student.teacher_id if scope == "class" else None
+    if scope == "class" and teacher_id is None:
+        return jsonify({"scope": scope, "top": [], "me": None}), 200
 
+    board = current_app.extensions["leaderboard"]
     return jsonify({
-        "message": "AI checked your submission",
-        "is_correct": is_correct,
-        "xp_earned": submission.xp_earned,
-        "feedback": feedback
+        "scope": scope,
+        "top": top_entries(board, request.args.get("limit", DEFAULT_LIMIT, type=int), teacher_id),
+        "me": board.position(current_student_id, teacher_id),
     }), 200
 
 
 # ---------------------------------------------------------
-# История отправок
+# Посещаемость: тепловая карта месяца (?month=YYYY-MM), итог и серия
 # ---------------------------------------------------------
-@student_bp.route('/submissions', methods=['GET'])
-@token_required
-def get_submissions(current_student_id):
-    submissions = StudentSubmission.query.filter_by(student_id=current_student_id).all()
-
-    return jsonify([
-        {
-            "id": s.id,
-            "task_id": s.task_id,
-            "code": s.code,
-            "is_correct": s.is_correct,
-            "xp_earned": s.xp_earned,
-            "submitted_at": s.submitted_at.isoformat(),
-            "feedback": s.feedback
-        }
-        for s in submissions
-    ]), 200
+@student_bp.route('/attendance', methods=['GET'])
+@role_required("student")
+def my_attendance(current_student_id):
+    try:
+        month = attendance.parse_month(request.args.get("month"))
+    except ValueError:
+        return jsonify({"message": "month must be YYYY-MM"}), 400
+
+    bitmaps = attendance.months([current_student_id], month, month)
+    marked, present = attendance.totals(current_student_id)
+
+    return jsonify({
+        **attendance.month_summary(month, *bitmaps.get(current_student_id, {}).get(month, (0, 0))),
+        "total": {
+            "marked_days": marked,
+            "present_days": present,
+            "percent": round(present * 100 / marked, 2) if marked else 0,
+        },
+        "streak": attendance.streak(current_student_id),
+    }), 200
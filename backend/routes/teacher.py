@@ -1,69 +1,94 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from extensions import db
-from models import Teacher, Student, Task, TaskAssignment, StudentSubmission, Attendance
-from functools import wraps
-import jwt
-import os
+from models import (
+    Student, Task, StudentSubmission, RegradeJob,
+    StudentStats, TeacherStats, SimilarityBucket,
+)
+from sandbox import parse_test_cases
+from regrade import regrade_job_to_dict
+from cohorts import assign_to_cohort
+from pagination import Fields, PaginationError, paginate, paginated_response
+from export import DATASETS, FORMATS, export_response
+from streaming import JSONObjectStream, sse, sse_response
+from task_bank import bank_key
+from leaderboard import DEFAULT_LIMIT, top_entries
+import attendance
+import code_store
+import http_cache
+import similarity
+import task_search
+from security import role_required
+import stats
 import json
-from datetime import datetime, date
-from openai import OpenAI
+from sqlalchemy import func, case, cast
 
 teacher_bp = Blueprint("teacher", __name__)
 
-SECRET_KEY = os.getenv("JWT_SECRET_KEY")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-client = OpenAI(api_key=OPENAI_API_KEY)
+TASK_FIELDS = Fields(
+    id=([Task.id], lambda t: t.id),
+    title=([Task.title], lambda t: t.title),
+    description=([Task.description], lambda t: t.description),
+    difficulty=([Task.difficulty], lambda t: t.difficulty),
+    complexity=([Task.complexity], lambda t: t.complexity),
+    xp_reward=([Task.xp_reward], lambda t: t.xp_reward),
+    example_code=([Task.example_code], lambda t: t.example_code),
+    hints=([Task.hints], lambda t: t.hints),
+    ai_analysis=([Task.ai_analysis], lambda t: t.ai_analysis),
+    test_cases=([Task.test_cases], lambda t: parse_test_cases(t.test_cases)),
+    date=([Task.date_created], lambda t: t.date_created.isoformat() if t.date_created else None),
+)
 
 
 # ===================================================
-# JWT защита
+# Получить задания
 # ===================================================
-def token_required(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        auth = request.headers.get("Authorization")
-        if not auth or not auth.startswith("Bearer "):
-            return jsonify({"message": "Token missing"}), 401
-
-        token = auth.split(" ")[1]
-
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-            teacher_id = payload.get("user_id")
-        except Exception:
-            return jsonify({"message": "Invalid token"}), 401
+@teacher_bp.route("/<int:teacher_id>/tasks", methods=["GET"])
+@role_required("teacher")
+@http_cache.conditional(lambda current_teacher_id, teacher_id: (
+    [http_cache.tasks_key(teacher_id)] if current_teacher_id == teacher_id else None
+))
+def get_tasks(current_teacher_id, teacher_id):
+    if current_teacher_id != teacher_id:
+        return jsonify({"message": "Forbidden"}), 403
 
-        return f(teacher_id, *args, **kwargs)
+    try:
+        fields = TASK_FIELDS.parse()
+        tasks, next_cursor = paginate(
+            Task.query.filter_by(teacher_id=teacher_id),
+            [(Task.date_created, True), (Task.id, True)],
+            columns=TASK_FIELDS.columns(fields),
+        )
+    except PaginationError as e:
+        return jsonify({"message": str(e)}), 400
 
-    return decorated
+    return paginated_response([TASK_FIELDS.serialize(t, fields) for t in tasks], next_cursor), 200
 
 
 # ===================================================
-# Получить задания
+# Поиск заданий (?q=цикл*, ?difficulty=a,b, ?complexity=, ?limit=)
 # ===================================================
-@teacher_bp.route("/<int:teacher_id>/tasks", methods=["GET"])
-@token_required
-def get_tasks(current_teacher_id, teacher_id):
+@teacher_bp.route("/<int:teacher_id>/tasks/search", methods=["GET"])
+@role_required("teacher")
+def search_tasks(current_teacher_id, teacher_id):
     if current_teacher_id != teacher_id:
         return jsonify({"message": "Forbidden"}), 403
 
-    tasks = Task.query.filter_by(teacher_id=teacher_id).order_by(Task.date_created.desc()).all()
+    try:
+        fields = TASK_FIELDS.parse()
+        results = task_search.search(
+            teacher_id,
+            request.args.get("q"),
+            difficulty=request.args.get("difficulty"),
+            complexity=request.args.get("complexity"),
+            limit=request.args.get("limit", task_search.DEFAULT_LIMIT, type=int) or task_search.DEFAULT_LIMIT,
+            columns=TASK_FIELDS.columns(fields),
+        )
+    except (PaginationError, task_search.SearchError) as e:
+        return jsonify({"message": str(e)}), 400
 
     return jsonify([
-        {
-            "id": t.id,
-            "title": t.title,
-            "description": t.description,
-            "difficulty": t.difficulty,
-            "complexity": t.complexity,
-            "xp_reward": t.xp_reward,
-            "example_code": t.example_code,
-            "hints": t.hints,
-            "ai_analysis": t.ai_analysis,
-            "date": t.date_created.isoformat() if t.date_created else None
-        }
-        for t in tasks
+        {**TASK_FIELDS.serialize(task, fields), "score": score, "snippet": snippet}
+        for task, score, snippet in results
     ]), 200
 
 
@@ -71,13 +96,15 @@ def get_tasks(current_teacher_id, teacher_id):
 # Создать задание вручную
 # ===================================================
 @teacher_bp.route("/<int:teacher_id>/tasks", methods=["POST"])
-@token_required
+@role_required("teacher")
 def create_task(current_teacher_id, teacher_id):
     if current_teacher_id != teacher_id:
         return jsonify({"message": "Forbidden"}), 403
 
     data = request.get_json() or {}
 
+    test_cases = parse_test_cases(data.get("test_cases"))
+
     task = Task(
         teacher_id=teacher_id,
         title=data.get("title"),
@@ -88,15 +115,14 @@ def create_task(current_teacher_id, teacher_id):
         example_code=data.get("example_code"),
         hints=data.get("hints"),
         ai_analysis=data.get("ai_analysis"),
+        test_cases=json.dumps(test_cases, ensure_ascii=False) if test_cases else None,
     )
     db.session.add(task)
-    db.session.commit()
-
-    # Назначаем студентам
-    students = Student.query.filter_by(teacher_id=teacher_id).all()
-    for s in students:
-        db.session.add(TaskAssignment(student_id=s.id, task_id=task.id))
+    db.session.flush()  # id задачи — для назначения; задача, назначение и stats — одним commit
 
+    # Назначаем всему классу (одна строка, независимо от числа студентов)
+    assign_to_cohort(task)
+    stats.task_created(task)
     db.session.commit()
 
     return jsonify({"message": "Task created and assigned", "task_id": task.id}), 201
@@ -106,7 +132,7 @@ def create_task(current_teacher_id, teacher_id):
 # Удалить задание
 # ===================================================
 @teacher_bp.route("/<int:teacher_id>/tasks/<int:task_id>", methods=["DELETE"])
-@token_required
+@role_required("teacher")
 def delete_task(current_teacher_id, teacher_id, task_id):
     if current_teacher_id != teacher_id:
         return jsonify({"message": "Forbidden"}), 403
@@ -115,143 +141,447 @@ def delete_task(current_teacher_id, teacher_id, task_id):
     if not task:
         return jsonify({"message": "Task not found"}), 404
 
+    stats.task_deleted(task)
+    code_hashes = code_store.hashes_of(StudentSubmission.task_id == task.id)
+    SimilarityBucket.query.filter_by(task_id=task.id).delete()
     db.session.delete(task)
+    code_store.release(code_hashes)
     db.session.commit()
 
     return jsonify({"message": "Task deleted"}), 200
 
 
+# ===================================================
+# Перепроверить все отправки задачи (фоновое задание)
+# ===================================================
+@teacher_bp.route("/<int:teacher_id>/tasks/<int:task_id>/regrade", methods=["POST"])
+@role_required("teacher")
+def regrade_task(current_teacher_id, teacher_id, task_id):
+    if current_teacher_id != teacher_id:
+        return jsonify({"message": "Forbidden"}), 403
+
+    task = Task.query.filter_by(id=task_id, teacher_id=teacher_id).first()
+    if not task:
+        return jsonify({"message": "Task not found"}), 404
+
+    queue = current_app.extensions["regrade_queue"]
+    job, created = queue.enqueue(task, teacher_id)
+    queue.notify()
+
+    return jsonify({
+        "message": "Regrade started" if created else "Regrade already in progress",
+        **regrade_job_to_dict(job)
+    }), 202
+
+
+# ===================================================
+# Прогресс перепроверки
+# ===================================================
+@teacher_bp.route("/<int:teacher_id>/regrade/<int:job_id>", methods=["GET"])
+@role_required("teacher")
+def regrade_status(current_teacher_id, teacher_id, job_id):
+    if current_teacher_id != teacher_id:
+        return jsonify({"message": "Forbidden"}), 403
+
+    job = RegradeJob.query.filter_by(id=job_id, teacher_id=teacher_id).first()
+    if not job:
+        return jsonify({"message": "Job not found"}), 404
+
+    return jsonify(regrade_job_to_dict(job)), 200
+
+
 # ===================================================
 # AI: сгенерировать задание
 # ===================================================
+GENERATE_TASK_PROMPT = (
+    "Сен информатика мұғалімісің. Python бойынша тапсырмалар құр. "
+    "JSON форматында жауап бер: "
+    "{title, description, difficulty, complexity, example_code, hints, ai_analysis, "
+    "test_cases: [{input, expected_output}]}"
+)
+
+
+def _generate_request(prompt):
+    return dict(
+        model="gpt-4o-mini",
+        messages=[
+            {"role": "system", "content": GENERATE_TASK_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        temperature=0.7,
+    )
+
+
+def _cache_args(prompt):
+    return dict(
+        model="gpt-4o-mini",
+        system_prompt=GENERATE_TASK_PROMPT,
+        content=prompt,
+        temperature=0.7,
+    )
+
+
+def parse_generated_task(raw):
+    raw = raw.strip()
+
+    # Чистим от ```json
+    if raw.startswith("```"):
+        raw = raw.split("```")[-2].replace("json", "").strip()
+
+    try:
+        parsed = json.loads(raw)
+    except Exception:
+        parsed = {
+            "title": "AI Generated Task",
+            "description": raw,
+            "difficulty": "орташа",
+            "complexity": "орташа",
+            "example_code": "",
+            "hints": [],
+            "ai_analysis": "Failed to parse JSON",
+        }
+    return parsed
+
+
+def save_generated_task(teacher_id, parsed):
+    """Создать и назначить классу задачу из ответа модели (общая для обычного и SSE-пути)."""
+    hints = parsed.get("hints")
+    if isinstance(hints, list):
+        hints = "\n".join(hints)
+
+    test_cases = parse_test_cases(parsed.get("test_cases"))
+
+    task = Task(
+        teacher_id=teacher_id,
+        title=parsed.get("title"),
+        description=parsed.get("description"),
+        difficulty=parsed.get("difficulty"),
+        complexity=parsed.get("complexity"),
+        xp_reward=100,
+        example_code=parsed.get("example_code"),
+        hints=hints,
+        ai_analysis=parsed.get("ai_analysis"),
+        test_cases=json.dumps(test_cases, ensure_ascii=False) if test_cases else None,
+    )
+
+    db.session.add(task)
+    db.session.flush()
+
+    # Назначаем всему классу (в той же транзакции, что и задача)
+    assign_to_cohort(task)
+    stats.task_created(task)
+    db.session.commit()
+
+    return {
+        "message": "AI тапсырмасы құрылды",
+        "task": {"id": task.id, "title": task.title}
+    }
+
+
 @teacher_bp.route("/<int:teacher_id>/tasks/generate", methods=["POST"])
-@token_required
+@role_required("teacher")
 def generate_ai_task(current_teacher_id, teacher_id):
     if current_teacher_id != teacher_id:
         return jsonify({"message": "Forbidden"}), 403
 
     data = request.get_json() or {}
     prompt = data.get("prompt")
+    difficulty = data.get("difficulty")
 
     if not prompt:
         return jsonify({"message": "Prompt is required"}), 400
 
+    def create():
+        return current_app.extensions["llm"].complete("teacher-generate", **_generate_request(prompt))
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "Сен информатика мұғалімісің. Python бойынша тапсырмалар құр. "
-                        "JSON форматында жауап бер: "
-                        "{title, description, difficulty, complexity, example_code, hints, ai_analysis}"
-                    )
-                },
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
+        # Сначала готовая задача из банка (мгновенно); пустой банк — обычный вызов модели
+        parsed = current_app.extensions["task_bank"].take(prompt, difficulty)
+        if parsed is not None:
+            return jsonify({**save_generated_task(teacher_id, parsed), "source": "bank"}), 200
+
+        raw = current_app.extensions["ai_cache"].completion(
+            "teacher-generate", create, **_cache_args(prompt)
         )
+        return jsonify({**save_generated_task(teacher_id, parse_generated_task(raw)), "source": "llm"}), 200
 
-        raw = response.choices[0].message.content.strip()
+    except Exception as e:
+        print("AI ERROR:", e)
+        return jsonify({"error": str(e)}), 500
 
-        # Чистим от ```json
-        if raw.startswith("```"):
-            raw = raw.split("```")[-2].replace("json", "").strip()
 
-        try:
-            parsed = json.loads(raw)
-        except Exception:
-            parsed = {
-                "title": "AI Generated Task",
-                "description": raw,
-                "difficulty": "орташа",
-                "complexity": "орташа",
-                "example_code": "",
-                "hints": [],
-                "ai_analysis": "Failed to parse JSON",
-            }
+# ===================================================
+# Банк заранее сгенерированных задач
+# ===================================================
+@teacher_bp.route("/<int:teacher_id>/task-bank", methods=["GET"])
+@role_required("teacher")
+def task_bank_status(current_teacher_id, teacher_id):
+    if current_teacher_id != teacher_id:
+        return jsonify({"message": "Forbidden"}), 403
 
-        hints = parsed.get("hints")
-        if isinstance(hints, list):
-            hints = "\n".join(hints)
+    bank = current_app.extensions["task_bank"]
+    return jsonify({"topics": bank.levels(), "stats": bank.stats()}), 200
 
-        task = Task(
-            teacher_id=teacher_id,
-            title=parsed.get("title"),
-            description=parsed.get("description"),
-            difficulty=parsed.get("difficulty"),
-            complexity=parsed.get("complexity"),
-            xp_reward=100,
-            example_code=parsed.get("example_code"),
-            hints=hints,
-            ai_analysis=parsed.get("ai_analysis"),
-        )
 
-        db.session.add(task)
-        db.session.commit()
+# Прогрев темы перед уроком: банк пополнится в фоне
+@teacher_bp.route("/<int:teacher_id>/task-bank/refill", methods=["POST"])
+@role_required("teacher")
+def task_bank_refill(current_teacher_id, teacher_id):
+    if current_teacher_id != teacher_id:
+        return jsonify({"message": "Forbidden"}), 403
 
-        # Назначаем всем студентам
-        students = Student.query.filter_by(teacher_id=teacher_id).all()
-        for s in students:
-            db.session.add(TaskAssignment(student_id=s.id, task_id=task.id))
+    data = request.get_json() or {}
+    if not data.get("prompt"):
+        return jsonify({"message": "Prompt is required"}), 400
 
-        db.session.commit()
+    bank = current_app.extensions["task_bank"]
+    if not bank.enabled:
+        return jsonify({"message": "Task bank is disabled"}), 409
 
-        return jsonify({
-            "message": "AI тапсырмасы құрылды",
-            "task": {"id": task.id, "title": task.title}
-        }), 200
+    topic, difficulty = bank_key(data["prompt"], data.get("difficulty"))
+    bank.request_refill(topic, difficulty)
+    return jsonify({"topic": topic, "difficulty": difficulty, "stock": bank.stock(topic, difficulty)}), 202
 
-    except Exception as e:
-        print("AI ERROR:", e)
-        return jsonify({"error": str(e)}), 500
+
+# SSE: token (кусок текста) ... / task (черновик задачи, как только JSON закрыт)
+# → done (тот же ответ, что у /tasks/generate; задача уже сохранена) | error
+@teacher_bp.route("/<int:teacher_id>/tasks/generate/stream", methods=["POST"])
+@role_required("teacher")
+def generate_ai_task_stream(current_teacher_id, teacher_id):
+    if current_teacher_id != teacher_id:
+        return jsonify({"message": "Forbidden"}), 403
+
+    data = request.get_json() or {}
+    prompt = data.get("prompt")
+
+    if not prompt:
+        return jsonify({"message": "Prompt is required"}), 400
+
+    def create_stream():
+        return current_app.extensions["llm"].stream("teacher-generate", **_generate_request(prompt))
+
+    def events():
+        parser = JSONObjectStream()
+        parts = []
+        try:
+            for delta in current_app.extensions["ai_cache"].stream(
+                "teacher-generate", create_stream, **_cache_args(prompt)
+            ):
+                parts.append(delta)
+                yield sse("token", {"text": delta})
+                for draft in parser.feed(delta):
+                    yield sse("task", draft)
+
+            # Сохраняем по полному тексту — так же, как обычный эндпоинт
+            yield sse("done", save_generated_task(teacher_id, parse_generated_task("".join(parts))))
+
+        except Exception as e:
+            print("AI ERROR:", e)
+            yield sse("error", {"error": str(e)})
+
+    return sse_response(events())
 
 
 # ===================================================
 # Получить студентов учителя
 # ===================================================
 @teacher_bp.route("/<int:teacher_id>/students", methods=["GET"])
-@token_required
+@role_required("teacher")
 def get_students(current_teacher_id, teacher_id):
     if current_teacher_id != teacher_id:
         return jsonify({"message": "Forbidden"}), 403
 
-    students = Student.query.filter_by(teacher_id=teacher_id).all()
-    result = []
-
-    for s in students:
-        # Attendance
-        all_days = Attendance.query.filter_by(student_id=s.id).count()
-        present_days = Attendance.query.filter_by(student_id=s.id, is_present=True).count()
-        attendance_percent = round((present_days / all_days) * 100, 2) if all_days else 0
-
-        subs = StudentSubmission.query.filter_by(student_id=s.id).all()
-        task_points = sum(100 if sub.is_correct else 0 for sub in subs)
+    # Счётчики берём из student_stats (поддерживаются инкрементально)
+    attendance_percent = case(
+        (
+            StudentStats.attendance_days > 0,
+            func.round(
+                cast(StudentStats.present_days * 100.0 / StudentStats.attendance_days, db.Numeric), 2
+            ),
+        ),
+        else_=0,
+    )
+    task_points = func.coalesce(StudentStats.correct_submissions, 0) * 100
+    rating = case(
+        (
+            StudentStats.total_submissions > 0,
+            func.round(cast(0.4 * attendance_percent + 0.6 * (task_points / 10.0), db.Numeric), 2),
+        ),
+        else_=0,
+    )
 
-        rating = round(0.4 * attendance_percent + 0.6 * (task_points / 10), 2) if subs else 0
+    query = (
+        db.session.query(
+            Student,
+            StudentStats.student_id,
+            attendance_percent.label("attendance"),
+            task_points.label("task_points"),
+            rating.label("rating"),
+        )
+        .outerjoin(StudentStats, StudentStats.student_id == Student.id)
+        .filter(Student.teacher_id == teacher_id)
+        .order_by(Student.id)
+    )
+    rows = query.all()
+
+    # Студент без строки статистики (старые данные / дрейф) показал бы нули —
+    # досчитываем недостающих и их учителя, как teacher_stats
+    missing = [s.id for s, stats_id, *_ in rows if stats_id is None]
+    if missing:
+        for sid in missing:
+            stats.rebuild_student(sid)
+        stats.rebuild_teacher(teacher_id)
+        db.session.commit()
+        rows = query.all()
 
-        result.append({
+    return jsonify([
+        {
             "id": s.id,
             "first_name": s.first_name,
             "last_name": s.last_name,
             "email": s.email,
-            "attendance": attendance_percent,
-            "taskPoints": task_points,
-            "rating": rating,
+            "attendance": float(att) if att else 0,
+            "taskPoints": int(points),
+            "rating": float(r) if r else 0,
             "total_xp": s.total_xp,
             "current_level": s.current_level,
             "streak": s.streak,
-        })
+        }
+        for s, _, att, points, r in rows
+    ]), 200
+
+
+# ===================================================
+# Похожие решения (возможное списывание)
+# ===================================================
+# ?task_id= — одна задача (иначе все задачи учителя), ?threshold=0.3..1, ?limit=
+@teacher_bp.route("/<int:teacher_id>/plagiarism", methods=["GET"])
+@role_required("teacher")
+def plagiarism(current_teacher_id, teacher_id):
+    if current_teacher_id != teacher_id:
+        return jsonify({"message": "Forbidden"}), 403
+
+    threshold = request.args.get("threshold", similarity.DEFAULT_THRESHOLD, type=float)
+    if threshold is None or not 0.3 <= threshold <= 1:
+        return jsonify({"message": "threshold must be between 0.3 and 1"}), 400
+    limit = min(max(request.args.get("limit", 50, type=int) or 50, 1), 500)
+
+    tasks = Task.query.with_entities(Task.id).filter_by(teacher_id=teacher_id)
+    task_id = request.args.get("task_id", type=int)
+    if task_id is not None:
+        tasks = tasks.filter_by(id=task_id)
+    task_ids = [tid for (tid,) in tasks]
+    if task_id is not None and not task_ids:
+        return jsonify({"message": "Task not found"}), 404
+
+    pairs = [
+        pair
+        for tid in task_ids
+        for pair in similarity.suspicious_pairs(tid, threshold, limit)
+    ]
+    pairs.sort(key=lambda p: (-p["similarity"], p["task_id"]))
+    return jsonify(pairs[:limit]), 200
+
+
+# ===================================================
+# Рейтинг класса по XP (?scope=global — по всей школе)
+# ===================================================
+@teacher_bp.route("/<int:teacher_id>/leaderboard", methods=["GET"])
+@role_required("teacher")
+def class_leaderboard(current_teacher_id, teacher_id):
+    if current_teacher_id != teacher_id:
+        return jsonify({"message": "Forbidden"}), 403
+
+    scope = request.args.get("scope", "class")
+    if scope not in ("class", "global"):
+        return jsonify({"message": "scope must be 'class' or 'global'"}), 400
+
+    board = current_app.extensions["leaderboard"]
+    limit = request.args.get("limit", DEFAULT_LIMIT, type=int)
+    return jsonify({
+        "scope": scope,
+        "top": top_entries(board, limit, teacher_id if scope == "class" else None),
+    }), 200
 
-    return jsonify(result), 200
+
+# ===================================================
+# Посещаемость: отметить весь класс за день
+# ===================================================
+# {"date": "YYYY-MM-DD", "present": [id, ...], "absent": [id, ...]};
+# без "absent" все остальные студенты класса отмечаются отсутствующими
+@teacher_bp.route("/<int:teacher_id>/attendance", methods=["POST"])
+@role_required("teacher")
+def mark_attendance(current_teacher_id, teacher_id):
+    if current_teacher_id != teacher_id:
+        return jsonify({"message": "Forbidden"}), 403
+
+    data = request.get_json() or {}
+    try:
+        day = attendance.parse_day(data.get("date"))
+        present = {int(sid) for sid in data.get("present") or []}
+        absent = None if data.get("absent") is None else {int(sid) for sid in data["absent"]}
+    except (TypeError, ValueError):
+        return jsonify({"message": "Invalid date or student ids"}), 400
+
+    class_ids = set(
+        db.session.execute(db.select(Student.id).where(Student.teacher_id == teacher_id)).scalars()
+    )
+    if absent is None:
+        absent = class_ids - present
+    if present & absent:
+        return jsonify({"message": "Student marked both present and absent"}), 400
+    unknown = (present | absent) - class_ids
+    if unknown:
+        return jsonify({"message": f"Students not in class: {sorted(unknown)}"}), 400
+
+    marks = {sid: True for sid in present}
+    marks.update({sid: False for sid in absent})
+    previous = attendance.mark_day(day, marks)
+    db.session.commit()
+
+    return jsonify({
+        "date": day.isoformat(),
+        "present": len(present),
+        "absent": len(absent),
+        "changed": sum(1 for sid, p in marks.items() if previous[sid] != p),
+    }), 200
+
+
+# Журнал за месяц (?month=YYYY-MM): по студенту — дни месяца и процент
+@teacher_bp.route("/<int:teacher_id>/attendance", methods=["GET"])
+@role_required("teacher")
+def class_attendance(current_teacher_id, teacher_id):
+    if current_teacher_id != teacher_id:
+        return jsonify({"message": "Forbidden"}), 403
+
+    try:
+        month = attendance.parse_month(request.args.get("month"))
+    except ValueError:
+        return jsonify({"message": "month must be YYYY-MM"}), 400
+
+    students = db.session.execute(
+        db.select(Student.id, Student.first_name, Student.last_name)
+        .where(Student.teacher_id == teacher_id)
+        .order_by(Student.id)
+    ).all()
+    bitmaps = attendance.months([s.id for s in students], month, month)
+
+    return jsonify([
+        {
+            "student_id": s.id,
+            "first_name": s.first_name,
+            "last_name": s.last_name,
+            **attendance.month_summary(month, *bitmaps.get(s.id, {}).get(month, (0, 0))),
+        }
+        for s in students
+    ]), 200
 
 
 # ===================================================
 # Добавить студента
 # ===================================================
 @teacher_bp.route("/<int:teacher_id>/students", methods=["POST"])
-@token_required
+@role_required("teacher")
 def add_student(current_teacher_id, teacher_id):
     if current_teacher_id != teacher_id:
         return jsonify({"message": "Forbidden"}), 403
@@ -266,19 +596,22 @@ def add_student(current_teacher_id, teacher_id):
     if not first_name or not last_name or not email:
         return jsonify({"message": "Missing required fields"}), 400
 
+    password_hash = current_app.extensions["password_hasher"].hash(password)
+
     try:
         new_student = Student(
             teacher_id=teacher_id,
             first_name=first_name,
             last_name=last_name,
             email=email,
-            password=password,  # REQUIRED
+            password_hash=password_hash,
             total_xp=0,
             current_level=1,
             streak=0
         )
 
         db.session.add(new_student)
+        stats.student_created(new_student)
         db.session.commit()
 
         return jsonify({
@@ -300,7 +633,7 @@ def add_student(current_teacher_id, teacher_id):
 # Удалить студента
 # ===================================================
 @teacher_bp.route("/<int:teacher_id>/students/<int:student_id>", methods=["DELETE"])
-@token_required
+@role_required("teacher")
 def delete_student(current_teacher_id, teacher_id, student_id):
     if current_teacher_id != teacher_id:
         return jsonify({"message": "Forbidden"}), 403
@@ -309,7 +642,10 @@ def delete_student(current_teacher_id, teacher_id, student_id):
     if not student:
         return jsonify({"message": "Student not found"}), 404
 
+    stats.student_deleted(student)
+    code_hashes = code_store.hashes_of(StudentSubmission.student_id == student.id)
     db.session.delete(student)
+    code_store.release(code_hashes)
     db.session.commit()
 
     return jsonify({"message": "Студент удалён"}), 200
@@ -319,7 +655,7 @@ def delete_student(current_teacher_id, teacher_id, student_id):
 # Обновить студента
 # ===================================================
 @teacher_bp.route("/<int:teacher_id>/students/<int:student_id>", methods=["PUT"])
-@token_required
+@role_required("teacher")
 def update_student(current_teacher_id, teacher_id, student_id):
     if current_teacher_id != teacher_id:
         return jsonify({"message": "Forbidden"}), 403
@@ -333,6 +669,7 @@ def update_student(current_teacher_id, teacher_id, student_id):
     student.first_name = data.get("first_name", student.first_name)
     student.last_name = data.get("last_name", student.last_name)
     student.email = data.get("email", student.email)
+    http_cache.bump([http_cache.student_key(student.id)])
 
     db.session.commit()
 
@@ -340,40 +677,49 @@ def update_student(current_teacher_id, teacher_id, student_id):
 
 
 # ===================================================
-# Главная статистика учителя
+# Экспорт журнала (CSV / NDJSON, потоково)
 # ===================================================
-@teacher_bp.route("/<int:teacher_id>/stats", methods=["GET"])
-@token_required
-def teacher_stats(current_teacher_id, teacher_id):
+@teacher_bp.route("/<int:teacher_id>/export/<dataset>", methods=["GET"])
+@role_required("teacher")
+def export_gradebook(current_teacher_id, teacher_id, dataset):
     if current_teacher_id != teacher_id:
         return jsonify({"message": "Forbidden"}), 403
 
-    total_students = Student.query.filter_by(teacher_id=teacher_id).count()
+    fmt = request.args.get("format", "csv")
+    if dataset not in DATASETS or fmt not in FORMATS:
+        return jsonify({"message": "Unknown dataset or format"}), 400
 
-    active_students = (
-        db.session.query(Attendance.student_id)
-        .join(Student, Student.id == Attendance.student_id)
-        .filter(Student.teacher_id == teacher_id, Attendance.is_present == True)
-        .distinct()
-        .count()
+    return export_response(
+        dataset, fmt,
+        teacher_id=teacher_id,
+        include_code=request.args.get("include_code") == "1",
     )
 
-    subs = (
-        db.session.query(StudentSubmission)
-        .join(Student, StudentSubmission.student_id == Student.id)
-        .filter(Student.teacher_id == teacher_id)
-        .all()
-    )
 
-    total_subs = len(subs)
-    correct_subs = len([s for s in subs if s.is_correct])
-    avg_success = round((correct_subs / total_subs) * 100, 2) if total_subs else 0
+# ===================================================
+# Главная статистика учителя
+# ===================================================
+@teacher_bp.route("/<int:teacher_id>/stats", methods=["GET"])
+@role_required("teacher")
+@http_cache.conditional(lambda current_teacher_id, teacher_id: (
+    [http_cache.teacher_key(teacher_id)] if current_teacher_id == teacher_id else None
+))
+def teacher_stats(current_teacher_id, teacher_id):
+    if current_teacher_id != teacher_id:
+        return jsonify({"message": "Forbidden"}), 403
 
-    new_tasks = Task.query.filter_by(teacher_id=teacher_id).count()
+    row = db.session.get(TeacherStats, teacher_id)
+    if row is None:
+        row = stats.rebuild_teacher(teacher_id)
+        db.session.commit()
+
+    total_subs = row.total_submissions if row else 0
+    correct_subs = row.correct_submissions if row else 0
+    avg_success = round((correct_subs / total_subs) * 100, 2) if total_subs else 0
 
     return jsonify({
-        "total_students": total_students,
-        "active_students": active_students,
+        "total_students": row.students if row else 0,
+        "active_students": row.active_students if row else 0,
         "avg_success": avg_success,
-        "new_tasks": new_tasks
+        "new_tasks": row.tasks if row else 0
     }), 200
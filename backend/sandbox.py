@@ -0,0 +1,238 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Маркер, после которого раннер печатает JSON с результатами
+RESULT_MARKER = "\x00__SANDBOX_RESULT__"
+
+# Сколько символов вывода храним на один тест
+MAX_OUTPUT_CHARS = 10000
+
+
+# ------------------------------------
+# Раннер (выполняется в отдельном интерпретаторе)
+# ------------------------------------
+# Лимиты выставляются и как soft, и как hard — код студента не может их поднять.
+# Audit hook запрещает сеть, запуск процессов, ctypes и запись файлов.
+RUNNER = r'''
+import io, json, os, resource, sys
+
+payload = json.loads(sys.stdin.read())
+limits = payload["limits"]
+
+cpu = limits["cpu_seconds"]
+mem = limits["memory_mb"] * 1024 * 1024
+resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))
+resource.setrlimit(resource.RLIMIT_AS, (mem, mem))
+resource.setrlimit(resource.RLIMIT_FSIZE, (0, 0))
+resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+
+real_stdout = sys.stdout
+marker = payload["marker"]
+max_output = payload["max_output"]
+
+try:
+    code = compile(payload["code"], "<submission>", "exec")
+except SyntaxError as e:
+    real_stdout.write(marker + json.dumps({"compile_error": f"{e.msg} (line {e.lineno})"}))
+    sys.exit(0)
+
+DENIED = ("socket.", "subprocess.", "os.system", "os.exec", "os.posix_spawn",
+          "os.spawn", "os.fork", "os.forkpty", "os.kill", "os.remove", "os.rename",
+          "os.rmdir", "os.unlink", "os.chmod", "os.chown", "shutil.", "ctypes.",
+          "urllib.", "http.", "ftplib.", "smtplib.", "webbrowser.")
+WRITE_FLAGS = os.O_WRONLY | os.O_RDWR | os.O_CREAT | os.O_APPEND | os.O_TRUNC
+
+def guard(event, args):
+    if event.startswith(DENIED):
+        raise PermissionError(f"{event} is not allowed")
+    if event == "open":
+        mode, flags = args[1], args[2]
+        if (isinstance(mode, str) and any(m in mode for m in "wax+")) or (flags or 0) & WRITE_FLAGS:
+            raise PermissionError("writing files is not allowed")
+
+sys.addaudithook(guard)
+
+results = []
+for stdin in payload["inputs"]:
+    out = io.StringIO()
+    sys.stdin = io.StringIO(stdin)
+    sys.stdout = out
+    status, error = "ok", None
+    try:
+        exec(code, {"__name__": "__main__", "__builtins__": __builtins__})
+    except SystemExit:
+        pass
+    except MemoryError:
+        status, error = "memory", "MemoryError"
+    except BaseException as e:
+        status, error = "error", f"{type(e).__name__}: {e}"
+    finally:
+        sys.stdout = real_stdout
+    results.append({"status": status, "output": out.getvalue()[:max_output], "error": error})
+
+real_stdout.write(marker + json.dumps({"results": results}))
+'''
+
+
+# ------------------------------------
+# Тест-кейсы
+# ------------------------------------
+def parse_test_cases(value):
+    """JSON-строка или список → [{"input": str, "expected_output": str}, ...]."""
+    if not value:
+        return []
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return []
+    if not isinstance(value, list):
+        return []
+
+    cases = []
+    for case in value:
+        if not isinstance(case, dict) or "expected_output" not in case:
+            continue
+        cases.append({
+            "input": str(case.get("input") or ""),
+            "expected_output": str(case["expected_output"]),
+        })
+    return cases
+
+
+def normalize_output(text):
+    lines = [line.rstrip() for line in text.replace("\r\n", "\n").split("\n")]
+    while lines and not lines[-1]:
+        lines.pop()
+    return "\n".join(lines)
+
+
+# ------------------------------------
+# Движок выполнения
+# ------------------------------------
+class SandboxEngine:
+    """Прогоняет решение по тест-кейсам в изолированных интерпретаторах.
+
+    Каждое решение выполняется в свежем процессе `python -I` с лимитами
+    CPU / памяти / времени; одновременно работает не больше `workers`
+    процессов, так что нагрузка масштабируется по ядрам.
+    """
+
+    def __init__(self, workers=None, cpu_seconds=2, memory_mb=256, wall_seconds=5):
+        self.workers = workers or os.cpu_count() or 2
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.wall_seconds = wall_seconds
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sandbox")
+
+    def submit(self, code, test_cases):
+        return self._pool.submit(self.run, code, test_cases)
+
+    def run(self, code, test_cases):
+        inputs = [case["input"] for case in test_cases]
+        report = self._execute(code, inputs)
+
+        cases = []
+        for i, case in enumerate(test_cases):
+            result = report["results"][i] if i < len(report["results"]) else {
+                "status": report.get("status", "error"), "output": "", "error": report.get("error"),
+            }
+            passed = (
+                result["status"] == "ok"
+                and normalize_output(result["output"]) == normalize_output(case["expected_output"])
+            )
+            cases.append({
+                "passed": passed,
+                "status": result["status"],
+                "input": case["input"],
+                "expected_output": case["expected_output"],
+                "output": result["output"],
+                "error": result["error"],
+            })
+
+        return {
+            "passed": sum(1 for c in cases if c["passed"]),
+            "total": len(cases),
+            "compile_error": report.get("compile_error"),
+            "cases": cases,
+        }
+
+    def _execute(self, code, inputs):
+        payload = json.dumps({
+            "code": code,
+            "inputs": inputs,
+            "marker": RESULT_MARKER,
+            "max_output": MAX_OUTPUT_CHARS,
+            "limits": {"cpu_seconds": self.cpu_seconds, "memory_mb": self.memory_mb},
+        })
+
+        with tempfile.TemporaryDirectory(prefix="sandbox-") as workdir:
+            try:
+                proc = subprocess.run(
+                    [sys.executable, "-I", "-S", "-c", RUNNER],
+                    input=payload,
+                    capture_output=True,
+                    text=True,
+                    cwd=workdir,
+                    env={},
+                    timeout=self.wall_seconds,
+                    start_new_session=True,
+                )
+            except subprocess.TimeoutExpired:
+                return {"results": [], "status": "timeout", "error": "Time limit exceeded"}
+
+        _, sep, tail = proc.stdout.rpartition(RESULT_MARKER)
+        if not sep:
+            # Процесс убит лимитом (SIGXCPU / SIGKILL) или упал до отчёта
+            if proc.returncode in (-24, -9):
+                return {"results": [], "status": "timeout", "error": "CPU time limit exceeded"}
+            return {"results": [], "status": "error", "error": proc.stderr.strip()[-500:] or "Runtime error"}
+
+        try:
+            report = json.loads(tail)
+        except ValueError:
+            return {"results": [], "status": "error", "error": "Corrupted sandbox output"}
+
+        report.setdefault("results", [])
+        if report.get("compile_error"):
+            report["status"] = "error"
+            report["error"] = f"SyntaxError: {report['compile_error']}"
+        return report
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+
+def summarize(report):
+    """Короткий текстовый отчёт для поля feedback."""
+    if report["compile_error"]:
+        return f"Tests: 0/{report['total']} passed. SyntaxError: {report['compile_error']}"
+
+    lines = [f"Tests: {report['passed']}/{report['total']} passed."]
+    for i, case in enumerate(report["cases"], start=1):
+        if case["passed"]:
+            continue
+        if case["status"] != "ok":
+            lines.append(f"Test {i}: {case['error']}")
+        else:
+            lines.append(
+                f"Test {i}: expected {case['expected_output']!r}, got {case['output'].rstrip()!r}"
+            )
+    return "\n".join(lines)
+
+
+def init_sandbox(app):
+    engine = SandboxEngine(
+        workers=app.config.get("SANDBOX_WORKERS"),
+        cpu_seconds=app.config.get("SANDBOX_CPU_SECONDS", 2),
+        memory_mb=app.config.get("SANDBOX_MEMORY_MB", 256),
+        wall_seconds=app.config.get("SANDBOX_WALL_SECONDS", 5),
+    )
+    app.extensions["sandbox"] = engine
+    return engine
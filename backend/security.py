@@ -0,0 +1,140 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import jwt
+from flask import current_app, g, jsonify, request
+
+from extensions import db
+from models import Student, SuperAdmin, Teacher
+
+
+# Один секрет для выдачи и проверки токенов
+SECRET_KEY = os.getenv("JWT_SECRET_KEY") or "SUPER_SECRET_KEY_123"
+
+ROLE_MODELS = {
+    "superadmin": SuperAdmin,
+    "teacher": Teacher,
+    "student": Student,
+}
+
+
+# ------------------------------------
+# Кэш проверенных токенов
+# ------------------------------------
+class TokenCache:
+    """LRU: sha256(токена) → claims. Запись живёт не дольше exp токена.
+
+    Повторные запросы с тем же токеном не проверяют подпись заново;
+    сам токен в памяти не хранится — только его хэш.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token):
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            claims, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return claims
+
+    def put(self, token, claims):
+        key = self.key(token)
+        exp = claims.get("exp")
+        with self._lock:
+            self._entries[key] = (claims, float(exp) if exp is not None else None)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def decode_token(token):
+    """Claims токена (из кэша или после проверки подписи). jwt.InvalidTokenError — если токен плохой."""
+    cache = current_app.extensions["token_cache"]
+    claims = cache.get(token)
+    if claims is None:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+        cache.put(token, claims)
+    return claims
+
+
+# ------------------------------------
+# Текущий пользователь (один раз на запрос)
+# ------------------------------------
+def _authenticate():
+    """before_request: разбирает Authorization в g.claims (или None)."""
+    g.claims = None
+    g.auth_error = "Token is missing"
+
+    auth = request.headers.get("Authorization", "")
+    if not auth.startswith("Bearer "):
+        return
+
+    try:
+        g.claims = decode_token(auth.split(" ", 1)[1].strip())
+        g.auth_error = None
+    except jwt.InvalidTokenError:
+        g.auth_error = "Invalid token"
+
+
+def current_user():
+    """Модель пользователя из токена; загружается при первом обращении за запрос."""
+    if "current_user" not in g:
+        claims = g.get("claims")
+        model = ROLE_MODELS.get(claims.get("role")) if claims else None
+        g.current_user = db.session.get(model, claims.get("user_id")) if model else None
+    return g.current_user
+
+
+def role_required(*roles):
+    """Требует валидный токен с одной из ролей. В обработчик первым аргументом идёт user_id."""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            claims = g.get("claims")
+            if not claims:
+                return jsonify({"message": g.get("auth_error") or "Token is missing"}), 401
+
+            if claims.get("role") not in roles:
+                return jsonify({"message": "Forbidden"}), 403
+
+            return f(claims.get("user_id"), *args, **kwargs)
+
+        return decorated
+    return decorator
+
+
+def init_auth(app):
+    app.extensions["token_cache"] = TokenCache(app.config["AUTH_TOKEN_CACHE_SIZE"])
+    app.before_request(_authenticate)
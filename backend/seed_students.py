@@ -1,11 +1,14 @@
-from werkzeug.security import generate_password_hash
 from app import app, db
-from models import Teacher, Student
+from models import Teacher, Student, XPEvent
+import stats
+import xp_ledger
 
 with app.app_context():
+    hasher = app.extensions["password_hasher"]
     print("🔄 Filling database with demo data...")
 
-    # Чистим таблицы
+    # Чистим таблицы (журнал XP — тоже: id студентов будут выданы заново)
+    db.session.query(XPEvent).delete()
     db.session.query(Student).delete()
     db.session.query(Teacher).delete()
     db.session.commit()
@@ -13,29 +16,39 @@ with app.app_context():
     # Создаём учителя (id станет 1, но потом мы добавим второго)
     teacher1 = Teacher(
         email="old@school.kz",
-        password_hash=generate_password_hash("oldpass123")
+        password_hash=hasher.hash("oldpass123")
     )
     db.session.add(teacher1)
 
     teacher2 = Teacher(
         email="admin@school.kz",
-        password_hash=generate_password_hash("admin123")
+        password_hash=hasher.hash("admin123")
     )
     db.session.add(teacher2)
     db.session.commit()
     print(f"👩‍🏫 Teacher created: {teacher2.email} (id={teacher2.id})")
 
-    # Добавляем студентов для teacher_id=2
-    students = [
-        Student(first_name="Айдана", last_name="Жалғас", email="aidanazh@example.kz", teacher_id=teacher2.id, total_xp=120),
-        Student(first_name="Ернар", last_name="Төлеген", email="ernar.t@example.kz", teacher_id=teacher2.id, total_xp=200),
-        Student(first_name="Мадина", last_name="Әлібек", email="madina.a@example.kz", teacher_id=teacher2.id, total_xp=180),
-        Student(first_name="Данияр", last_name="Қайрат", email="daniyar.q@example.kz", teacher_id=teacher2.id, total_xp=250),
-        Student(first_name="Жансая", last_name="Ораз", email="zhansaya.o@example.kz", teacher_id=teacher2.id, total_xp=300),
+    # Добавляем студентов для teacher_id=2 (пароль по умолчанию, как в add_student)
+    default_password = hasher.hash("123456")
+    seed = [
+        (Student(first_name="Айдана", last_name="Жалғас", email="aidanazh@example.kz", teacher_id=teacher2.id, password_hash=default_password), 120),
+        (Student(first_name="Ернар", last_name="Төлеген", email="ernar.t@example.kz", teacher_id=teacher2.id, password_hash=default_password), 200),
+        (Student(first_name="Мадина", last_name="Әлібек", email="madina.a@example.kz", teacher_id=teacher2.id, password_hash=default_password), 180),
+        (Student(first_name="Данияр", last_name="Қайрат", email="daniyar.q@example.kz", teacher_id=teacher2.id, password_hash=default_password), 250),
+        (Student(first_name="Жансая", last_name="Ораз", email="zhansaya.o@example.kz", teacher_id=teacher2.id, password_hash=default_password), 300),
     ]
+    students = [student for student, _ in seed]
 
     db.session.add_all(students)
+    db.session.flush()
+
+    # Стартовый XP — поправкой в журнале: total_xp / уровень производные и
+    # переживут пересчёт (rebuild_xp.py)
+    xp_ledger.record([xp_ledger.event(student.id, "adjustment", xp) for student, xp in seed])
     db.session.commit()
 
+    # Счётчики дашбордов — заново, старые строки stats относились к удалённым студентам
+    stats.rebuild_all()
+
     print(f"👩‍🎓 Added {len(students)} students for teacher_id={teacher2.id}")
     print("🎉 Database successfully seeded!")
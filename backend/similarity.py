@@ -0,0 +1,227 @@
+import builtins
+import hashlib
+import io
+import keyword
+import random
+import re
+import tokenize
+from array import array
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import aliased
+
+from extensions import db
+from models import CodeFingerprint, SimilarityBucket, Student, StudentSubmission
+
+
+# MinHash на NUM_PERM перестановок, LSH — BANDS полос по ROWS значений.
+# Пара попадает в кандидаты с вероятностью 1 - (1 - s^ROWS)^BANDS:
+# s=0.5 → ~64%, s=0.7 → ~98%, s=0.9 → ~100% (порог ~ (1/BANDS)^(1/ROWS) ≈ 0.5)
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+# Шингл — SHINGLE подряд идущих нормализованных токенов
+SHINGLE = 5
+
+DEFAULT_THRESHOLD = 0.8
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240901)  # фиксированное зерно: подписи сравнимы между процессами
+_PERMS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERM)]
+
+_BUILTINS = set(dir(builtins))
+_FALLBACK_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+# ------------------------------------
+# Нормализация и подпись
+# ------------------------------------
+def _name(token):
+    # Переименование переменных не должно прятать списывание
+    return token if keyword.iskeyword(token) or token in _BUILTINS else "ID"
+
+
+def normalize(code):
+    """Поток токенов без имён, литералов и комментариев (структура решения)."""
+    tokens = []
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(code).readline):
+            if tok.type == tokenize.NAME:
+                tokens.append(_name(tok.string))
+            elif tok.type == tokenize.NUMBER:
+                tokens.append("NUM")
+            elif tok.type == tokenize.STRING:
+                tokens.append("STR")
+            elif tok.type == tokenize.OP:
+                tokens.append(tok.string)
+            elif tok.type in (tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT):
+                tokens.append(tokenize.tok_name[tok.type])
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        # Незаконченный код: грубая токенизация регуляркой
+        tokens = [
+            _name(t) if t[0].isalpha() or t[0] == "_" else ("NUM" if t[0].isdigit() else t)
+            for t in _FALLBACK_TOKEN.findall(code)
+        ]
+    return tokens
+
+
+def shingles(tokens):
+    if len(tokens) <= SHINGLE:
+        return {tuple(tokens)}
+    return {tuple(tokens[i:i + SHINGLE]) for i in range(len(tokens) - SHINGLE + 1)}
+
+
+def _hash64(data):
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+def signature(code):
+    hashes = [_hash64("\x1f".join(s).encode("utf-8")) for s in shingles(normalize(code))]
+    return [min((a * x + b) % _PRIME for x in hashes) for a, b in _PERMS]
+
+
+def band_keys(sig):
+    """Ключ корзины для каждой полосы (signed int64 — влезает в INTEGER SQLite)."""
+    keys = []
+    for band in range(BANDS):
+        chunk = array("Q", sig[band * ROWS:(band + 1) * ROWS]).tobytes()
+        keys.append(int.from_bytes(hashlib.blake2b(chunk, digest_size=8).digest(), "big", signed=True))
+    return keys
+
+
+def similarity(sig_a, sig_b):
+    """Оценка Jaccard по шинглам — доля совпавших минимумов."""
+    return sum(a == b for a, b in zip(sig_a, sig_b)) / NUM_PERM
+
+
+def pack(sig):
+    return array("Q", sig).tobytes()
+
+
+def unpack(data):
+    return array("Q", data).tolist()
+
+
+def bucket_rows(task_id, code_hash, sig):
+    return [
+        {"task_id": task_id, "code_hash": code_hash, "band": band, "key": key}
+        for band, key in enumerate(band_keys(sig))
+    ]
+
+
+# ------------------------------------
+# Индексация (в транзакции вызывающего, commit — снаружи)
+# ------------------------------------
+def index_submission(task_id, code_hash, code):
+    """Подпись кода (один раз на текст) и корзины LSH задачи (один раз на текст в задаче)."""
+    fingerprint = db.session.get(CodeFingerprint, code_hash)
+    if fingerprint is not None:
+        sig = unpack(fingerprint.signature)
+    else:
+        sig = signature(code)
+        db.session.execute(
+            sqlite_insert(CodeFingerprint)
+            .values(code_hash=code_hash, signature=pack(sig))
+            .on_conflict_do_nothing(index_elements=["code_hash"])
+        )
+
+    db.session.execute(
+        sqlite_insert(SimilarityBucket)
+        .on_conflict_do_nothing(index_elements=["task_id", "code_hash", "band"]),
+        bucket_rows(task_id, code_hash, sig),
+    )
+
+
+# ------------------------------------
+# Поиск похожих пар
+# ------------------------------------
+def _candidates(task_id):
+    """Пары разных текстов, совпавшие хотя бы в одной полосе — без перебора всех пар."""
+    a, b = aliased(SimilarityBucket), aliased(SimilarityBucket)
+    return db.session.execute(
+        select(a.code_hash, b.code_hash)
+        .join(b, (b.task_id == a.task_id) & (b.band == a.band) & (b.key == a.key))
+        .where(a.task_id == task_id, a.code_hash < b.code_hash)
+        .distinct()
+    ).all()
+
+
+def suspicious_pairs(task_id, threshold=DEFAULT_THRESHOLD, limit=50):
+    """Пары студентов с похожими решениями задачи, по убыванию похожести.
+
+    Одинаковый код разных студентов — похожесть 1.0 (один code_hash);
+    похожий — оценка MinHash для кандидатов из общих корзин LSH.
+    """
+    pairs = {}
+    candidates = _candidates(task_id)
+    involved = {h for pair in candidates for h in pair}
+    signatures = {
+        code_hash: unpack(sig)
+        for code_hash, sig in db.session.execute(
+            select(CodeFingerprint.code_hash, CodeFingerprint.signature)
+            .where(CodeFingerprint.code_hash.in_(involved))
+        )
+    }
+    for h1, h2 in candidates:
+        if h1 in signatures and h2 in signatures:
+            score = similarity(signatures[h1], signatures[h2])
+            if score >= threshold:
+                pairs[(h1, h2)] = score
+
+    duplicates = set(db.session.execute(
+        select(StudentSubmission.code_hash)
+        .where(StudentSubmission.task_id == task_id)
+        .group_by(StudentSubmission.code_hash)
+        .having(func.count(func.distinct(StudentSubmission.student_id)) > 1)
+    ).scalars())
+    for code_hash in duplicates:
+        pairs[(code_hash, code_hash)] = 1.0
+
+    if not pairs:
+        return []
+
+    hashes = {h for pair in pairs for h in pair}
+    by_hash = {}
+    for submission_id, student_id, code_hash in db.session.execute(
+        select(StudentSubmission.id, StudentSubmission.student_id, StudentSubmission.code_hash)
+        .where(StudentSubmission.task_id == task_id, StudentSubmission.code_hash.in_(hashes))
+        .order_by(StudentSubmission.id)
+    ):
+        by_hash.setdefault(code_hash, []).append((submission_id, student_id))
+
+    # Для пары студентов — самая похожая пара их отправок
+    best = {}
+    for (h1, h2), score in pairs.items():
+        for sub_a, student_a in by_hash.get(h1, []):
+            for sub_b, student_b in by_hash.get(h2, []):
+                if student_a == student_b:
+                    continue
+                if student_a < student_b:
+                    key, value = (student_a, student_b), (score, sub_a, sub_b)
+                else:
+                    key, value = (student_b, student_a), (score, sub_b, sub_a)
+                if key not in best or score > best[key][0]:
+                    best[key] = value
+
+    ranked = sorted(best.items(), key=lambda item: (-item[1][0], item[0]))[:limit]
+    names = {
+        sid: (first, last)
+        for sid, first, last in db.session.execute(
+            select(Student.id, Student.first_name, Student.last_name)
+            .where(Student.id.in_({sid for pair, _ in ranked for sid in pair}))
+        )
+    }
+    return [
+        {
+            "task_id": task_id,
+            "similarity": round(score, 3),
+            "students": [
+                {"id": sid, "first_name": names.get(sid, ("", ""))[0], "last_name": names.get(sid, ("", ""))[1]}
+                for sid in (student_a, student_b)
+            ],
+            "submissions": [sub_a, sub_b],
+        }
+        for (student_a, student_b), (score, sub_a, sub_b) in ranked
+    ]
@@ -0,0 +1,76 @@
+import threading
+
+
+class Cancelled(Exception):
+    """Ведущий вызов прервался, не получив результата (клиент отключился или не дождались)."""
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# ------------------------------------
+# Single-flight (внутри процесса)
+# ------------------------------------
+class SingleFlight:
+    """Одновременные вызовы с одним ключом выполняются один раз.
+
+    Первый вызов («ведущий») выполняет работу, остальные ждут его и
+    получают тот же результат (или то же исключение). Ключ освобождается,
+    как только ведущий закончил, — это дедупликация, а не кэш.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def begin(self, key):
+        """(call, leader). Ведущий обязан вызвать finish(), ведомый — wait()."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    def finish(self, key, call, result=None, error=None):
+        call.result = result
+        call.error = error
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.done.set()
+
+    @staticmethod
+    def wait(call, timeout=None):
+        if not call.done.wait(timeout):
+            raise Cancelled()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key, fn):
+        """(результат, shared): shared=True — результат получен от чужого вызова."""
+        call, leader = self.begin(key)
+        if not leader:
+            return self.wait(call), True
+
+        try:
+            result = fn()
+        except Exception as e:
+            self.finish(key, call, error=e)
+            raise
+        except BaseException:
+            self.finish(key, call, error=Cancelled())
+            raise
+        self.finish(key, call, result=result)
+        return result, False
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
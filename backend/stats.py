@@ -0,0 +1,385 @@
+from sqlalchemy import case, delete, func, insert, select, update
+
+from extensions import db
+import http_cache
+import leaderboard
+from models import (
+    AttendanceMonth,
+    Student,
+    StudentStats,
+    StudentSubmission,
+    Task,
+    Teacher,
+    TeacherStats,
+)
+
+
+# Счётчики студента, которые суммируются в счётчики учителя
+SHARED_COUNTERS = (
+    "attendance_days",
+    "present_days",
+    "total_submissions",
+    "correct_submissions",
+    "xp",
+)
+
+
+# ------------------------------------
+# Применение дельт (в транзакции вызывающего, commit — снаружи)
+# ------------------------------------
+def apply_student_deltas(deltas):
+    """deltas: {student_id: {counter: delta}} — один UPDATE на таблицу.
+
+    Вызывать ПОСЛЕ изменения исходных строк в сессии: если строки
+    статистики ещё нет, она пересчитывается из исходных таблиц.
+    """
+    deltas = {
+        sid: {k: v for k, v in d.items() if v}
+        for sid, d in deltas.items()
+    }
+    deltas = {sid: d for sid, d in deltas.items() if d}
+    if not deltas:
+        return
+
+    leaderboard.mark_dirty(sid for sid, d in deltas.items() if "xp" in d)
+    http_cache.bump(http_cache.student_key(sid) for sid in deltas)
+    db.session.flush()
+
+    current = dict(
+        db.session.query(StudentStats.student_id, StudentStats.present_days)
+        .filter(StudentStats.student_id.in_(deltas))
+        .all()
+    )
+    teacher_of = dict(
+        db.session.query(Student.id, Student.teacher_id)
+        .filter(Student.id.in_(deltas))
+        .all()
+    )
+
+    # Нет строки (старые данные / дрейф) — пересчитываем студента и его учителя целиком
+    for sid in set(deltas) - set(current):
+        rebuild_student(sid)
+        if teacher_of.get(sid):
+            rebuild_teacher(teacher_of[sid])
+        deltas.pop(sid)
+
+    if not deltas:
+        return
+
+    columns = {col for d in deltas.values() for col in d}
+    db.session.execute(
+        update(StudentStats)
+        .where(StudentStats.student_id.in_(deltas))
+        .values({
+            col: getattr(StudentStats, col) + case(
+                {sid: d.get(col, 0) for sid, d in deltas.items()},
+                value=StudentStats.student_id,
+                else_=0,
+            )
+            for col in columns
+        })
+    )
+
+    teacher_deltas = {}
+    for sid, d in deltas.items():
+        tid = teacher_of.get(sid)
+        if not tid:
+            continue
+        td = teacher_deltas.setdefault(tid, {})
+        for col in SHARED_COUNTERS:
+            if d.get(col):
+                td[col] = td.get(col, 0) + d[col]
+
+        # Переход 0 <-> >0 по дням присутствия меняет число активных студентов
+        before = current[sid] or 0
+        after = before + d.get("present_days", 0)
+        if before == 0 and after > 0:
+            td["active_students"] = td.get("active_students", 0) + 1
+        elif before > 0 and after == 0:
+            td["active_students"] = td.get("active_students", 0) - 1
+
+    apply_teacher_deltas(teacher_deltas)
+
+
+def apply_teacher_deltas(deltas):
+    deltas = {
+        tid: {k: v for k, v in d.items() if v}
+        for tid, d in deltas.items()
+    }
+    deltas = {tid: d for tid, d in deltas.items() if d}
+    if not deltas:
+        return
+
+    http_cache.bump(http_cache.teacher_key(tid) for tid in deltas)
+    db.session.flush()
+
+    existing = {
+        tid for (tid,) in
+        db.session.query(TeacherStats.teacher_id)
+        .filter(TeacherStats.teacher_id.in_(deltas))
+        .all()
+    }
+    for tid in set(deltas) - existing:
+        rebuild_teacher(tid)
+        deltas.pop(tid)
+
+    if not deltas:
+        return
+
+    columns = {col for d in deltas.values() for col in d}
+    db.session.execute(
+        update(TeacherStats)
+        .where(TeacherStats.teacher_id.in_(deltas))
+        .values({
+            col: getattr(TeacherStats, col) + case(
+                {tid: d.get(col, 0) for tid, d in deltas.items()},
+                value=TeacherStats.teacher_id,
+                else_=0,
+            )
+            for col in columns
+        })
+    )
+
+
+def _stats_as_teacher_delta(row, sign):
+    delta = {col: sign * (getattr(row, col) or 0) for col in SHARED_COUNTERS}
+    delta["students"] = sign
+    delta["active_students"] = sign if (row.present_days or 0) > 0 else 0
+    return delta
+
+
+# ------------------------------------
+# События предметной области
+# ------------------------------------
+def submission_created(student_id):
+    apply_student_deltas({student_id: {"total_submissions": 1}})
+
+
+def submission_graded(student_id, correct=0, xp=0):
+    apply_student_deltas({student_id: {"correct_submissions": correct, "xp": xp}})
+
+
+def _attendance_delta(present, was_present):
+    if was_present is None:
+        return {"attendance_days": 1, "present_days": 1 if present else 0}
+    return {"present_days": int(bool(present)) - int(bool(was_present))}
+
+
+def attendance_marked(student_id, present, was_present=None):
+    """was_present=None — новая запись посещаемости, иначе — изменение старой."""
+    apply_student_deltas({student_id: _attendance_delta(present, was_present)})
+
+
+def class_attendance_marked(marks):
+    """marks: [(student_id, present, was_present)] — отметка класса одним UPDATE."""
+    apply_student_deltas({
+        sid: _attendance_delta(present, was_present)
+        for sid, present, was_present in marks
+    })
+
+
+def task_created(task):
+    # Назначение — на когорту, поэтому у студентов счётчики не меняются
+    http_cache.bump([http_cache.tasks_key(task.teacher_id)])
+    apply_teacher_deltas({task.teacher_id: {"tasks": 1}})
+
+
+def task_deleted(task):
+    """Вызывать ДО удаления задачи: вычитаем её отправки."""
+    deltas = {}
+
+    for sid, total, correct in (
+        db.session.query(
+            StudentSubmission.student_id,
+            func.count(StudentSubmission.id),
+            func.sum(case((StudentSubmission.is_correct == True, 1), else_=0)),
+        )
+        .filter(StudentSubmission.task_id == task.id)
+        .group_by(StudentSubmission.student_id)
+    ):
+        deltas[sid] = {"total_submissions": -total, "correct_submissions": -(correct or 0)}
+
+    apply_student_deltas(deltas)
+    http_cache.bump([http_cache.tasks_key(task.teacher_id)])
+    apply_teacher_deltas({task.teacher_id: {"tasks": -1}})
+
+
+def student_created(student):
+    db.session.flush()
+    leaderboard.mark_dirty([student.id])
+    http_cache.bump([http_cache.student_key(student.id)])
+    row = rebuild_student(student.id)
+    if student.teacher_id:
+        apply_teacher_deltas({student.teacher_id: _stats_as_teacher_delta(row, +1)})
+
+
+def student_deleted(student):
+    """Вызывать ДО удаления студента (строка статистики удалится каскадом)."""
+    leaderboard.mark_dirty([student.id])
+    http_cache.bump([http_cache.student_key(student.id)])
+    row = db.session.get(StudentStats, student.id)
+    if row is not None and student.teacher_id:
+        apply_teacher_deltas({student.teacher_id: _stats_as_teacher_delta(row, -1)})
+
+
+def student_moved(student, old_teacher_id):
+    db.session.flush()
+    leaderboard.mark_dirty([student.id])
+    http_cache.bump([http_cache.student_key(student.id)])
+    row = db.session.get(StudentStats, student.id) or rebuild_student(student.id)
+    deltas = {}
+    if old_teacher_id:
+        deltas[old_teacher_id] = _stats_as_teacher_delta(row, -1)
+    if student.teacher_id:
+        deltas[student.teacher_id] = _stats_as_teacher_delta(row, +1)
+    apply_teacher_deltas(deltas)
+
+
+# ------------------------------------
+# Полный пересчёт из исходных таблиц
+# ------------------------------------
+def _student_aggregates(conn, student_ids=None):
+    """conn — сессия или соединение (миграции пересчитывают на своём соединении)."""
+    attendance = (
+        select(
+            AttendanceMonth.student_id.label("student_id"),
+            func.sum(AttendanceMonth.marked_days).label("days"),
+            func.sum(AttendanceMonth.present_days).label("present"),
+        )
+        .group_by(AttendanceMonth.student_id)
+        .subquery()
+    )
+    submissions = (
+        select(
+            StudentSubmission.student_id.label("student_id"),
+            func.count(StudentSubmission.id).label("total"),
+            func.sum(case((StudentSubmission.is_correct == True, 1), else_=0)).label("correct"),
+        )
+        .group_by(StudentSubmission.student_id)
+        .subquery()
+    )
+
+    query = (
+        select(
+            Student.id,
+            func.coalesce(attendance.c.days, 0),
+            func.coalesce(attendance.c.present, 0),
+            func.coalesce(submissions.c.total, 0),
+            func.coalesce(submissions.c.correct, 0),
+            func.coalesce(Student.total_xp, 0),
+        )
+        .outerjoin(attendance, attendance.c.student_id == Student.id)
+        .outerjoin(submissions, submissions.c.student_id == Student.id)
+    )
+    if student_ids is not None:
+        query = query.where(Student.id.in_(student_ids))
+
+    return [
+        {
+            "student_id": sid,
+            "attendance_days": days,
+            "present_days": present,
+            "total_submissions": total,
+            "correct_submissions": correct,
+            "xp": xp,
+        }
+        for sid, days, present, total, correct, xp in conn.execute(query)
+    ]
+
+
+def _teacher_aggregates(conn, teacher_ids=None):
+    shared = [func.coalesce(func.sum(getattr(StudentStats, col)), 0) for col in SHARED_COUNTERS]
+    per_students = dict(
+        (row[0], row[1:])
+        for row in conn.execute(
+            select(
+                Student.teacher_id,
+                func.count(Student.id),
+                func.sum(case((StudentStats.present_days > 0, 1), else_=0)),
+                *shared,
+            )
+            .outerjoin(StudentStats, StudentStats.student_id == Student.id)
+            .where(Student.teacher_id.isnot(None))
+            .group_by(Student.teacher_id)
+        )
+    )
+    tasks = dict(
+        conn.execute(select(Task.teacher_id, func.count(Task.id)).group_by(Task.teacher_id)).all()
+    )
+
+    query = select(Teacher.id)
+    if teacher_ids is not None:
+        query = query.where(Teacher.id.in_(teacher_ids))
+
+    rows = []
+    for (tid,) in conn.execute(query):
+        students, active, *counters = per_students.get(tid, (0, 0) + (0,) * len(SHARED_COUNTERS))
+        row = {
+            "teacher_id": tid,
+            "students": students,
+            "active_students": active or 0,
+            "tasks": tasks.get(tid, 0),
+        }
+        row.update(dict(zip(SHARED_COUNTERS, counters)))
+        rows.append(row)
+    return rows
+
+
+def rebuild_student(student_id):
+    http_cache.bump([http_cache.student_key(student_id)])
+    rows = _student_aggregates(db.session, [student_id])
+    row = db.session.get(StudentStats, student_id)
+    if not rows:
+        if row is not None:
+            db.session.delete(row)
+        return None
+
+    if row is None:
+        row = StudentStats(student_id=student_id)
+        db.session.add(row)
+    for col, value in rows[0].items():
+        setattr(row, col, value)
+    db.session.flush()
+    return row
+
+
+def rebuild_teacher(teacher_id):
+    http_cache.bump([http_cache.teacher_key(teacher_id)])
+    rows = _teacher_aggregates(db.session, [teacher_id])
+    row = db.session.get(TeacherStats, teacher_id)
+    if not rows:
+        if row is not None:
+            db.session.delete(row)
+        return None
+
+    if row is None:
+        row = TeacherStats(teacher_id=teacher_id)
+        db.session.add(row)
+    for col, value in rows[0].items():
+        setattr(row, col, value)
+    db.session.flush()
+    return row
+
+
+def recompute(conn):
+    """Строки статистики заново из исходных таблиц (conn — сессия или соединение)."""
+    conn.execute(delete(TeacherStats))
+    conn.execute(delete(StudentStats))
+
+    student_rows = _student_aggregates(conn)
+    if student_rows:
+        conn.execute(insert(StudentStats), student_rows)
+
+    teacher_rows = _teacher_aggregates(conn)
+    if teacher_rows:
+        conn.execute(insert(TeacherStats), teacher_rows)
+    return len(student_rows), len(teacher_rows)
+
+
+def rebuild_all():
+    """Полный пересчёт статистики (лечит дрейф). Возвращает число строк."""
+    http_cache.bump([http_cache.GLOBAL])
+    counts = recompute(db.session)
+    db.session.commit()
+    leaderboard.invalidate()
+    return counts
@@ -0,0 +1,96 @@
+import json
+
+from flask import Response, stream_with_context
+
+
+# ------------------------------------
+# Server-Sent Events
+# ------------------------------------
+def sse(event, data):
+    """Одно SSE-событие; data сериализуется в JSON (одной строкой)."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events):
+    """Потоковый ответ text/event-stream из генератора строк sse(...)."""
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Отключаем буферизацию у reverse-proxy (nginx), иначе токены придут пачкой
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+# ------------------------------------
+# Инкрементальный разбор JSON
+# ------------------------------------
+class JSONObjectStream:
+    """Выделяет законченные JSON-объекты из текста, приходящего кусками.
+
+    Если корень ответа — массив, объектом считается каждый его элемент-объект;
+    если корень — объект, он сам. Текст до первой '[' / '{' (например ```json)
+    пропускается. Разбор учитывает строки и экранирование, поэтому скобки
+    внутри строк не сбивают глубину.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self._current = None
+
+    @property
+    def _base(self):
+        # Глубина, на которой начинаются выдаваемые объекты
+        return 1 if self.root == "[" else 0
+
+    def feed(self, text):
+        """Добавить кусок текста; вернуть список объектов, завершённых в нём."""
+        done = []
+        for ch in text:
+            if self.root is None:
+                if ch not in "[{":
+                    continue
+                self.root = ch
+                if ch == "[":
+                    self.depth = 1
+                    continue
+
+            capturing = self._current is not None
+            if capturing:
+                self._current.append(ch)
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                continue
+
+            if ch == '"':
+                self.in_string = True
+            elif ch in "[{":
+                if ch == "{" and self.depth == self._base and not capturing:
+                    self._current = [ch]
+                self.depth += 1
+            elif ch in "]}":
+                self.depth -= 1
+                if capturing and self.depth == self._base:
+                    obj = self._finish()
+                    if obj is not None:
+                        done.append(obj)
+        return done
+
+    def _finish(self):
+        raw, self._current = "".join(self._current), None
+        try:
+            obj = json.loads(raw)
+        except ValueError:
+            return None
+        return obj if isinstance(obj, dict) else None
@@ -0,0 +1,294 @@
+import json
+import re
+import threading
+
+from sqlalchemy import delete, func, select
+
+from extensions import db
+from models import BankTask
+from sandbox import parse_test_cases
+from streaming import JSONObjectStream
+
+
+MODEL = "gpt-4o-mini"
+
+BANK_PROMPT = (
+    "Сен информатика мұғалімісің. Python бойынша {count} түрлі тапсырма құр. "
+    "Тапсырмалар бір-бірін қайталамасын. "
+    "JSON массив түрінде жауап бер: "
+    "[{{title, description, difficulty, complexity, example_code, hints, ai_analysis, "
+    "test_cases: [{{input, expected_output}}]}}]"
+)
+
+# Задачи с большим сходством условий (Jaccard по словесным 3-граммам) — дубликаты
+DUPLICATE_THRESHOLD = 0.6
+
+
+# ------------------------------------
+# Ключ банка, валидация, дубликаты
+# ------------------------------------
+def bank_key(prompt, difficulty=None):
+    topic = " ".join((prompt or "").lower().split())[:255]
+    return topic, (difficulty or "").strip().lower()[:50]
+
+
+def shingles(task):
+    # Числа не учитываем: «сумма 3 и 5» и «сумма 7 и 2» — одна и та же задача
+    words = re.findall(r"[^\W\d_]+", f"{task.get('title', '')} {task.get('description', '')}".lower())
+    return {" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+
+
+def similarity(a, b):
+    union = a | b
+    return len(a & b) / len(union) if union else 1.0
+
+
+def parse_batch(raw):
+    """Все законченные объекты-задачи из ответа (в т.ч. обрезанного по max_tokens)."""
+    return JSONObjectStream().feed(raw or "")
+
+
+# ------------------------------------
+# Банк заранее сгенерированных задач
+# ------------------------------------
+class TaskBank:
+    """Запас готовых задач по теме/сложности с фоновым пополнением.
+
+    Учитель получает задачу из банка мгновенно; когда запас темы падает
+    ниже low_water, фоновый поток догенерирует её до target пачками по
+    batch_size задач за один вызов модели. Задачи проверяются (эталонное
+    решение проходит свои тест-кейсы в песочнице), почти одинаковые
+    отбрасываются.
+    """
+
+    def __init__(self, app, llm, engine=None, target=10, low_water=3, batch_size=5,
+                 max_calls=3, poll_interval=30.0):
+        self.app = app
+        self.llm = llm
+        self.engine = engine
+        self.target = target
+        self.low_water = low_water
+        self.batch_size = batch_size
+        self.max_calls = max_calls
+        self.poll_interval = poll_interval
+
+        self._pending = set()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.counters = {
+            "served": 0, "empty": 0, "llm_calls": 0,
+            "accepted": 0, "duplicates": 0, "invalid": 0,
+        }
+
+    @property
+    def enabled(self):
+        return self.target > 0
+
+    # ---------- жизненный цикл ----------
+    def start(self):
+        with self._lock:
+            if self._thread or not self.enabled:
+                return
+            self._thread = threading.Thread(target=self._worker, name="task-bank", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+        self._stop.clear()
+
+    def notify(self):
+        self.start()
+        self._wakeup.set()
+
+    # ---------- API для роутов ----------
+    def take(self, prompt, difficulty=None):
+        """Разобранная задача из банка (и удалить её) или None, если запас пуст."""
+        if not self.enabled:
+            return None
+
+        topic, difficulty = bank_key(prompt, difficulty)
+        payload = None
+        while payload is None:
+            row = db.session.execute(
+                select(BankTask.id, BankTask.payload)
+                .where(BankTask.topic == topic, BankTask.difficulty == difficulty)
+                .order_by(BankTask.id)
+                .limit(1)
+            ).first()
+            if row is None:
+                break
+            # Кто удалил строку, тот её и выдаёт (гонка двух учителей за одну задачу)
+            deleted = db.session.execute(delete(BankTask).where(BankTask.id == row.id)).rowcount
+            db.session.commit()
+            if deleted:
+                payload = json.loads(row.payload)
+
+        self._count("served" if payload is not None else "empty")
+        if self.stock(topic, difficulty) < self.low_water:
+            self.request_refill(topic, difficulty)
+        return payload
+
+    def stock(self, topic, difficulty):
+        return db.session.execute(
+            select(func.count(BankTask.id))
+            .where(BankTask.topic == topic, BankTask.difficulty == difficulty)
+        ).scalar()
+
+    def levels(self):
+        rows = db.session.execute(
+            select(BankTask.topic, BankTask.difficulty, func.count(BankTask.id))
+            .group_by(BankTask.topic, BankTask.difficulty)
+            .order_by(BankTask.topic, BankTask.difficulty)
+        ).all()
+        return [{"topic": t, "difficulty": d, "count": n} for t, d, n in rows]
+
+    def request_refill(self, topic, difficulty):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._pending.add((topic, difficulty))
+        self.notify()
+
+    def drain(self):
+        """Синхронно пополнить все запрошенные темы (для тестов/CLI)."""
+        added = 0
+        while True:
+            key = self._next()
+            if key is None:
+                return added
+            added += self.refill(*key)
+
+    def stats(self):
+        with self._lock:
+            return {**self.counters, "pending": len(self._pending)}
+
+    # ---------- пополнение ----------
+    def refill(self, topic, difficulty):
+        """Догенерировать тему до target. Возвращает число добавленных задач."""
+        existing = [
+            json.loads(p) for p in db.session.execute(
+                select(BankTask.payload)
+                .where(BankTask.topic == topic, BankTask.difficulty == difficulty)
+            ).scalars()
+        ]
+        seen = [shingles(t) for t in existing]
+        titles = [t.get("title") for t in existing if t.get("title")]
+
+        added = 0
+        for _ in range(self.max_calls):
+            missing = self.target - len(existing) - added
+            if missing <= 0:
+                break
+
+            count = min(self.batch_size, missing)
+            self._count("llm_calls")
+            raw = self.llm.complete(
+                "task-bank",
+                model=MODEL,
+                messages=[
+                    {"role": "system", "content": BANK_PROMPT.format(count=count)},
+                    {"role": "user", "content": self._request(topic, difficulty, titles)},
+                ],
+                temperature=0.9,
+            )
+
+            accepted = 0
+            for task in parse_batch(raw):
+                if not self._valid(task):
+                    self._count("invalid")
+                    continue
+                task_shingles = shingles(task)
+                if any(similarity(task_shingles, s) >= DUPLICATE_THRESHOLD for s in seen):
+                    self._count("duplicates")
+                    continue
+
+                seen.append(task_shingles)
+                titles.append(task["title"])
+                db.session.add(BankTask(
+                    topic=topic,
+                    difficulty=difficulty,
+                    payload=json.dumps(task, ensure_ascii=False),
+                ))
+                accepted += 1
+            db.session.commit()
+
+            self._count("accepted", accepted)
+            added += accepted
+            # Модель повторяется — не тратим вызовы впустую
+            if accepted == 0:
+                break
+        return added
+
+    @staticmethod
+    def _request(topic, difficulty, titles):
+        parts = [f"Тақырып: {topic}"]
+        if difficulty:
+            parts.append(f"Қиындығы: {difficulty}")
+        if titles:
+            parts.append("Мына тапсырмаларды қайталама: " + "; ".join(titles[-20:]))
+        return "\n".join(parts)
+
+    def _valid(self, task):
+        if not isinstance(task.get("title"), str) or not task["title"].strip():
+            return False
+        if not isinstance(task.get("description"), str) or not task["description"].strip():
+            return False
+
+        code = task.get("example_code") or ""
+        if code:
+            try:
+                compile(code, "<example>", "exec")
+            except (SyntaxError, ValueError):
+                return False
+
+        # Эталонное решение должно проходить собственные тест-кейсы
+        cases = parse_test_cases(task.get("test_cases"))
+        if cases and code and self.engine is not None:
+            report = self.engine.submit(code, cases).result()
+            return report["passed"] == report["total"]
+        return True
+
+    # ---------- воркер ----------
+    def _next(self):
+        with self._lock:
+            return self._pending.pop() if self._pending else None
+
+    def _worker(self):
+        with self.app.app_context():
+            while not self._stop.is_set():
+                key = self._next()
+                if key is not None:
+                    try:
+                        self.refill(*key)
+                    except Exception as e:
+                        print("TASK BANK ERROR:", e)
+                        db.session.rollback()
+                    finally:
+                        db.session.remove()
+                    continue
+
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+
+def init_task_bank(app):
+    bank = TaskBank(
+        app,
+        app.extensions["llm"],
+        engine=app.extensions.get("sandbox"),
+        target=app.config.get("TASK_BANK_TARGET", 10),
+        low_water=app.config.get("TASK_BANK_LOW_WATER", 3),
+        batch_size=app.config.get("TASK_BANK_BATCH", 5),
+    )
+    app.extensions["task_bank"] = bank
+    return bank
@@ -0,0 +1,138 @@
+import re
+
+from sqlalchemy import Column, Integer, MetaData, Table, Text, event, func, literal_column
+from sqlalchemy.orm import load_only
+
+from extensions import db
+from models import Task
+
+
+# ------------------------------------
+# Индекс FTS5 по задачам
+# ------------------------------------
+# External-content таблица: текст хранится только в tasks, индекс — в
+# tasks_fts (rowid = tasks.id). Синхронизацию ведут триггеры SQLite, поэтому
+# в индекс попадает любая задача — созданная вручную, из банка или моделью,
+# а удалённые (в том числе каскадом) из него исчезают.
+SEARCH_COLUMNS = ("title", "description", "hints", "example_code")
+
+# Вес колонок в bm25: совпадение в названии важнее, чем в коде примера
+WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+
+_columns = ", ".join(SEARCH_COLUMNS)
+_new = ", ".join(f"new.{c}" for c in SEARCH_COLUMNS)
+_old = ", ".join(f"old.{c}" for c in SEARCH_COLUMNS)
+
+SCHEMA = (
+    # prefix='2 3' — отдельные индексы префиксов, чтобы «цик*» не перебирал словарь
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+        {_columns},
+        content='tasks', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS tasks_fts_ai AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts(rowid, {_columns}) VALUES (new.id, {_new});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS tasks_fts_ad AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, {_columns}) VALUES ('delete', old.id, {_old});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS tasks_fts_au AFTER UPDATE OF {_columns} ON tasks BEGIN
+        INSERT INTO tasks_fts(tasks_fts, rowid, {_columns}) VALUES ('delete', old.id, {_old});
+        INSERT INTO tasks_fts(rowid, {_columns}) VALUES (new.id, {_new});
+    END""",
+)
+
+# Описание для запросов; в db.metadata не входит — create_all её не трогает
+tasks_fts = Table(
+    "tasks_fts",
+    MetaData(),
+    Column("rowid", Integer, primary_key=True),
+    Column("tasks_fts", Text),
+    *[Column(name, Text) for name in SEARCH_COLUMNS],
+)
+
+
+def install(conn):
+    """Создать индекс и триггеры (идемпотентно)."""
+    for statement in SCHEMA:
+        conn.exec_driver_sql(statement)
+
+
+def rebuild(conn):
+    """Перестроить индекс из tasks целиком."""
+    conn.exec_driver_sql("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')")
+
+
+def _after_create(target, connection, **kw):
+    install(connection)
+
+
+def _before_drop(target, connection, **kw):
+    connection.exec_driver_sql("DROP TABLE IF EXISTS tasks_fts")
+
+
+# ------------------------------------
+# Запрос
+# ------------------------------------
+class SearchError(ValueError):
+    pass
+
+
+_TERM = re.compile(r"(\w+)(\*?)")
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+
+def fts_query(raw):
+    """Строка пользователя → безопасный запрос MATCH.
+
+    Каждое слово берётся в кавычки (операторы FTS5 в тексте ничего не
+    ломают), слова объединяются через AND. «слово*» — поиск по префиксу;
+    последнее слово — всегда префикс, чтобы поиск работал по мере ввода.
+    """
+    terms = _TERM.findall(raw or "")
+    if not terms:
+        raise SearchError("Search query is empty")
+    last = len(terms) - 1
+    return " ".join(
+        f'"{word}"' + ("*" if star or i == last else "")
+        for i, (word, star) in enumerate(terms)
+    )
+
+
+def _values(raw):
+    """'a,b' → ['a', 'b'] для фильтров с несколькими значениями."""
+    return [v.strip() for v in (raw or "").split(",") if v.strip()]
+
+
+def search(teacher_id, raw, difficulty=None, complexity=None, limit=DEFAULT_LIMIT, columns=None):
+    """[(task, score, snippet)] задач учителя по убыванию релевантности (bm25)."""
+    rank = func.bm25(literal_column("tasks_fts"), *WEIGHTS)
+    snippet = func.snippet(literal_column("tasks_fts"), -1, "[", "]", "…", 12)
+
+    query = (
+        db.session.query(Task, rank, snippet)
+        .join(tasks_fts, tasks_fts.c.rowid == Task.id)
+        .filter(
+            tasks_fts.c.tasks_fts.op("MATCH")(fts_query(raw)),
+            Task.teacher_id == teacher_id,
+        )
+    )
+    if columns is not None:
+        query = query.options(load_only(*{c.key: c for c in [*columns, Task.id]}.values()))
+    if _values(difficulty):
+        query = query.filter(Task.difficulty.in_(_values(difficulty)))
+    if _values(complexity):
+        query = query.filter(Task.complexity.in_(_values(complexity)))
+
+    rows = query.order_by(rank, Task.id).limit(min(max(limit, 1), MAX_LIMIT)).all()
+    # bm25 в SQLite отрицательный: чем меньше, тем релевантнее
+    return [(task, round(-score, 4), text) for task, score, text in rows]
+
+
+def init_task_search(app):
+    table = Task.__table__
+    if not event.contains(table, "after_create", _after_create):
+        event.listen(table, "after_create", _after_create)
+        event.listen(table, "before_drop", _before_drop)
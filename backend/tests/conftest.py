@@ -0,0 +1,91 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Приложение создаётся при импорте app.py и читает конфиг из окружения —
+# поэтому окружение задаётся до импорта: временная SQLite, LLM и грейдер без сети
+_tmp = tempfile.mkdtemp()
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'test.db')}"
+os.environ.setdefault("JWT_SECRET_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ["LLM_PROVIDER"] = "fake"
+os.environ["GRADER"] = "fake"
+os.environ["TASK_BANK_TARGET"] = "0"
+# Фоновых воркеров проверки нет: тесты разбирают очередь сами (queue.drain())
+os.environ["GRADING_WORKERS"] = "0"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import app
+    from migrations import upgrade
+
+    with app.app_context():
+        upgrade()
+    yield app
+    app.extensions["grading_queue"].stop()
+    app.extensions["regrade_queue"].stop()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def count_queries(app):
+    """Контекст: число SQL-запросов, выполненных внутри блока."""
+    from contextlib import contextmanager
+
+    from sqlalchemy import event
+
+    from extensions import db
+
+    @contextmanager
+    def counting():
+        counter = {"n": 0}
+
+        def before_cursor_execute(*args, **kwargs):
+            counter["n"] += 1
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield counter
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    return counting
+
+
+@pytest.fixture
+def capture_sql(app):
+    """Контекст: [(statement, parameters)] — SQL, выполненный внутри блока."""
+    from contextlib import contextmanager
+
+    from sqlalchemy import event
+
+    from extensions import db
+
+    @contextmanager
+    def capturing():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            if not executemany:
+                statements.append((statement, parameters))
+
+        with app.app_context():
+            engine = db.engine
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    return capturing
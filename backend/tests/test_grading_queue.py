@@ -0,0 +1,184 @@
+from datetime import datetime, timedelta
+from itertools import count
+
+import pytest
+
+from extensions import db
+from grading import FakeGrader, GradingQueue
+from models import GradingJob, Student, StudentSubmission, Task, Teacher, XPEvent
+from routes.auth import create_token
+from cohorts import assign_to_cohort
+import code_store
+
+_ids = count()
+
+
+class FailingGrader:
+    def __init__(self):
+        self.calls = 0
+
+    def grade(self, task, code):
+        self.calls += 1
+        raise RuntimeError("grader is down")
+
+
+def _student_with_task(app, xp_reward=15):
+    """(student_id, task_id): студент и задача когорты его учителя."""
+    n = next(_ids)
+    with app.app_context():
+        teacher = Teacher(email=f"{n}.queue@school.kz", password_hash="-")
+        db.session.add(teacher)
+        db.session.flush()
+        student = Student(
+            teacher_id=teacher.id,
+            first_name="Queue",
+            last_name=str(n),
+            email=f"{n}.queue.student@school.kz",
+            password_hash="-",
+        )
+        task = Task(teacher_id=teacher.id, title="Sum", description="-", xp_reward=xp_reward)
+        db.session.add_all([student, task])
+        db.session.flush()
+        assign_to_cohort(task)
+        db.session.commit()
+        return student.id, task.id
+
+
+def _queued_job(app, code="print(1)", **job):
+    student_id, task_id = _student_with_task(app)
+    with app.app_context():
+        submission = StudentSubmission(
+            student_id=student_id,
+            task_id=task_id,
+            code_hash=code_store.put(code),
+            is_correct=False,
+            xp_earned=0,
+            submitted_at=datetime.utcnow(),
+        )
+        db.session.add(submission)
+        grading_job = GradingJob(submission=submission, status=job.pop("status", "queued"), **job)
+        db.session.add(grading_job)
+        db.session.commit()
+        return grading_job.id, student_id
+
+
+def _queue(app, grader=None, **options):
+    options.setdefault("workers", 0)
+    options.setdefault("requeue_interval", 0)
+    return GradingQueue(app, grader or FakeGrader(), **options)
+
+
+def _state(app, job_id, student_id):
+    with app.app_context():
+        job = db.session.get(GradingJob, job_id)
+        events = XPEvent.query.filter_by(kind="submission", ref_id=job.submission_id).count()
+        return job.status, job.attempts, db.session.get(Student, student_id).total_xp, events
+
+
+def test_submit_returns_job_and_status_reports_verdict(app, client):
+    student_id, task_id = _student_with_task(app, xp_reward=15)
+    headers = {"Authorization": f"Bearer {create_token(student_id, 'student')}"}
+
+    response = client.post("/api/student/submit", headers=headers, json={"task_id": task_id, "code": "print(1)"})
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+    assert client.get(f"/api/student/grading/{job_id}", headers=headers).get_json()["status"] == "queued"
+
+    with app.app_context():
+        assert app.extensions["grading_queue"].drain() == 1
+
+    body = client.get(f"/api/student/grading/{job_id}", headers=headers).get_json()
+    assert body["status"] == "done"
+    assert body["is_correct"] is True
+    assert body["xp_earned"] == 15
+    assert _state(app, job_id, student_id)[2:] == (15, 1)
+
+
+def test_incorrect_code_is_graded_without_xp(app):
+    job_id, student_id = _queued_job(app, code="print(")
+    with app.app_context():
+        _queue(app).drain()
+
+    with app.app_context():
+        submission = db.session.get(GradingJob, job_id).submission
+        assert submission.is_correct is False
+        assert submission.feedback.startswith("incorrect")
+    assert _state(app, job_id, student_id) == ("done", 1, 0, 1)
+
+
+def test_failing_grader_retries_until_max_attempts(app):
+    job_id, student_id = _queued_job(app)
+    grader = FailingGrader()
+    with app.app_context():
+        processed = _queue(app, grader, max_attempts=3, retry_delay=0).drain()
+
+    assert processed == grader.calls == 3
+    assert _state(app, job_id, student_id) == ("failed", 3, 0, 0)
+    with app.app_context():
+        job = db.session.get(GradingJob, job_id)
+        assert job.error == "grader is down"
+        assert job.finished_at is not None
+
+
+def test_failed_attempt_waits_for_retry_delay(app):
+    job_id, student_id = _queued_job(app)
+    queue = _queue(app, FailingGrader(), max_attempts=3, retry_delay=60)
+    with app.app_context():
+        assert queue.drain() == 1
+        # Пауза не вышла — задание не захватывается
+        assert queue.drain() == 0
+
+        job = db.session.get(GradingJob, job_id)
+        assert job.status == "queued"
+        assert job.available_at > datetime.utcnow() + timedelta(seconds=50)
+
+        job.available_at = datetime.utcnow()
+        db.session.commit()
+        queue.grader = FakeGrader()
+        assert queue.drain() == 1
+    assert _state(app, job_id, student_id) == ("done", 2, 15, 1)
+
+
+def test_expired_lease_is_requeued_and_graded(app):
+    lease = 600
+    stale_id, stale_student = _queued_job(
+        app, status="running", attempts=1, started_at=datetime.utcnow() - timedelta(seconds=2 * lease)
+    )
+    live_id, live_student = _queued_job(
+        app, status="running", attempts=1, started_at=datetime.utcnow()
+    )
+    with app.app_context():
+        _queue(app, lease=lease).drain()
+
+    assert _state(app, stale_id, stale_student) == ("done", 2, 15, 1)
+    # Свежую аренду может держать живой воркер другого процесса
+    assert _state(app, live_id, live_student)[:2] == ("running", 1)
+
+
+@pytest.mark.parametrize("requeue_interval, expected", [(0, "done"), (3600, "running")])
+def test_requeue_of_expired_leases_is_rate_limited(app, requeue_interval, expected):
+    queue = _queue(app, lease=600, requeue_interval=requeue_interval)
+    with app.app_context():
+        queue.drain()  # первая проверка аренд
+
+    job_id, student_id = _queued_job(
+        app, status="running", attempts=1, started_at=datetime.utcnow() - timedelta(hours=1)
+    )
+    with app.app_context():
+        queue.drain()
+    assert _state(app, job_id, student_id)[0] == expected
+
+
+def test_regraded_submission_does_not_award_xp_twice(app):
+    job_id, student_id = _queued_job(app)
+    queue = _queue(app)
+    with app.app_context():
+        queue.drain()
+        # Аренда истекла уже после начисления (процесс упал до записи done)
+        job = db.session.get(GradingJob, job_id)
+        job.status = "running"
+        job.started_at = datetime.utcnow() - timedelta(hours=1)
+        db.session.commit()
+        queue.drain()
+
+    assert _state(app, job_id, student_id) == ("done", 2, 15, 1)
@@ -0,0 +1,179 @@
+from datetime import datetime
+from itertools import count
+
+import pytest
+
+from cohorts import assign_to_cohort
+from extensions import db
+from http_cache import ResponseCache
+from models import Student, Task, Teacher
+from routes.auth import create_token
+import stats
+import xp_ledger
+
+_ids = count()
+
+
+@pytest.fixture
+def school(app):
+    """Учитель с одним студентом и задачей; заголовки авторизации обоих."""
+    n = next(_ids)
+    with app.app_context():
+        teacher = Teacher(email=f"{n}.etag@school.kz", password_hash="-")
+        db.session.add(teacher)
+        db.session.flush()
+        student = Student(teacher_id=teacher.id, first_name="E", last_name=str(n),
+                          email=f"{n}.etag.student@school.kz", password_hash="-")
+        task = Task(teacher_id=teacher.id, title="T", description="-", date_created=datetime.utcnow())
+        db.session.add_all([student, task])
+        db.session.flush()
+        stats.student_created(student)
+        assign_to_cohort(task)
+        stats.task_created(task)
+        db.session.commit()
+        return {
+            "teacher_id": teacher.id,
+            "student_id": student.id,
+            "teacher": {"Authorization": f"Bearer {create_token(teacher.id, 'teacher')}"},
+            "student": {"Authorization": f"Bearer {create_token(student.id, 'student')}"},
+        }
+
+
+def _urls(school):
+    return [
+        ("/api/student/profile", school["student"]),
+        ("/api/student/tasks", school["student"]),
+        (f"/api/teacher/{school['teacher_id']}/tasks", school["teacher"]),
+        (f"/api/teacher/{school['teacher_id']}/stats", school["teacher"]),
+    ]
+
+
+def _etag(client, url, headers):
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    return response.headers["ETag"]
+
+
+def test_matching_etag_returns_304_without_body_queries(client, capture_sql, school):
+    for url, headers in _urls(school):
+        etag = _etag(client, url, headers)
+
+        with capture_sql() as statements:
+            response = client.get(url, headers={**headers, "If-None-Match": etag})
+
+        assert response.status_code == 304, url
+        assert response.get_data() == b""
+        assert response.headers["ETag"] == etag
+        # Только сверка версий (и teacher_id студента для списка задач) — не тело ответа
+        tables = {s.split("FROM", 1)[1].split()[0] for s, _ in statements}
+        assert tables <= {"resource_versions", "students"}, url
+        assert len(statements) <= 2, url
+
+
+def test_stale_or_foreign_etag_returns_full_response(client, school):
+    url, headers = _urls(school)[0]
+    etag = _etag(client, url, headers)
+
+    response = client.get(url, headers={**headers, "If-None-Match": '"0123"'})
+    assert response.status_code == 200
+    assert response.headers["ETag"] == etag
+
+    # Слабый валидатор не совпадает с сильным ETag
+    response = client.get(url, headers={**headers, "If-None-Match": f"W/{etag}"})
+    assert response.status_code == 200
+
+
+def test_query_string_is_part_of_the_etag(client, school):
+    url = f"/api/teacher/{school['teacher_id']}/tasks"
+    assert _etag(client, url, school["teacher"]) != _etag(client, f"{url}?fields=id", school["teacher"])
+
+
+def test_writes_change_only_the_affected_etags(app, client, school):
+    before = {url: _etag(client, url, headers) for url, headers in _urls(school)}
+    teacher_id = school["teacher_id"]
+
+    # XP студента: профиль и статистика учителя, но не списки задач
+    with app.app_context():
+        xp_ledger.record([xp_ledger.event(school["student_id"], "adjustment", 40)])
+        db.session.commit()
+    after_xp = {url: _etag(client, url, headers) for url, headers in _urls(school)}
+    changed = {url for url in before if before[url] != after_xp[url]}
+    assert changed == {"/api/student/profile", "/api/student/tasks", f"/api/teacher/{teacher_id}/stats"}
+
+    # Новая задача учителя — его список задач и список задач студента
+    response = client.post(f"/api/teacher/{teacher_id}/tasks", headers=school["teacher"],
+                           json={"title": "New", "description": "-"})
+    assert response.status_code == 201
+    after_task = {url: _etag(client, url, headers) for url, headers in _urls(school)}
+    assert after_task["/api/student/profile"] == after_xp["/api/student/profile"]
+    assert after_task[f"/api/teacher/{teacher_id}/tasks"] != after_xp[f"/api/teacher/{teacher_id}/tasks"]
+    assert after_task["/api/student/tasks"] != after_xp["/api/student/tasks"]
+
+
+def test_rolled_back_write_does_not_change_the_etag(app, client, school):
+    url, headers = _urls(school)[0]
+    etag = _etag(client, url, headers)
+
+    with app.app_context():
+        xp_ledger.record([xp_ledger.event(school["student_id"], "adjustment", 40)])
+        db.session.rollback()
+
+    assert _etag(client, url, headers) == etag
+
+
+def test_other_teacher_gets_403_without_etag(client, school):
+    other = {"Authorization": f"Bearer {create_token(school['teacher_id'] + 10000, 'teacher')}"}
+
+    response = client.get(f"/api/teacher/{school['teacher_id']}/tasks", headers=other)
+
+    assert response.status_code in (401, 403)
+    assert "ETag" not in response.headers
+
+
+def test_response_cache_serves_until_a_write_evicts_it(app, client, count_queries, school):
+    responses = app.extensions["http_cache"].responses
+    max_entries, responses.max_entries = responses.max_entries, 16
+    try:
+        url, headers = _urls(school)[0]
+        first = client.get(url, headers=headers)
+
+        with count_queries() as cached:
+            second = client.get(url, headers=headers)
+        assert second.get_data() == first.get_data()
+        assert second.headers["ETag"] == first.headers["ETag"]
+        assert cached["n"] == 1  # только версии ресурсов
+
+        with app.app_context():
+            xp_ledger.record([xp_ledger.event(school["student_id"], "adjustment", 25)])
+            db.session.commit()
+        assert client.get(url, headers=headers).get_json()["total_xp"] == first.get_json()["total_xp"] + 25
+    finally:
+        responses.max_entries = max_entries
+        responses.evict({"all"})
+
+
+def test_response_cache_is_lru_and_evicts_by_resource():
+    cache = ResponseCache(max_entries=2)
+
+    class Response:
+        headers = {}
+
+        def __init__(self, body):
+            self.body = body
+            self.mimetype = "application/json"
+
+        def get_data(self):
+            return self.body
+
+    cache.put("a", {"student:1"}, Response(b"A"))
+    cache.put("b", {"student:2"}, Response(b"B"))
+    assert cache.get("a")[0] == b"A"
+    cache.put("c", {"student:3"}, Response(b"C"))  # вытесняет давно не читанный "b"
+
+    assert cache.get("b") is None
+    cache.evict({"student:1"})
+    assert cache.get("a") is None
+    assert cache.get("c")[0] == b"C"
+    cache.evict({"all"})
+    assert cache.stats()["entries"] == 0
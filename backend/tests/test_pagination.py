@@ -0,0 +1,178 @@
+from datetime import datetime
+from itertools import count
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+from cohorts import assign_to_cohort
+from extensions import db
+from models import Student, StudentSubmission, Task, Teacher
+from pagination import MAX_LIMIT, decode_cursor, encode_cursor
+from routes.auth import create_token
+import code_store
+
+_ids = count()
+
+
+@pytest.fixture
+def teacher_tasks(app):
+    """(teacher_id, headers, [id задач в порядке выдачи]): 7 задач, даты повторяются."""
+    n = next(_ids)
+    with app.app_context():
+        teacher = Teacher(email=f"{n}.pages@school.kz", password_hash="-")
+        db.session.add(teacher)
+        db.session.flush()
+        # Три задачи с одной датой — граница страницы попадает внутрь группы
+        dates = [datetime(2024, 3, 1)] * 3 + [datetime(2024, 3, 2)] * 2 + [datetime(2024, 2, 1), datetime(2024, 4, 1)]
+        tasks = [
+            Task(teacher_id=teacher.id, title=f"T{i}", description="-", xp_reward=10, date_created=d)
+            for i, d in enumerate(dates)
+        ]
+        db.session.add_all(tasks)
+        db.session.commit()
+
+        # Новые сверху, при равной дате — больший id сверху
+        expected = [t.id for t in sorted(tasks, key=lambda t: (t.date_created, t.id), reverse=True)]
+        headers = {"Authorization": f"Bearer {create_token(teacher.id, 'teacher')}"}
+        return teacher.id, headers, expected
+
+
+def _walk(client, url, headers, limit):
+    """Все страницы по X-Next-Cursor: (id строк, число страниц)."""
+    ids, pages = [], 0
+    cursor = None
+    while True:
+        query = {"limit": limit, "fields": "id"}
+        if cursor:
+            query["cursor"] = cursor
+        response = client.get(url, headers=headers, query_string=query)
+        assert response.status_code == 200
+        page = response.get_json()
+        assert len(page) <= limit
+        ids += [row["id"] for row in page]
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            return ids, pages
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 7, 50])
+def test_keyset_pages_return_every_task_once_in_order(client, teacher_tasks, limit):
+    teacher_id, headers, expected = teacher_tasks
+
+    ids, pages = _walk(client, f"/api/teacher/{teacher_id}/tasks", headers, limit)
+
+    assert ids == expected
+    # Ровно кратное limit число строк не даёт лишней пустой страницы
+    assert pages == -(-len(expected) // limit)
+
+
+def test_rows_added_before_the_cursor_do_not_shift_later_pages(app, client, teacher_tasks):
+    teacher_id, headers, expected = teacher_tasks
+    url = f"/api/teacher/{teacher_id}/tasks"
+
+    first = client.get(url, headers=headers, query_string={"limit": 3, "fields": "id"})
+    cursor = first.headers["X-Next-Cursor"]
+    with app.app_context():
+        # Новая задача попадает в начало списка — при OFFSET она сдвинула бы страницы
+        db.session.add(Task(teacher_id=teacher_id, title="New", description="-", date_created=datetime(2025, 1, 1)))
+        db.session.commit()
+
+    rest = client.get(url, headers=headers, query_string={"limit": 50, "fields": "id", "cursor": cursor})
+    assert [row["id"] for row in rest.get_json()] == expected[3:]
+
+
+def test_link_header_carries_the_query_and_next_cursor(client, teacher_tasks):
+    teacher_id, headers, _ = teacher_tasks
+
+    response = client.get(f"/api/teacher/{teacher_id}/tasks", headers=headers,
+                          query_string={"limit": 2, "fields": "id,title"})
+
+    link = response.headers["Link"]
+    assert link.endswith('>; rel="next"')
+    query = parse_qs(urlsplit(link[1:link.index(">")]).query)
+    assert query["cursor"] == [response.headers["X-Next-Cursor"]]
+    assert query["fields"] == ["id,title"]
+    assert query["limit"] == ["2"]
+
+
+def test_without_limit_or_cursor_the_full_list_is_returned(client, teacher_tasks):
+    teacher_id, headers, expected = teacher_tasks
+
+    response = client.get(f"/api/teacher/{teacher_id}/tasks", headers=headers)
+
+    assert [row["id"] for row in response.get_json()] == expected
+    assert "X-Next-Cursor" not in response.headers
+
+
+@pytest.mark.parametrize("query", [
+    {"limit": 0},
+    {"limit": -5},
+    {"limit": "ten"},
+    {"cursor": "not-a-cursor"},
+    {"cursor": encode_cursor([1])},  # у списка задач ключ из двух колонок
+    {"cursor": encode_cursor(["yesterday", 1])},
+    {"fields": "id,password_hash"},
+])
+def test_bad_paging_arguments_are_rejected(client, teacher_tasks, query):
+    teacher_id, headers, _ = teacher_tasks
+
+    response = client.get(f"/api/teacher/{teacher_id}/tasks", headers=headers, query_string=query)
+
+    assert response.status_code == 400
+
+
+def test_limit_is_capped(app, client, teacher_tasks):
+    teacher_id, headers, _ = teacher_tasks
+    with app.app_context():
+        db.session.add_all([
+            Task(teacher_id=teacher_id, title=f"Bulk {i}", description="-", date_created=datetime(2023, 1, 1))
+            for i in range(MAX_LIMIT + 5)
+        ])
+        db.session.commit()
+
+    response = client.get(f"/api/teacher/{teacher_id}/tasks", headers=headers,
+                          query_string={"limit": MAX_LIMIT * 10, "fields": "id"})
+
+    assert len(response.get_json()) == MAX_LIMIT
+    assert "X-Next-Cursor" in response.headers
+
+
+def test_cursor_round_trips_datetimes():
+    order_by = [(Task.date_created, True), (Task.id, True)]
+    value = [datetime(2024, 3, 1, 12, 30, 15, 123456), 42]
+
+    assert decode_cursor(encode_cursor(value), order_by) == value
+
+
+def test_submission_projection_skips_code(app, client):
+    n = next(_ids)
+    with app.app_context():
+        teacher = Teacher(email=f"{n}.subs@school.kz", password_hash="-")
+        db.session.add(teacher)
+        db.session.flush()
+        student = Student(teacher_id=teacher.id, first_name="P", last_name="Q",
+                          email=f"{n}.subs.student@school.kz", password_hash="-")
+        task = Task(teacher_id=teacher.id, title="T", description="-")
+        db.session.add_all([student, task])
+        db.session.flush()
+        assign_to_cohort(task)
+        code_hash = code_store.put("print('hello')")
+        db.session.add_all([
+            StudentSubmission(student_id=student.id, task_id=task.id, code_hash=code_hash,
+                              submitted_at=datetime.utcnow())
+            for _ in range(5)
+        ])
+        db.session.commit()
+        headers = {"Authorization": f"Bearer {create_token(student.id, 'student')}"}
+
+    ids, pages = _walk(client, "/api/student/submissions", headers, 2)
+    assert ids == sorted(ids) and len(ids) == 5 and pages == 3
+
+    page = client.get("/api/student/submissions", headers=headers,
+                      query_string={"limit": 2, "fields": "id,is_correct"}).get_json()
+    assert set(page[0]) == {"id", "is_correct"}
+
+    full = client.get("/api/student/submissions", headers=headers,
+                      query_string={"limit": 1, "fields": "id,code"}).get_json()
+    assert full[0]["code"] == "print('hello')"
@@ -0,0 +1,195 @@
+import re
+from datetime import date, datetime
+
+import pytest
+
+from cohorts import assign_to_cohort
+from extensions import db
+from models import (
+    RegradeJob, Student, StudentSubmission, SuperAdmin, Task, TaskAssignment, Teacher,
+)
+from routes.auth import create_token
+import attendance
+import code_store
+import stats
+
+
+# План запроса, который реально выполняет эндпоинт (SQL перехватывается при
+# вызове через тестовый клиент). Регрессия — полный скан таблицы или
+# сортировка всего результата во временном B-дереве.
+SCAN = re.compile(r"^SCAN (\w+)")
+TEMP_SORT = "USE TEMP B-TREE FOR ORDER BY"
+
+
+def _plans(statements):
+    """[(sql, [шаги плана])] для SELECT/UPDATE/DELETE из перехваченных запросов."""
+    plans = []
+    with db.engine.connect() as conn:
+        for statement, parameters in statements:
+            if statement.lstrip().split(None, 1)[0].upper() not in ("SELECT", "UPDATE", "DELETE"):
+                continue
+            plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+            plans.append((statement, [row[-1] for row in plan]))
+    return plans
+
+
+def _bad_steps(plans, allow_scan=()):
+    tables = set(db.metadata.tables)
+    bad = []
+    for statement, steps in plans:
+        for step in steps:
+            scanned = SCAN.match(step)
+            if scanned and scanned.group(1) in tables and scanned.group(1) not in allow_scan:
+                bad.append((step, statement))
+            elif step.startswith(TEMP_SORT):
+                bad.append((step, statement))
+    return bad
+
+
+def _uses_index(plans, index):
+    return any(index in step for _, steps in plans for step in steps)
+
+
+@pytest.fixture(scope="module")
+def school(app):
+    """Учитель с классом, задачами когорты, отправками и посещаемостью."""
+    with app.app_context():
+        admin = SuperAdmin(email="plans.admin@school.kz", password_hash="-")
+        teacher = Teacher(email="plans@school.kz", password_hash="-")
+        # Ещё учителя — чтобы у админского списка была вторая страница
+        others = [Teacher(email=f"{i}.other.plans@school.kz", password_hash="-") for i in range(2)]
+        db.session.add_all([admin, teacher, *others])
+        db.session.flush()
+
+        students = [
+            Student(
+                teacher_id=teacher.id,
+                first_name="Plan",
+                last_name=str(i),
+                email=f"{i}.plans@school.kz",
+                password_hash="-",
+            )
+            for i in range(4)
+        ]
+        tasks = [
+            Task(
+                teacher_id=teacher.id,
+                title=f"Task {i}",
+                description="-",
+                xp_reward=10,
+                date_created=datetime(2024, 1, 1 + i // 2),
+            )
+            for i in range(6)
+        ]
+        db.session.add_all(students + tasks)
+        db.session.flush()
+
+        for task in tasks[:-1]:
+            assign_to_cohort(task)
+        # Явное назначение (до когорт) — вторая ветка объединения в student_tasks
+        db.session.add(TaskAssignment(student_id=students[0].id, task_id=tasks[-1].id))
+
+        code_hash = code_store.put("print(input())")
+        db.session.add_all([
+            StudentSubmission(
+                student_id=s.id, task_id=t.id, code_hash=code_hash, submitted_at=datetime.utcnow()
+            )
+            for s in students for t in tasks[:3]
+        ])
+        attendance.mark_day(date.today(), {s.id: True for s in students})
+        db.session.commit()
+        stats.rebuild_all()
+
+        return {
+            "teacher_id": teacher.id,
+            "task_id": tasks[0].id,
+            "student": {"Authorization": f"Bearer {create_token(students[0].id, 'student')}"},
+            "teacher": {"Authorization": f"Bearer {create_token(teacher.id, 'teacher')}"},
+            "admin": {"Authorization": f"Bearer {create_token(admin.id, 'superadmin')}"},
+        }
+
+
+def _endpoint_plans(app, client, capture_sql, url, headers):
+    with capture_sql() as statements:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    with app.app_context():
+        return _plans(statements), response
+
+
+def _pages(app, client, capture_sql, url, headers):
+    """Планы первой страницы (limit=2) и страницы по курсору."""
+    first, response = _endpoint_plans(app, client, capture_sql, f"{url}?limit=2", headers)
+    cursor = response.headers["X-Next-Cursor"]
+    second, _ = _endpoint_plans(app, client, capture_sql, f"{url}?limit=2&cursor={cursor}", headers)
+    return first, second
+
+
+def test_student_tasks_resolve_cohort_union_by_index(app, client, capture_sql, school):
+    plans, response = _endpoint_plans(app, client, capture_sql, "/api/student/tasks", school["student"])
+
+    assert len(response.get_json()) == 6
+    assert _bad_steps(plans) == []
+    assert _uses_index(plans, "sqlite_autoindex_cohort_assignments_1")
+    assert _uses_index(plans, "ux_task_assignments_student_task")
+
+
+def test_student_submissions_pages_by_index(app, client, capture_sql, school):
+    for plans in _pages(app, client, capture_sql, "/api/student/submissions", school["student"]):
+        assert _bad_steps(plans) == []
+        assert _uses_index(plans, "ix_student_submissions_student_id_id")
+
+
+def test_teacher_tasks_keyset_with_id_tiebreak_uses_index_order(app, client, capture_sql, school):
+    # Задачи с одинаковой date_created: порядок (date_created, id) должен идти по индексу
+    url = f"/api/teacher/{school['teacher_id']}/tasks"
+    for plans in _pages(app, client, capture_sql, url, school["teacher"]):
+        assert _bad_steps(plans) == []
+        assert _uses_index(plans, "ix_tasks_teacher_date")
+
+
+def test_teacher_students_join_stats_by_key(app, client, capture_sql, school):
+    url = f"/api/teacher/{school['teacher_id']}/students"
+    plans, response = _endpoint_plans(app, client, capture_sql, url, school["teacher"])
+
+    assert len(response.get_json()) == 4
+    assert _bad_steps(plans) == []
+    assert _uses_index(plans, "ix_students_teacher_id")
+
+
+def test_class_attendance_by_index(app, client, capture_sql, school):
+    url = f"/api/teacher/{school['teacher_id']}/attendance"
+    plans, _ = _endpoint_plans(app, client, capture_sql, url, school["teacher"])
+    assert _bad_steps(plans) == []
+
+    plans, _ = _endpoint_plans(app, client, capture_sql, "/api/student/attendance", school["student"])
+    assert _bad_steps(plans) == []
+
+
+@pytest.mark.parametrize("resource, table", [("students", "students"), ("teachers", "teachers")])
+def test_admin_lists_page_by_primary_key(app, client, capture_sql, school, resource, table):
+    first, second = _pages(app, client, capture_sql, f"/api/admin/{resource}", school["admin"])
+
+    # Первая страница — проход по первичному ключу, остановленный LIMIT (без сортировки)
+    assert _bad_steps(first, allow_scan=(table,)) == []
+    # Следующие — с позиции курсора, а не с начала таблицы
+    assert _bad_steps(second) == []
+    assert _uses_index(second, "INTEGER PRIMARY KEY (rowid>?)")
+
+
+def test_grading_claim_and_regrade_batches_by_index(app, capture_sql, school):
+    with app.app_context():
+        task = db.session.get(Task, school["task_id"])
+        regrade = app.extensions["regrade_queue"]
+        job, _ = regrade.enqueue(task, school["teacher_id"])
+
+        # Захват задания проверки и пакеты перепроверки (по id отправок задачи)
+        with capture_sql() as statements:
+            app.extensions["grading_queue"]._claim()
+            regrade._run(job.id)
+        plans = _plans(statements)
+
+        assert db.session.get(RegradeJob, job.id).status == "done"
+    assert _bad_steps(plans) == []
+    assert _uses_index(plans, "ix_grading_jobs_status")
+    assert _uses_index(plans, "ix_student_submissions_task_id_id")
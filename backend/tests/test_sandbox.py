@@ -0,0 +1,130 @@
+import pytest
+
+from grading import FakeGrader, parse_verdict
+from sandbox import SandboxEngine, parse_test_cases, summarize
+# TestCaseGrader — через модуль: импортированный по имени, pytest принял бы его за класс тестов
+import grading
+
+SUM_CASES = [
+    {"input": "1 2\n", "expected_output": "3\n"},
+    {"input": "10 -4\n", "expected_output": "6"},
+]
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = SandboxEngine(workers=2, cpu_seconds=1, memory_mb=128, wall_seconds=3)
+    yield engine
+    engine.shutdown()
+
+
+def _run(engine, code, cases=SUM_CASES):
+    return engine.submit(code, cases).result()
+
+
+def test_correct_solution_passes_every_case(engine):
+    report = _run(engine, "a, b = map(int, input().split())\nprint(a + b)")
+
+    assert (report["passed"], report["total"]) == (2, 2)
+    assert summarize(report) == "Tests: 2/2 passed."
+
+
+def test_wrong_output_is_reported_per_case(engine):
+    report = _run(engine, "a, b = map(int, input().split())\nprint(a - b)")
+
+    assert report["passed"] == 0
+    assert "Test 1: expected '3\\n', got '-1'" in summarize(report)
+
+
+def test_syntax_error_fails_all_cases(engine):
+    report = _run(engine, "print(")
+
+    assert report["passed"] == 0
+    assert report["compile_error"]
+    assert summarize(report).startswith("Tests: 0/2 passed. SyntaxError:")
+
+
+def test_runtime_error_is_isolated_to_its_case(engine):
+    code = "a, b = map(int, input().split())\nprint(a // (b - 2) * 0 + a + b)"
+    report = _run(engine, code)
+
+    assert [c["status"] for c in report["cases"]] == ["error", "ok"]
+    assert report["cases"][0]["error"].startswith("ZeroDivisionError")
+    assert report["passed"] == 1
+
+
+def test_infinite_loop_hits_the_time_limit(engine):
+    report = _run(engine, "while True:\n    pass")
+
+    assert report["passed"] == 0
+    assert {c["status"] for c in report["cases"]} == {"timeout"}
+
+
+def test_memory_limit_is_enforced(engine):
+    report = _run(engine, "x = bytearray(512 * 1024 * 1024)\nprint(len(x))")
+
+    assert report["passed"] == 0
+    assert report["cases"][0]["status"] in ("memory", "error")
+
+
+@pytest.mark.parametrize("code", [
+    "import socket\nsocket.socket()",
+    "import subprocess\nsubprocess.run(['ls'])",
+    "open('out.txt', 'w').write('x')",
+])
+def test_network_processes_and_file_writes_are_denied(engine, code):
+    report = _run(engine, code, [{"input": "", "expected_output": ""}])
+
+    case = report["cases"][0]
+    assert not case["passed"]
+    assert "PermissionError" in case["error"]
+
+
+def test_parse_test_cases_skips_malformed_entries():
+    raw = '[{"input": "1", "expected_output": "2"}, {"input": "x"}, "junk", {"expected_output": 5}]'
+
+    assert parse_test_cases(raw) == [
+        {"input": "1", "expected_output": "2"},
+        {"input": "", "expected_output": "5"},
+    ]
+    assert parse_test_cases("not json") == []
+
+
+def test_incorrect_verdict_is_not_read_as_correct():
+    assert parse_verdict("correct") is True
+    assert parse_verdict("incorrect.") is False
+    assert parse_verdict("") is False
+
+
+class _Task:
+    title = "Sum"
+    description = "-"
+
+    def __init__(self, test_cases):
+        self.test_cases = test_cases
+
+
+class _CountingGrader(FakeGrader):
+    def __init__(self):
+        self.graded = 0
+
+    def grade(self, task, code):
+        self.graded += 1
+        return super().grade(task, code)
+
+
+def test_test_cases_decide_the_verdict_without_the_llm(engine):
+    fallback = _CountingGrader()
+    grader = grading.TestCaseGrader(engine, fallback, llm_feedback=False)
+    task = _Task(SUM_CASES)
+
+    assert grader.grade(task, "a, b = map(int, input().split())\nprint(a + b)") == (True, "Tests: 2/2 passed.")
+    # Компилируется (FakeGrader счёл бы верным), но тесты не проходит
+    is_correct, feedback = grader.grade(task, "print(3)")
+    assert not is_correct
+    assert feedback.startswith("Tests: 1/2 passed.")
+    assert fallback.graded == 0
+
+    # Задача без тест-кейсов — прежний грейдер
+    assert grader.grade(_Task(None), "print(1)") == (True, "correct")
+    assert fallback.graded == 1
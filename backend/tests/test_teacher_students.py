@@ -0,0 +1,69 @@
+from datetime import date
+
+from extensions import db
+from models import Student, StudentStats, Teacher
+from routes.auth import create_token
+import attendance
+import stats
+
+
+def _teacher_with_students(app, email, count):
+    """Учитель и count студентов; у половины есть посещаемость (и строка stats)."""
+    with app.app_context():
+        teacher = Teacher(email=email, password_hash="-")
+        db.session.add(teacher)
+        db.session.flush()
+        students = [
+            Student(
+                teacher_id=teacher.id,
+                first_name="Test",
+                last_name=str(i),
+                email=f"{i}.{email}",
+                password_hash="-",
+            )
+            for i in range(count)
+        ]
+        db.session.add_all(students)
+        db.session.flush()
+        attendance.mark_day(date.today(), {s.id: True for s in students[::2]})
+        db.session.commit()
+        stats.rebuild_all()
+        return teacher.id
+
+
+def _list_students(client, count_queries, teacher_id):
+    headers = {"Authorization": f"Bearer {create_token(teacher_id, 'teacher')}"}
+    with count_queries() as queries:
+        response = client.get(f"/api/teacher/{teacher_id}/students", headers=headers)
+    assert response.status_code == 200
+    return response.get_json(), queries["n"]
+
+
+def test_student_list_query_count_does_not_grow_with_class_size(app, client, count_queries):
+    small = _teacher_with_students(app, "small@school.kz", 10)
+    large = _teacher_with_students(app, "large@school.kz", 20)
+
+    small_rows, small_queries = _list_students(client, count_queries, small)
+    large_rows, large_queries = _list_students(client, count_queries, large)
+
+    assert len(small_rows) == 10
+    assert len(large_rows) == 20
+    # Один сгруппированный запрос вместо запроса на студента (N+1)
+    assert small_queries == large_queries
+
+
+def test_student_without_stats_row_is_backfilled(app, client, count_queries):
+    teacher_id = _teacher_with_students(app, "drift@school.kz", 2)
+    with app.app_context():
+        # Строка статистики потеряна (данные до stats / дрейф)
+        student = Student.query.filter_by(teacher_id=teacher_id).order_by(Student.id).first()
+        db.session.delete(db.session.get(StudentStats, student.id))
+        db.session.commit()
+        student_id = student.id
+
+    rows, _ = _list_students(client, count_queries, teacher_id)
+
+    assert rows[0]["id"] == student_id
+    assert rows[0]["attendance"] == 100.0
+    with app.app_context():
+        assert db.session.get(StudentStats, student_id) is not None
@@ -0,0 +1,149 @@
+from datetime import date, datetime, timedelta
+from itertools import count
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import Student, StudentStats, StudentSubmission, Task, Teacher, XPEvent
+import code_store
+import stats
+import xp_ledger
+
+_ids = count()
+TODAY = date.today()
+NOON = datetime.combine(TODAY, datetime.min.time()) + timedelta(hours=12)
+
+
+@pytest.fixture
+def student(app):
+    """id нового студента (с учителем и строкой статистики); тест — в контексте приложения."""
+    n = next(_ids)
+    with app.app_context():
+        teacher = Teacher(email=f"{n}.ledger@school.kz", password_hash="-")
+        db.session.add(teacher)
+        db.session.flush()
+        student = Student(teacher_id=teacher.id, first_name="L", last_name=str(n),
+                          email=f"{n}.ledger.student@school.kz", password_hash="-")
+        db.session.add(student)
+        db.session.flush()
+        stats.student_created(student)
+        db.session.commit()
+        yield student.id
+
+
+def _submission(student_id, submitted_at=None):
+    student = db.session.get(Student, student_id)
+    task = Task(teacher_id=student.teacher_id, title="T", description="-", xp_reward=30)
+    db.session.add(task)
+    db.session.flush()
+    submission = StudentSubmission(student_id=student_id, task_id=task.id, code_hash=code_store.put("x"),
+                                   submitted_at=submitted_at or NOON)
+    db.session.add(submission)
+    db.session.flush()
+    return submission
+
+
+def _derived(student_id):
+    s = db.session.get(Student, student_id, populate_existing=True)
+    return s.total_xp, s.current_level, s.streak, s.last_active_date
+
+
+def test_submission_xp_is_awarded_once(student):
+    submission = _submission(student)
+
+    assert xp_ledger.submission_graded(submission, 30) is True
+    db.session.commit()
+    assert xp_ledger.submission_graded(submission, 30) is False
+    db.session.commit()
+
+    assert XPEvent.query.filter_by(kind="submission", ref_id=submission.id).count() == 1
+    assert _derived(student)[0] == 30
+    assert db.session.get(StudentStats, student).xp == 30
+
+
+def test_unique_index_blocks_a_concurrent_duplicate(student):
+    submission = _submission(student)
+    xp_ledger.submission_graded(submission, 30)
+    db.session.commit()
+
+    # Второй процесс, проверивший ту же отправку, пишет событие в обход проверки
+    db.session.add(XPEvent(student_id=student, kind="submission", ref_id=submission.id, xp=30, day=TODAY, active=1))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+    assert _derived(student)[0] == 30
+
+
+@pytest.mark.parametrize("xp, level", [(0, 1), (99, 1), (100, 2), (299, 2), (300, 3), (600, 4), (1000, 5)])
+def test_level_thresholds(xp, level):
+    assert xp_ledger.level_for(xp) == level
+
+
+def test_level_follows_xp_and_regrade_corrections(student):
+    submission = _submission(student)
+    xp_ledger.submission_graded(submission, 120)
+    db.session.commit()
+    assert _derived(student)[:2] == (120, 2)
+
+    xp_ledger.submissions_regraded([(submission, -120)])
+    db.session.commit()
+    assert _derived(student)[:2] == (0, 1)
+
+
+def test_streak_counts_consecutive_active_days(student):
+    for offset in (3, 2, 1):
+        xp_ledger.attendance_marked(student, TODAY - timedelta(days=offset), True)
+        db.session.commit()
+    assert _derived(student)[2:] == (3, TODAY - timedelta(days=1))
+
+    # Пропуск дня начинает серию заново
+    xp_ledger.attendance_marked(student, TODAY + timedelta(days=1), True)
+    db.session.commit()
+    assert _derived(student)[2:] == (1, TODAY + timedelta(days=1))
+
+
+def test_backdated_and_cancelled_days_rescan_the_streak(student):
+    for offset in (3, 1):
+        xp_ledger.attendance_marked(student, TODAY - timedelta(days=offset), True)
+    db.session.commit()
+    assert _derived(student)[2] == 1
+
+    # Отметка задним числом закрывает пропуск
+    xp_ledger.attendance_marked(student, TODAY - timedelta(days=2), True)
+    db.session.commit()
+    assert _derived(student)[2] == 3
+
+    # Отмена последнего дня — серия по оставшимся дням
+    xp_ledger.attendance_marked(student, TODAY - timedelta(days=1), False, was_present=True)
+    db.session.commit()
+    assert _derived(student)[2:] == (2, TODAY - timedelta(days=2))
+
+
+def test_attendance_moves_the_streak_but_awards_no_xp(student):
+    xp_ledger.attendance_marked(student, TODAY, True)
+    db.session.commit()
+    xp_ledger.attendance_marked(student, TODAY, False, was_present=True)
+    xp_ledger.attendance_marked(student, TODAY, True, was_present=False)
+    db.session.commit()
+
+    assert _derived(student)[:3] == (0, 1, 1)
+    assert {e.xp for e in XPEvent.query.filter_by(student_id=student, kind="attendance")} == {0}
+
+
+def test_recompute_matches_incremental_state(student):
+    xp_ledger.submission_graded(_submission(student, NOON - timedelta(days=1)), 150)
+    xp_ledger.submission_graded(_submission(student), 200)
+    xp_ledger.record([xp_ledger.event(student, "adjustment", -20)])
+    db.session.commit()
+    incremental = _derived(student)
+
+    # Производные поля испорчены (ручная правка) — пересчёт из журнала восстанавливает их
+    db.session.get(Student, student).total_xp = 9999
+    db.session.get(Student, student).streak = 0
+    db.session.commit()
+    xp_ledger.rebuild_all()
+
+    assert incremental == (330, 3, 2, TODAY)
+    assert _derived(student) == incremental
+    assert db.session.get(StudentStats, student).xp == 330
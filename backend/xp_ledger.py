@@ -0,0 +1,258 @@
+from datetime import date, timedelta
+from math import isqrt
+
+from sqlalchemy import bindparam, case, func, insert, select, update
+
+from extensions import db
+from models import Student, XPEvent
+import http_cache
+import stats
+
+
+# Уровень n требует LEVEL_STEP * n(n-1)/2 XP: 2 — 100, 3 — 300, 4 — 600, ...
+LEVEL_STEP = 100
+
+
+def level_for(xp):
+    steps = max(xp or 0, 0) // LEVEL_STEP
+    return (1 + isqrt(8 * steps + 1)) // 2
+
+
+# ------------------------------------
+# Запись событий (в транзакции вызывающего, commit — снаружи)
+# ------------------------------------
+def event(student_id, kind, xp=0, day=None, active=0, ref_id=None):
+    return {
+        "student_id": student_id,
+        "kind": kind,
+        "ref_id": ref_id,
+        "xp": xp,
+        "day": day or date.today(),
+        "active": active,
+    }
+
+
+def record(events):
+    """Добавить события в журнал и обновить производные поля студентов.
+
+    XP прибавляется атомарно (UPDATE ... + CASE), уровень считается по
+    новому total_xp, серия продвигается по дню события. Историю журнала
+    перечитываем только в редких случаях: событие задним числом или
+    отмена дня активности — тогда серия студента пересчитывается целиком.
+    """
+    if not events:
+        return
+
+    db.session.execute(insert(XPEvent), events)
+
+    xp_deltas = {}
+    for e in events:
+        if e["xp"]:
+            xp_deltas[e["student_id"]] = xp_deltas.get(e["student_id"], 0) + e["xp"]
+
+    if xp_deltas:
+        db.session.execute(
+            update(Student)
+            .where(Student.id.in_(xp_deltas))
+            .values(
+                total_xp=func.coalesce(Student.total_xp, 0)
+                + case(xp_deltas, value=Student.id, else_=0)
+            )
+        )
+        stats.apply_student_deltas({sid: {"xp": xp} for sid, xp in xp_deltas.items()})
+
+    ids = {e["student_id"] for e in events}
+    http_cache.bump(http_cache.student_key(sid) for sid in ids)
+    current = {
+        sid: [total_xp, streak or 0, last_active]
+        for sid, total_xp, streak, last_active in db.session.execute(
+            select(Student.id, Student.total_xp, Student.streak, Student.last_active_date)
+            .where(Student.id.in_(ids))
+        )
+    }
+
+    rescan = set()
+    for e in sorted(events, key=lambda e: e["day"]):
+        state = current.get(e["student_id"])
+        if state is None or not e["active"]:
+            continue
+        if e["active"] < 0:
+            rescan.add(e["student_id"])
+            continue
+
+        _, streak, last_active = state
+        if last_active is None or e["day"] > last_active:
+            state[1] = streak + 1 if last_active == e["day"] - timedelta(days=1) else 1
+            state[2] = e["day"]
+        elif e["day"] < last_active:
+            rescan.add(e["student_id"])
+
+    db.session.execute(update(Student), [
+        {
+            "id": sid,
+            "current_level": level_for(total_xp),
+            "streak": streak,
+            "last_active_date": last_active,
+        }
+        for sid, (total_xp, streak, last_active) in current.items()
+    ])
+
+    if rescan:
+        _apply_streaks(rescan)
+
+
+# ------------------------------------
+# События предметной области
+# ------------------------------------
+def submission_recorded(submission_id):
+    return db.session.query(
+        select(XPEvent.id).where(XPEvent.kind == "submission", XPEvent.ref_id == submission_id).exists()
+    ).scalar()
+
+
+def submission_graded(submission, xp):
+    """XP за проверку отправки — один раз. False, если событие уже есть.
+
+    Гонку двух процессов закрывает уникальный индекс ux_xp_events_submission.
+    """
+    if submission_recorded(submission.id):
+        return False
+    record([event(
+        submission.student_id, "submission", xp,
+        day=submission.submitted_at.date() if submission.submitted_at else None,
+        active=1, ref_id=submission.id,
+    )])
+    return True
+
+
+def submissions_regraded(changes):
+    """changes: [(submission, xp_delta)] — поправки XP после перепроверки."""
+    record([
+        event(s.student_id, "regrade", delta, ref_id=s.id)
+        for s, delta in changes if delta
+    ])
+
+
+def _attendance_event(student_id, day, present, was_present):
+    present = bool(present)
+    if was_present is not None and bool(was_present) == present:
+        return None
+
+    # XP за посещаемость не начисляется: событие двигает только серию
+    if present:
+        return event(student_id, "attendance", day=day, active=1)
+    if was_present:
+        return event(student_id, "attendance", day=day, active=-1)
+    return event(student_id, "attendance", day=day)
+
+
+def attendance_marked(student_id, day, present, was_present=None):
+    """was_present=None — новая отметка, иначе — изменение старой."""
+    class_attendance_marked(day, [(student_id, present, was_present)])
+
+
+def class_attendance_marked(day, marks):
+    """marks: [(student_id, present, was_present)] — события класса одной пачкой."""
+    events = [_attendance_event(sid, day, present, was) for sid, present, was in marks]
+    record([e for e in events if e is not None])
+
+
+# ------------------------------------
+# Пересчёт из журнала (set-based, без обхода событий в Python)
+# ------------------------------------
+students = Student.__table__
+events_table = XPEvent.__table__
+
+# Производные поля по id — executemany одним оператором
+_set_derived = (
+    update(students)
+    .where(students.c.id == bindparam("sid"))
+    .values(
+        total_xp=bindparam("new_xp"),
+        current_level=bindparam("new_level"),
+        streak=bindparam("new_streak"),
+        last_active_date=bindparam("new_last_active"),
+    )
+)
+_set_streak = (
+    update(students)
+    .where(students.c.id == bindparam("sid"))
+    .values(streak=bindparam("new_streak"), last_active_date=bindparam("new_last_active"))
+)
+
+
+def _streaks(conn, student_ids=None):
+    """{student_id: (серия, последний активный день)} одним запросом.
+
+    «Острова» подряд идущих дней: у дней одной серии разность
+    julianday(day) - row_number() одинакова. Берём остров с последним днём.
+    """
+    days = (
+        select(events_table.c.student_id, events_table.c.day)
+        .group_by(events_table.c.student_id, events_table.c.day)
+        .having(func.sum(events_table.c.active) > 0)
+    )
+    if student_ids is not None:
+        days = days.where(events_table.c.student_id.in_(student_ids))
+    days = days.subquery()
+
+    islands = select(
+        days.c.student_id,
+        days.c.day,
+        (
+            func.julianday(days.c.day)
+            - func.row_number().over(partition_by=days.c.student_id, order_by=days.c.day)
+        ).label("island"),
+    ).subquery()
+
+    result = {}
+    for sid, last_day, length in conn.execute(
+        select(islands.c.student_id, func.max(islands.c.day), func.count())
+        .group_by(islands.c.student_id, islands.c.island)
+    ):
+        if isinstance(last_day, str):
+            last_day = date.fromisoformat(last_day)
+        if sid not in result or last_day > result[sid][1]:
+            result[sid] = (length, last_day)
+    return result
+
+
+def _apply_streaks(student_ids):
+    streaks = _streaks(db.session, student_ids)
+    db.session.execute(_set_streak, [
+        {"sid": sid, "new_streak": streaks.get(sid, (0, None))[0], "new_last_active": streaks.get(sid, (0, None))[1]}
+        for sid in student_ids
+    ])
+
+
+def recompute(conn):
+    """XP, уровень и серия всех студентов из журнала (conn — сессия или соединение)."""
+    xp = dict(conn.execute(
+        select(events_table.c.student_id, func.sum(events_table.c.xp))
+        .group_by(events_table.c.student_id)
+    ).all())
+    streaks = _streaks(conn)
+
+    rows = [
+        {
+            "sid": sid,
+            "new_xp": xp.get(sid, 0),
+            "new_level": level_for(xp.get(sid, 0)),
+            "new_streak": streaks.get(sid, (0, None))[0],
+            "new_last_active": streaks.get(sid, (0, None))[1],
+        }
+        for sid in conn.execute(select(students.c.id)).scalars()
+    ]
+    if rows:
+        conn.execute(_set_derived, rows)
+    return len(rows)
+
+
+def rebuild_all():
+    """Полный пересчёт из журнала (лечит дрейф). Возвращает число студентов."""
+    count = recompute(db.session)
+    db.session.commit()
+
+    # total_xp мог измениться в обход событий stats — сверяем счётчики и рейтинг
+    stats.rebuild_all()
+    return count